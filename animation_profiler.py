@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Animation smoothness profiler for the collapsible cards and the meal modal
+
+diagnose_cards.py and comprehensive_diagnostic.py click the dashboard cards
+open and screenshot the end state. That shows where an animation ends, not
+whether it stuttered on the way. This replays the same interactions and
+records what the page did while they ran:
+
+- every requestAnimationFrame timestamp, giving frame times and dropped
+  frames against the display's idle refresh interval
+- long tasks (>50 ms main-thread blocks) from PerformanceObserver
+- how long the UI took to settle (no style/DOM mutations for 150 ms)
+
+Each interaction is measured --repeat times at each --cpu throttling rate
+(Chrome DevTools CPU throttling: 4 is a mid-range Android phone, 6 a low-end
+one) and reported as p50/p95/max frame time, dropped frames and long-task
+time.
+
+Interactions: expand and collapse DAILY FAT LOSS, WEEKLY PROGRESS, DINING
+OUT and WEARABLE SYNC, then open the meal modal from the "Log a meal"
+floating button in the tab bar.
+
+Usage:
+    python animation_profiler.py
+    python animation_profiler.py --cpu 1 4 6 --repeat 5
+    python animation_profiler.py --only dining_out --json anim.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from backend.stats import percentile
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+APP_URL = 'http://localhost:8081'
+SETTLE_QUIET_MS = 150
+MAX_INTERACTION_MS = 3000
+JANK_FACTOR = 1.5  # a frame longer than 1.5 refresh intervals is a visible hitch
+
+# name -> (component from layout_assertions.COMPONENTS or Playwright selector, kind)
+INTERACTIONS = {
+    'daily_fat_loss': ('daily_fat_loss_card', 'toggle'),
+    'weekly_progress': ('weekly_progress_card', 'toggle'),
+    'dining_out': ('dining_out_card', 'toggle'),
+    'wearable_sync': ('wearable_sync_card', 'toggle'),
+    # The tab bar's floating + button (app/(tabs)/_layout.tsx), which opens the meal modal on the dashboard
+    'log_meal_modal': ('[aria-label="Log a meal"]', 'modal'),
+}
+
+# Installed before the app loads; recording starts and stops around each interaction
+RECORDER_JS = """
+(() => {
+    const state = {recording: false, frames: [], longTasks: [], lastMutation: 0};
+    const tick = (t) => {
+        if (state.recording) state.frames.push(t);
+        requestAnimationFrame(tick);
+    };
+    requestAnimationFrame(tick);
+    try {
+        new PerformanceObserver((list) => {
+            if (!state.recording) return;
+            for (const e of list.getEntries()) state.longTasks.push({start: e.startTime, duration: e.duration});
+        }).observe({type: 'longtask', buffered: false});
+    } catch (e) { /* not Chromium */ }
+    const watchMutations = () => new MutationObserver(() => { state.lastMutation = performance.now(); })
+        .observe(document.documentElement, {subtree: true, attributes: true, childList: true, characterData: true});
+    if (document.documentElement) watchMutations();
+    else addEventListener('DOMContentLoaded', watchMutations);
+
+    window.__animationProfiler = {
+        start() {
+            Object.assign(state, {recording: true, frames: [], longTasks: [], lastMutation: performance.now()});
+            return performance.now();
+        },
+        // Resolves once nothing has mutated for quietMs (or after maxMs)
+        settle(quietMs, maxMs) {
+            const began = performance.now();
+            return new Promise((resolve) => {
+                const check = () => {
+                    const now = performance.now();
+                    if (now - state.lastMutation >= quietMs || now - began >= maxMs) resolve(state.lastMutation);
+                    else setTimeout(check, 25);
+                };
+                check();
+            });
+        },
+        stop() {
+            state.recording = false;
+            return {frames: state.frames, longTasks: state.longTasks, lastMutation: state.lastMutation};
+        },
+    };
+})();
+"""
+
+
+def frame_stats(record, started, refresh_ms):
+    """Frame times, dropped frames and long-task time for one recorded interaction."""
+    settled = max(record['lastMutation'], started)
+    frames = [t for t in record['frames'] if t <= settled + refresh_ms]
+    deltas = [b - a for a, b in zip(frames, frames[1:])]
+    dropped = sum(max(0, round(d / refresh_ms) - 1) for d in deltas)
+    return {
+        'duration_ms': settled - started,
+        'frames': len(deltas),
+        'frame_ms': deltas,
+        'dropped': dropped,
+        'janky': sum(d > refresh_ms * JANK_FACTOR for d in deltas),
+        'long_tasks': len(record['longTasks']),
+        'long_task_ms': sum(t['duration'] for t in record['longTasks']),
+    }
+
+
+async def idle_refresh_ms(page):
+    """Median idle frame interval: the display refresh the page is actually getting."""
+    await page.evaluate('window.__animationProfiler.start()')
+    await page.wait_for_timeout(500)
+    frames = (await page.evaluate('window.__animationProfiler.stop()'))['frames']
+    deltas = [b - a for a, b in zip(frames, frames[1:])]
+    return percentile(deltas, 50) or 1000 / 60
+
+
+async def measure(page, action, refresh_ms):
+    """Start recording, run action (an awaitable factory), wait for the UI to settle, return stats."""
+    started = await page.evaluate('window.__animationProfiler.start()')
+    await action()
+    await page.evaluate(f'window.__animationProfiler.settle({SETTLE_QUIET_MS}, {MAX_INTERACTION_MS})')
+    record = await page.evaluate('window.__animationProfiler.stop()')
+    return frame_stats(record, started, refresh_ms)
+
+
+async def close_modal(page):
+    close = page.locator('[aria-label="close"], [aria-label^="Close"]').first
+    if await close.count():
+        await close.click()
+    else:
+        await page.keyboard.press('Escape')
+
+
+async def profile(page, names, repeat, refresh_ms):
+    """name -> {phase -> [stats per repeat]} for the chosen interactions."""
+    from layout_assertions import locate
+
+    results = {}
+    for name in names:
+        target, kind = INTERACTIONS[name]
+        locator = locate(page, target)
+        if not await locator.count():
+            print(f"   [WARNING] {name}: {target} not found, skipped")
+            continue
+        await locator.scroll_into_view_if_needed()
+        await page.wait_for_timeout(300)
+        phases = {'expand': [], 'collapse': []} if kind == 'toggle' else {'open': [], 'close': []}
+        first, second = phases
+        for _ in range(repeat):
+            phases[first].append(await measure(page, locator.click, refresh_ms))
+            phases[second].append(await measure(
+                page, locator.click if kind == 'toggle' else (lambda: close_modal(page)), refresh_ms))
+        results[name] = phases
+    return results
+
+
+def summarize(runs):
+    frame_ms = [d for run in runs for d in run['frame_ms']]
+    return {
+        'p50_ms': percentile(frame_ms, 50),
+        'p95_ms': percentile(frame_ms, 95),
+        'max_ms': max(frame_ms, default=0.0),
+        'dropped': sum(run['dropped'] for run in runs) / len(runs),
+        'janky': sum(run['janky'] for run in runs) / len(runs),
+        'long_task_ms': sum(run['long_task_ms'] for run in runs) / len(runs),
+        'duration_ms': percentile([run['duration_ms'] for run in runs], 50),
+    }
+
+
+def print_table(rate, refresh_ms, results):
+    print(f"\n=== CPU x{rate:g} (idle frame {refresh_ms:.1f} ms) ===")
+    print(f"{'interaction':<28} {'p50':>6} {'p95':>6} {'max':>7} {'dropped':>8} {'janky':>6} "
+          f"{'long tasks':>11} {'settle':>7}")
+    for name, phases in results.items():
+        for phase, runs in phases.items():
+            s = summarize(runs)
+            print(f"{name + ' ' + phase:<28} {s['p50_ms']:6.1f} {s['p95_ms']:6.1f} {s['max_ms']:7.1f} "
+                  f"{s['dropped']:8.1f} {s['janky']:6.1f} {s['long_task_ms']:9.0f}ms {s['duration_ms']:6.0f}ms")
+
+
+async def run(args):
+    from playwright.async_api import async_playwright
+    from har_replay import attach_async
+
+    report = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+        context = await browser.new_context(viewport={'width': 390, 'height': 844}, device_scale_factor=3,
+                                            is_mobile=True, has_touch=True)
+        await attach_async(context)
+        await context.add_init_script(RECORDER_JS)
+        page = await context.new_page()
+        cdp = await context.new_cdp_session(page)
+        try:
+            await page.goto(args.url, wait_until='networkidle', timeout=60000)
+            skip = await page.query_selector('text=Skip')
+            if skip:
+                await skip.click()
+                await page.wait_for_load_state('networkidle')
+
+            for rate in args.cpu:
+                await cdp.send('Emulation.setCPUThrottlingRate', {'rate': rate})
+                refresh_ms = await idle_refresh_ms(page)
+                results = await profile(page, args.only or list(INTERACTIONS), args.repeat, refresh_ms)
+                print_table(rate, refresh_ms, results)
+                report[f"x{rate:g}"] = {'idle_frame_ms': refresh_ms, 'interactions': {
+                    name: {phase: {**summarize(runs), 'runs': runs} for phase, runs in phases.items()}
+                    for name, phases in results.items()}}
+        finally:
+            await cdp.send('Emulation.setCPUThrottlingRate', {'rate': 1})
+            await browser.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile frame times of card and modal animations')
+    parser.add_argument('--url', default=APP_URL)
+    parser.add_argument('--cpu', type=float, nargs='+', default=[1, 4], help='CPU throttling rates to run at')
+    parser.add_argument('--repeat', type=int, default=3, help='Times to run each interaction per rate')
+    parser.add_argument('--only', nargs='+', choices=sorted(INTERACTIONS), help='Subset of interactions')
+    parser.add_argument('--json', help='Write every run (including raw frame times) to this file')
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(run(args))
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+            print(f"\n[SAVED] {args.json}")
+        dropped = sum(i[phase]['dropped'] for r in report.values() for i in r['interactions'].values() for phase in i)
+        if dropped:
+            print(f"\n[WARNING] {dropped:.0f} dropped frames on average across all interactions")
+        else:
+            print("\n[SUCCESS] No dropped frames")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
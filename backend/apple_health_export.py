@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Streaming parser for Apple Health export.xml
+
+Health > Profile > Export All Health Data produces an export.xml that runs
+to several GB after a few years on a Watch: one <Record> element per
+sample, grouped by type, not date. This module reads it with iterparse and
+clears each top-level element as soon as it ends, so the tree never grows.
+Samples are folded into per-day buckets on the fly, so memory scales with
+the number of days in the export, not the number of records.
+
+Buckets become rows shaped like the app's tables (columns in ROW_COLUMNS):
+    step_logs     steps, walking/running distance (km), exercise minutes
+    sleep_logs    bed/wake time, asleep, deep and REM hours, dated by the morning
+    weight_logs   the last body-mass reading of each day, with body fat %
+    calorie_logs  active energy burned
+
+Steps and distance are recorded by both the iPhone and the Watch, so daily
+sums are kept per source and the largest one is used (close to how Health
+de-duplicates). wearable_ingest.py loads the rows into Postgres.
+
+Usage:
+    python apple_health_export.py summary ~/Downloads/apple_health_export/export.xml
+    python apple_health_export.py generate /tmp/export.xml --days 730
+    python apple_health_export.py bench --days 365 1825
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+STEP_TYPE = 'HKQuantityTypeIdentifierStepCount'
+DISTANCE_TYPE = 'HKQuantityTypeIdentifierDistanceWalkingRunning'
+EXERCISE_TYPE = 'HKQuantityTypeIdentifierAppleExerciseTime'
+ENERGY_TYPE = 'HKQuantityTypeIdentifierActiveEnergyBurned'
+WEIGHT_TYPE = 'HKQuantityTypeIdentifierBodyMass'
+BODY_FAT_TYPE = 'HKQuantityTypeIdentifierBodyFatPercentage'
+HEART_RATE_TYPE = 'HKQuantityTypeIdentifierHeartRate'
+SLEEP_TYPE = 'HKCategoryTypeIdentifierSleepAnalysis'
+DAILY_SUM_TYPES = {STEP_TYPE, DISTANCE_TYPE, EXERCISE_TYPE, ENERGY_TYPE}
+ASLEEP_VALUES = {
+    'HKCategoryValueSleepAnalysisAsleep',
+    'HKCategoryValueSleepAnalysisAsleepUnspecified',
+    'HKCategoryValueSleepAnalysisAsleepCore',
+    'HKCategoryValueSleepAnalysisAsleepDeep',
+    'HKCategoryValueSleepAnalysisAsleepREM',
+}
+DISTANCE_TO_KM = {'km': 1.0, 'mi': 1.609344, 'm': 0.001}
+WEIGHT_UNITS = {'lb': 'lbs', 'kg': 'kg'}
+HEALTH_TIME_FORMAT = '%Y-%m-%d %H:%M:%S %z'
+
+# Column order of the emitted row tuples
+ROW_COLUMNS = {
+    'step_logs': ('user_id', 'date', 'steps', 'distance_km', 'active_minutes', 'source'),
+    'sleep_logs': ('user_id', 'date', 'bed_time', 'wake_time', 'total_hours', 'deep_sleep_hours',
+                   'rem_sleep_hours', 'source'),
+    'weight_logs': ('user_id', 'logged_at', 'weight', 'unit', 'body_fat_percent', 'source'),
+    'calorie_logs': ('user_id', 'date', 'calories_burned', 'net_calories'),
+}
+
+
+def parse_time(value):
+    return datetime.strptime(value, HEALTH_TIME_FORMAT)
+
+
+def iter_records(path):
+    """
+    Yield the attributes of every <Record> in path, in file order.
+
+    Records nested in a <Correlation> (blood pressure, food) are included.
+    When a top-level element ends the root is cleared, which drops it along
+    with its children and MetadataEntry elements.
+    """
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if elem.tag == 'Record':
+            yield elem.attrib
+        if depth == 1:
+            root.clear()
+
+
+class DailyTotals:
+    """Per-day buckets for the record types the app stores."""
+
+    def __init__(self):
+        self.records = 0
+        self.used = 0
+        # (type, day) -> source -> summed value
+        self.sums = defaultdict(lambda: defaultdict(float))
+        # morning -> source -> [bed_time, wake_time, asleep, deep, rem hours]
+        self.nights = defaultdict(lambda: defaultdict(lambda: [None, None, 0.0, 0.0, 0.0]))
+        # day -> (logged_at, weight, unit); day -> (logged_at, body fat %)
+        self.weights = {}
+        self.body_fat = {}
+
+    def add(self, record):
+        self.records += 1
+        kind = record.get('type')
+        if kind in DAILY_SUM_TYPES:
+            value = float(record.get('value', 0))
+            if kind == DISTANCE_TYPE:
+                value *= DISTANCE_TO_KM.get(record.get('unit'), 1.0)
+            self.sums[(kind, record['startDate'][:10])][record.get('sourceName')] += value
+        elif kind == SLEEP_TYPE:
+            self._add_sleep(record)
+        elif kind == WEIGHT_TYPE:
+            logged_at = parse_time(record['startDate'])
+            day = record['startDate'][:10]
+            if day not in self.weights or logged_at >= self.weights[day][0]:
+                unit = WEIGHT_UNITS.get(record.get('unit'), record.get('unit'))
+                self.weights[day] = (logged_at, float(record['value']), unit)
+        elif kind == BODY_FAT_TYPE:
+            logged_at = parse_time(record['startDate'])
+            day = record['startDate'][:10]
+            if day not in self.body_fat or logged_at >= self.body_fat[day][0]:
+                self.body_fat[day] = (logged_at, float(record['value']) * 100)
+        else:
+            return
+        self.used += 1
+
+    def _add_sleep(self, record):
+        start = parse_time(record['startDate'])
+        end = parse_time(record['endDate'])
+        # Noon to noon: a sample belongs to the night that ends on the following morning
+        night = self.nights[(start + timedelta(hours=12)).date().isoformat()][record.get('sourceName')]
+        night[0] = start if night[0] is None else min(night[0], start)
+        night[1] = end if night[1] is None else max(night[1], end)
+        value = record.get('value')
+        if value in ASLEEP_VALUES:
+            hours = (end - start).total_seconds() / 3600
+            night[2] += hours
+            if value.endswith('Deep'):
+                night[3] += hours
+            elif value.endswith('REM'):
+                night[4] += hours
+
+    def best(self, kind, day):
+        """The largest single-source total for kind on day, or None."""
+        totals = self.sums.get((kind, day))
+        return max(totals.values()) if totals else None
+
+    def step_rows(self, user_id, source='apple_health'):
+        for day in sorted({day for (kind, day) in self.sums if kind == STEP_TYPE}):
+            distance = self.best(DISTANCE_TYPE, day)
+            minutes = self.best(EXERCISE_TYPE, day)
+            yield (user_id, day, round(self.best(STEP_TYPE, day)),
+                   round(distance, 2) if distance is not None else None,
+                   round(minutes) if minutes is not None else None, source)
+
+    def sleep_rows(self, user_id, source='apple_health'):
+        for day in sorted(self.nights):
+            # The source that saw the most sleep (Watch stages beat iPhone "in bed")
+            bed_time, wake_time, asleep, deep, rem = max(self.nights[day].values(), key=lambda n: n[2])
+            if asleep:
+                yield (user_id, day, bed_time, wake_time, round(asleep, 2),
+                       round(deep, 2) or None, round(rem, 2) or None, source)
+
+    def weight_rows(self, user_id, source='apple_health'):
+        for day in sorted(self.weights):
+            logged_at, weight, unit = self.weights[day]
+            body_fat = self.body_fat.get(day)
+            yield (user_id, logged_at, round(weight, 2), unit,
+                   round(body_fat[1], 1) if body_fat else None, source)
+
+    def calorie_rows(self, user_id):
+        for day in sorted({day for (kind, day) in self.sums if kind == ENERGY_TYPE}):
+            burned = round(self.best(ENERGY_TYPE, day))
+            yield (user_id, day, burned, -burned)
+
+    def rows(self, user_id, source='apple_health'):
+        """Return {table: row iterator} in ROW_COLUMNS order."""
+        return {
+            'step_logs': self.step_rows(user_id, source),
+            'sleep_logs': self.sleep_rows(user_id, source),
+            'weight_logs': self.weight_rows(user_id, source),
+            'calorie_logs': self.calorie_rows(user_id),
+        }
+
+
+def parse(path):
+    """Stream path into a DailyTotals."""
+    totals = DailyTotals()
+    for record in iter_records(path):
+        totals.add(record)
+    return totals
+
+
+def _record(out, kind, source, start, end, value, unit=None):
+    unit_attr = f' unit="{unit}"' if unit else ''
+    out.write(f' <Record type="{kind}" sourceName="{source}" sourceVersion="17.4"{unit_attr} '
+              f'creationDate="{end:%Y-%m-%d %H:%M:%S} -0500" startDate="{start:%Y-%m-%d %H:%M:%S} -0500" '
+              f'endDate="{end:%Y-%m-%d %H:%M:%S} -0500" value="{value}"/>\n')
+
+
+def generate(path, days, seed=42, end=None):
+    """
+    Write a synthetic export.xml covering days days up to end.
+
+    Like a real export, records are grouped by type, the iPhone and Watch
+    both log steps and distance, and the Watch adds heart rate samples that
+    the parser has to skip. Roughly 230 KB per day.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = end - timedelta(days=days - 1)
+    day_starts = [first + timedelta(days=i) for i in range(days)]
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE HealthData>\n<HealthData locale="en_US">\n')
+        out.write(f' <ExportDate value="{end:%Y-%m-%d} 08:00:00 -0500"/>\n')
+        out.write(' <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01"/>\n')
+        for kind, unit in ((STEP_TYPE, 'count'), (DISTANCE_TYPE, 'mi')):
+            for day in day_starts:
+                for source in ('iPhone', 'Apple Watch'):
+                    for slot in range(7 * 6, 22 * 6):  # 10-minute slots, 7am-10pm
+                        start = day + timedelta(minutes=slot * 10)
+                        steps = rng.randint(0, 180)
+                        value = steps if kind == STEP_TYPE else f"{steps * 0.00047:.4f}"
+                        _record(out, kind, source, start, start + timedelta(minutes=10), value, unit)
+        for day in day_starts:
+            for slot in range(24 * 12):  # 5-minute slots
+                start = day + timedelta(minutes=slot * 5)
+                _record(out, ENERGY_TYPE, 'Apple Watch', start, start + timedelta(minutes=5),
+                        f"{rng.uniform(0.5, 4.0):.3f}", 'Cal')
+                _record(out, HEART_RATE_TYPE, 'Apple Watch', start, start, rng.randint(55, 130),
+                        'count/min')
+        for day in day_starts:
+            start = day + timedelta(hours=18)
+            _record(out, EXERCISE_TYPE, 'Apple Watch', start, start + timedelta(minutes=30),
+                    rng.randint(10, 60), 'min')
+        for day in day_starts:
+            if rng.random() < 0.6:
+                start = day + timedelta(hours=7, minutes=rng.randint(0, 59))
+                _record(out, WEIGHT_TYPE, 'Scale', start, start, f"{rng.uniform(170, 185):.1f}", 'lb')
+                _record(out, BODY_FAT_TYPE, 'Scale', start, start, f"{rng.uniform(0.18, 0.24):.3f}", '%')
+        for day in day_starts:
+            bed = day - timedelta(hours=1, minutes=rng.randint(0, 90))
+            _record(out, SLEEP_TYPE, 'iPhone', bed, bed + timedelta(hours=8),
+                    'HKCategoryValueSleepAnalysisInBed')
+            start = bed + timedelta(minutes=15)
+            for _ in range(5):
+                for stage in ('AsleepCore', 'AsleepDeep', 'AsleepCore', 'AsleepREM'):
+                    stop = start + timedelta(minutes=rng.randint(10, 35))
+                    _record(out, SLEEP_TYPE, 'Apple Watch', start, stop, f'HKCategoryValueSleepAnalysis{stage}')
+                    start = stop
+        out.write('</HealthData>\n')
+
+
+def summarize(totals, elapsed, path):
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"  {totals.records:,} records ({totals.used:,} used), {size_mb:,.1f} MB in {elapsed:.1f}s "
+          f"({totals.records / elapsed:,.0f} records/s, {size_mb / elapsed:.1f} MB/s)")
+    for table, rows in totals.rows('-').items():
+        rows = list(rows)
+        span = f"  {rows[0][1]} .. {rows[-1][1]}" if rows else ''
+        print(f"  {table:<13} {len(rows):>6} rows{span}")
+
+
+def bench(sizes, seed, keep=False):
+    """Parse generated exports of each size; peak memory should stay flat as files grow."""
+    for days in sizes:
+        fd, path = tempfile.mkstemp(suffix='.xml', prefix=f'health_export_{days}d_')
+        os.close(fd)
+        try:
+            started = time.perf_counter()
+            generate(path, days, seed)
+            print(f"\n{days} days: generated {os.path.getsize(path) / 1024 / 1024:,.0f} MB "
+                  f"in {time.perf_counter() - started:.1f}s")
+            started = time.perf_counter()
+            totals = parse(path)
+            summarize(totals, time.perf_counter() - started, path)
+
+            tracemalloc.start()
+            parse(path)
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  peak Python memory while parsing: {peak / 1024 / 1024:.1f} MB")
+        finally:
+            if keep:
+                print(f"  kept {path}")
+            else:
+                os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream an Apple Health export.xml into daily rows')
+    sub = parser.add_subparsers(dest='command', required=True)
+    summary_parser = sub.add_parser('summary', help='Parse an export and print what it contains')
+    summary_parser.add_argument('path')
+    generate_parser = sub.add_parser('generate', help='Write a synthetic export.xml fixture')
+    generate_parser.add_argument('path')
+    generate_parser.add_argument('--days', type=int, default=365)
+    generate_parser.add_argument('--seed', type=int, default=42)
+    bench_parser = sub.add_parser('bench', help='Time and memory-profile parsing generated fixtures')
+    bench_parser.add_argument('--days', type=int, nargs='+', default=[365, 1825])
+    bench_parser.add_argument('--seed', type=int, default=42)
+    bench_parser.add_argument('--keep', action='store_true', help='Keep the generated files')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'summary':
+            print(f"Parsing {args.path}...")
+            started = time.perf_counter()
+            totals = parse(args.path)
+            summarize(totals, time.perf_counter() - started, args.path)
+        elif args.command == 'generate':
+            generate(args.path, args.days, args.seed)
+            print(f"[SAVED] {args.path} ({os.path.getsize(args.path) / 1024 / 1024:,.1f} MB)")
+        else:
+            bench(args.days, args.seed, args.keep)
+        print("[SUCCESS] Done")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Running-balance maintenance for calorie_bank
+
+calorie_bank stores running_balance per (user_id, date): the sum of
+banked_calories up to and including that day. A backdated edit leaves every
+later row stale. This tool rewrites only that suffix, for a whole batch of
+users in a single statement:
+
+- Statement-level triggers on calorie_bank record, per user, the earliest
+  date touched by an insert, update or delete in calorie_bank_dirty.
+- `refresh` claims dirty users in batches (FOR UPDATE SKIP LOCKED) and
+  recomputes each one's rows from its from_date onwards with
+  SUM(banked_calories) OVER (PARTITION BY user_id ORDER BY date), seeded with
+  the last balance before from_date. Only rows whose balance changed are
+  written.
+- `recompute` does the same for explicit users (or everyone) from --from.
+- `verify` checks every stored balance against a full windowed SUM; `bench`
+  compares the windowed pass with per-row updates on years of daily rows.
+
+The recompute's own UPDATE sets calorie_bank.recomputing for the
+transaction, so the triggers skip it. Each batch costs time in proportion
+to the rows it rewrites, not to the size of calorie_bank.
+
+Usage:
+    python calorie_bank.py install                   # change log + triggers
+    python calorie_bank.py refresh                   # recompute dirty users (run from cron)
+    python calorie_bank.py recompute --from 2026-01-01
+    python calorie_bank.py recompute --user <uuid> --from 2026-09-14
+    python calorie_bank.py recompute                 # every user, full history
+    python calorie_bank.py verify
+    python calorie_bank.py bench --users 2000 --days 1095
+"""
+
+import argparse
+import sys
+import time
+from datetime import date
+
+from db import session
+
+DIRTY_DDL = """
+CREATE TABLE IF NOT EXISTS calorie_bank_dirty (
+    user_id UUID PRIMARY KEY,
+    from_date DATE NOT NULL,
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION mark_calorie_bank_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('calorie_bank.recomputing', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO calorie_bank_dirty (user_id, from_date)
+        SELECT user_id, MIN(date) FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+            SET from_date = LEAST(calorie_bank_dirty.from_date, EXCLUDED.from_date);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO calorie_bank_dirty (user_id, from_date)
+        SELECT user_id, MIN(date) FROM old_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+            SET from_date = LEAST(calorie_bank_dirty.from_date, EXCLUDED.from_date);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS calorie_bank_dirty_insert ON calorie_bank;
+CREATE TRIGGER calorie_bank_dirty_insert
+    AFTER INSERT ON calorie_bank
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_calorie_bank_dirty();
+
+DROP TRIGGER IF EXISTS calorie_bank_dirty_update ON calorie_bank;
+CREATE TRIGGER calorie_bank_dirty_update
+    AFTER UPDATE ON calorie_bank
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_calorie_bank_dirty();
+
+DROP TRIGGER IF EXISTS calorie_bank_dirty_delete ON calorie_bank;
+CREATE TRIGGER calorie_bank_dirty_delete
+    AFTER DELETE ON calorie_bank
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_calorie_bank_dirty();
+"""
+
+# Per recompute transaction: skip our own triggers, and keep the UPDATE on
+# a nested loop of ctid lookups. The planner can't estimate how many rows
+# the lateral window returns; it overestimates and picks a hash join that
+# seq-scans all of calorie_bank on every batch.
+RECOMPUTE_SETTINGS_SQL = """
+SET LOCAL calorie_bank.recomputing = 'on';
+SET LOCAL enable_hashjoin = off;
+SET LOCAL enable_mergejoin = off;
+"""
+
+# targets(user_id, from_date) -> rewrite each user's suffix in one pass.
+# seeded looks up the balance carried into from_date once per user; the
+# lateral subquery then reads only rows on or after from_date from the
+# (user_id, date) index. The UPDATE finds rows again by ctid, which is
+# stable within the statement and avoids a hash join over the whole table.
+# A row changed concurrently gets a new ctid and is skipped; its own
+# trigger marks the user dirty again.
+RECOMPUTE_SQL = """
+WITH {targets},
+seeded AS (
+    SELECT t.user_id, t.from_date,
+           COALESCE((SELECT p.running_balance FROM calorie_bank p
+                     WHERE p.user_id = t.user_id AND p.date < t.from_date
+                     ORDER BY p.date DESC
+                     LIMIT 1), 0) AS carried
+    FROM targets t
+),
+recomputed AS (
+    SELECT r.*
+    FROM seeded t
+    CROSS JOIN LATERAL (
+        SELECT b.ctid AS row_ctid,
+               t.carried + SUM(COALESCE(b.banked_calories, 0)) OVER (ORDER BY b.date) AS running_balance
+        FROM calorie_bank b
+        WHERE b.user_id = t.user_id AND b.date >= t.from_date
+    ) r
+),
+updated AS (
+    UPDATE calorie_bank c
+    SET running_balance = r.running_balance
+    FROM recomputed r
+    WHERE c.ctid = r.row_ctid
+      AND c.running_balance IS DISTINCT FROM r.running_balance
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM targets), (SELECT count(*) FROM recomputed), (SELECT count(*) FROM updated)
+"""
+
+CLAIMED_TARGETS = """
+targets AS (
+    DELETE FROM calorie_bank_dirty d
+    WHERE d.user_id IN (
+        SELECT user_id FROM calorie_bank_dirty
+        ORDER BY user_id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING d.user_id, d.from_date
+)"""
+
+GIVEN_TARGETS = """
+targets AS (
+    SELECT user_id, %(from_date)s::date AS from_date
+    FROM unnest(%(user_ids)s::uuid[]) AS user_id
+)"""
+
+VERIFY_SQL = """
+SELECT count(*)
+FROM (
+    SELECT running_balance,
+           SUM(COALESCE(banked_calories, 0)) OVER (PARTITION BY user_id ORDER BY date) AS expected
+    FROM calorie_bank
+) b
+WHERE running_balance IS DISTINCT FROM expected
+"""
+
+
+def install(db):
+    db.execute('calorie bank ddl', DIRTY_DDL)
+    db.conn.commit()
+
+
+def refresh(db, batch_size=500):
+    """Drain calorie_bank_dirty batch by batch. Returns (users, rows scanned, rows updated)."""
+    totals = [0, 0, 0]
+    sql = RECOMPUTE_SQL.format(targets=CLAIMED_TARGETS)
+    while True:
+        db.execute('recompute settings', RECOMPUTE_SETTINGS_SQL)
+        users, scanned, updated = db.query('refresh batch', sql, {'batch_size': batch_size})[0]
+        db.conn.commit()
+        if not users:
+            break
+        totals[0] += users
+        totals[1] += scanned
+        totals[2] += updated
+    return tuple(totals)
+
+
+def recompute(db, user_ids=None, from_date=None, batch_size=500):
+    """
+    Recompute balances from from_date (default: the beginning) for user_ids
+    (default: every user with a row on or after from_date).
+    Returns (users, rows scanned, rows updated).
+    """
+    from_date = from_date or date.min
+    if user_ids is None:
+        user_ids = [row[0] for row in db.query('affected users', """
+            SELECT DISTINCT user_id FROM calorie_bank
+            WHERE date >= %s AND user_id IS NOT NULL
+            ORDER BY user_id
+        """, (from_date,))]
+    totals = [0, 0, 0]
+    sql = RECOMPUTE_SQL.format(targets=GIVEN_TARGETS)
+    for i in range(0, len(user_ids), batch_size):
+        db.execute('recompute settings', RECOMPUTE_SETTINGS_SQL)
+        users, scanned, updated = db.query('recompute batch', sql, {
+            'user_ids': [str(u) for u in user_ids[i:i + batch_size]], 'from_date': from_date,
+        })[0]
+        db.conn.commit()
+        totals[0] += users
+        totals[1] += scanned
+        totals[2] += updated
+    return tuple(totals)
+
+
+def verify(db):
+    """Return the number of rows whose stored running_balance is wrong."""
+    return db.query('verify', VERIFY_SQL)[0][0]
+
+
+def naive_recompute(db, user_ids, from_date):
+    """The per-row approach: walk each user's suffix and UPDATE one row at a time."""
+    updated = 0
+    for user_id in user_ids:
+        carried = db.query('carried balance', """
+            SELECT running_balance FROM calorie_bank
+            WHERE user_id = %s AND date < %s
+            ORDER BY date DESC LIMIT 1
+        """, (user_id, from_date))
+        balance = carried[0][0] if carried else 0
+        rows = db.query('suffix', """
+            SELECT date, banked_calories FROM calorie_bank
+            WHERE user_id = %s AND date >= %s
+            ORDER BY date
+        """, (user_id, from_date))
+        for day, banked in rows:
+            balance += banked or 0
+            db.execute('update row', """
+                UPDATE calorie_bank SET running_balance = %s WHERE user_id = %s AND date = %s
+            """, (balance, user_id, day))
+            updated += 1
+        db.conn.commit()
+        db.timings.clear()
+    return updated
+
+
+BENCH_SCHEMA = 'calorie_bank_bench'
+
+BENCH_SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+SET search_path = {BENCH_SCHEMA}, public;
+CREATE TABLE calorie_bank (LIKE public.calorie_bank INCLUDING DEFAULTS INCLUDING INDEXES);
+"""
+
+# running_balance starts out 0 everywhere; the first recompute fills it in.
+BENCH_LOAD_SQL = """
+INSERT INTO calorie_bank (user_id, date, banked_calories)
+SELECT u.id, CURRENT_DATE - d, (random() * 1000)::int - 500
+FROM (SELECT uuid_generate_v4() AS id FROM generate_series(1, %(users)s)) u
+CROSS JOIN generate_series(0, %(days)s - 1) d
+"""
+
+
+def bench(db, users, days, edited, edit_age, naive_users, keep=False):
+    """Compare windowed and per-row recomputes on a synthetic calorie_bank in a scratch schema."""
+    print(f"Building {BENCH_SCHEMA} with {users * days:,} rows ({users} users x {days} days)...")
+    try:
+        db.execute('bench setup', BENCH_SETUP_SQL)
+        started = time.perf_counter()
+        db.execute('bench load', BENCH_LOAD_SQL, {'users': users, 'days': days})
+        db.execute('analyze', "ANALYZE calorie_bank")
+        db.conn.commit()
+        print(f"  loaded in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        _, scanned, updated = recompute(db)
+        elapsed = time.perf_counter() - started
+        print(f"  full windowed recompute: {updated:,} rows in {elapsed:.1f}s ({scanned / elapsed:,.0f} rows/s)")
+
+        # Backdate one edit per user, edit_age days ago
+        user_ids = [row[0] for row in db.query('edited users', """
+            SELECT DISTINCT user_id FROM calorie_bank ORDER BY user_id LIMIT %s
+        """, (edited,))]
+        from_date = db.query('edit date', "SELECT CURRENT_DATE - %s", (edit_age,))[0][0]
+
+        def backdate():
+            db.execute('backdated edit', """
+                UPDATE calorie_bank SET banked_calories = banked_calories + 100
+                WHERE user_id = ANY(%s::uuid[]) AND date = %s
+            """, ([str(u) for u in user_ids], from_date))
+            db.conn.commit()
+
+        print(f"\n=== Backdated edit {edit_age} days ago for {len(user_ids)} users ===")
+        backdate()
+        naive_ids = user_ids[:naive_users]
+        started = time.perf_counter()
+        naive_rows = naive_recompute(db, naive_ids, from_date)
+        naive_elapsed = time.perf_counter() - started
+        naive_rate = naive_rows / naive_elapsed
+        print(f"  per-row updates      {len(naive_ids):>5} users  {naive_rows:>9,} rows  "
+              f"{naive_elapsed:7.2f}s  {naive_rate:>9,.0f} rows/s")
+
+        backdate()
+        started = time.perf_counter()
+        _, scanned, updated = recompute(db, user_ids, from_date)
+        suffix_elapsed = time.perf_counter() - started
+        print(f"  windowed from date   {len(user_ids):>5} users  {updated:>9,} rows  "
+              f"{suffix_elapsed:7.2f}s  {scanned / suffix_elapsed:>9,.0f} rows/s")
+
+        backdate()
+        started = time.perf_counter()
+        _, scanned, updated = recompute(db, user_ids)
+        full_elapsed = time.perf_counter() - started
+        print(f"  windowed full        {len(user_ids):>5} users  {updated:>9,} rows  "
+              f"{full_elapsed:7.2f}s  {scanned / full_elapsed:>9,.0f} rows/s  ({scanned:,} scanned)")
+
+        per_user_naive = naive_elapsed / max(len(naive_ids), 1)
+        per_user_window = suffix_elapsed / max(len(user_ids), 1)
+        print(f"  per user: per-row {per_user_naive * 1000:.1f} ms, windowed {per_user_window * 1000:.2f} ms "
+              f"({per_user_naive / per_user_window:.0f}x)")
+        print(f"  round trips per user: per-row {2 + naive_rows / max(len(naive_ids), 1):.0f}, "
+              f"windowed {1 / min(len(user_ids), 500):.3f}")
+        print(f"  verify: {verify(db)} wrong balances")
+    finally:
+        db.conn.rollback()
+        if not keep:
+            db.execute('bench teardown', f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        db.execute('reset search_path', "RESET search_path")
+        db.conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Keep calorie_bank running balances correct')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('install', help='Create the change log and triggers')
+    refresh_parser = sub.add_parser('refresh', help='Recompute users with backdated changes')
+    refresh_parser.add_argument('--batch-size', type=int, default=500, help='Users per statement')
+    recompute_parser = sub.add_parser('recompute', help='Recompute balances from a date')
+    recompute_parser.add_argument('--user', action='append', dest='users', help='User id (repeatable)')
+    recompute_parser.add_argument('--from', dest='from_date', type=date.fromisoformat,
+                                  help='First date to rewrite (default: all history)')
+    recompute_parser.add_argument('--batch-size', type=int, default=500, help='Users per statement')
+    sub.add_parser('verify', help='Check every stored balance')
+    bench_parser = sub.add_parser('bench', help='Windowed vs per-row recompute on synthetic data')
+    bench_parser.add_argument('--users', type=int, default=2000)
+    bench_parser.add_argument('--days', type=int, default=1095)
+    bench_parser.add_argument('--edited', type=int, default=500, help='Users with a backdated edit')
+    bench_parser.add_argument('--edit-age', type=int, default=180, help='How many days back the edit is')
+    bench_parser.add_argument('--naive-users', type=int, default=50,
+                              help='Users to recompute with per-row updates')
+    bench_parser.add_argument('--keep', action='store_true', help=f'Leave the {BENCH_SCHEMA} schema in place')
+    args = parser.parse_args(argv)
+
+    try:
+        with session(readonly=args.command == 'verify') as db:
+            if args.command == 'install':
+                install(db)
+                print("[SUCCESS] Installed calorie_bank_dirty and its triggers")
+            elif args.command in ('refresh', 'recompute'):
+                started = time.perf_counter()
+                if args.command == 'refresh':
+                    users, scanned, updated = refresh(db, args.batch_size)
+                else:
+                    users, scanned, updated = recompute(db, args.users, args.from_date, args.batch_size)
+                print(f"[SUCCESS] Recomputed {users} users: {scanned} rows scanned, {updated} updated "
+                      f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+            elif args.command == 'verify':
+                wrong = verify(db)
+                if wrong:
+                    print(f"[ERROR] {wrong} rows have a stale running_balance")
+                    return 1
+                print("[SUCCESS] All running balances are correct")
+            else:
+                bench(db, args.users, args.days, args.edited, args.edit_age, args.naive_users, args.keep)
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
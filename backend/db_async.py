@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+asyncio PostgreSQL access for the backend Python scripts
+
+The asyncpg counterpart of db.py, for tooling that runs many independent
+read queries (per-table introspection, row counts, index stats). It reads
+the same environment, and AsyncSession has the same query / query_dicts /
+execute / run_queries / print_timings methods as db.Session, taking the same
+%s or %(name)s placeholders, so SQL and helpers like db.column_query work
+unchanged.
+
+The difference: an AsyncSession holds the pool, not one connection. Each
+call borrows its own connection and runs in autocommit, so run_queries()
+executes its whole mapping concurrently, up to DB_POOL_MAX at a time. Use
+db.session() for anything that needs a transaction.
+
+Requires asyncpg (pip install asyncpg).
+
+Usage:
+    import asyncio
+    from db import column_query
+    from db_async import session
+
+    async def main():
+        async with session(readonly=True) as db:
+            results = await db.run_queries({t: column_query(t) for t in ('meals', 'users')})
+        db.print_timings()
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+import psycopg2.extensions
+
+from db import (APPLICATION_NAME, DSN_ENV_VAR, PRIMARY, READ_DSN_ENV_VAR, REPLICA, QueryTiming, check_replica,
+                describe_dsn, get_dsn)
+
+PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def convert_placeholders(sql, params):
+    """
+    Rewrite psycopg2-style placeholders as asyncpg's $1, $2, ...
+
+    Returns (sql, args). %(name)s may repeat and maps to one argument; %% is
+    a literal percent sign. Placeholders inside string literals aren't
+    special-cased, same as psycopg2.
+    """
+    args, names = [], {}
+    positional = iter(params or ()) if not isinstance(params, dict) else None
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1) is not None:
+            name = match.group(1)
+            if name not in names:
+                args.append(params[name])
+                names[name] = len(args)
+            return f"${names[name]}"
+        args.append(next(positional))
+        return f"${len(args)}"
+
+    if params is None:
+        return sql, args
+    return PLACEHOLDER_RE.sub(replace, sql), args
+
+
+def _connect_kwargs(dsn):
+    """asyncpg.create_pool keyword arguments for a libpq DSN (URL or key=value)."""
+    params = psycopg2.extensions.parse_dsn(dsn) if dsn else {}
+    kwargs = {
+        'host': params.get('host'),
+        'port': int(params['port']) if params.get('port') else None,
+        'user': params.get('user'),
+        'password': params.get('password'),
+        'database': params.get('dbname'),
+        'ssl': params.get('sslmode'),
+        'timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '10')),
+    }
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+async def create_pool(role=PRIMARY, readonly=False):
+    dsn = get_dsn(READ_DSN_ENV_VAR if role == REPLICA else DSN_ENV_VAR)
+    minconn = int(os.environ.get('DB_POOL_MIN', '1'))
+    maxconn = int(os.environ.get('DB_POOL_MAX', '4'))
+    label = ' (replica)' if role == REPLICA else ''
+    print(f"Connecting to {describe_dsn(dsn)}{label} (async pool {minconn}-{maxconn})...")
+    settings = {'application_name': APPLICATION_NAME}
+    if readonly:
+        settings['default_transaction_read_only'] = 'on'
+    return await asyncpg.create_pool(min_size=minconn, max_size=maxconn, server_settings=settings,
+                                     **_connect_kwargs(dsn))
+
+
+class AsyncSession:
+    """
+    A connection pool that records the timing of every query.
+
+    Every call borrows a connection for just that statement, so calls
+    gathered together run in parallel.
+    """
+
+    def __init__(self, pool, role=PRIMARY):
+        self.pool = pool
+        self.role = role
+        self.timings = []
+        self.wall_seconds = 0.0
+
+    async def _timed(self, label, sql, params, fetch, as_dicts=False):
+        sql, args = convert_placeholders(sql, params)
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            if fetch:
+                records = await conn.fetch(sql, *args)
+                result = [dict(r) for r in records] if as_dicts else [tuple(r) for r in records]
+                count = len(result)
+            else:
+                status = await conn.execute(sql, *args)
+                result = None
+                tail = status.rsplit(' ', 1)[-1]
+                count = int(tail) if tail.isdigit() else -1
+        self.timings.append(QueryTiming(label, time.perf_counter() - started, count))
+        return result
+
+    async def query(self, label, sql, params=None):
+        """Run sql and return all rows as tuples."""
+        return await self._timed(label, sql, params, fetch=True)
+
+    async def query_dicts(self, label, sql, params=None):
+        """Run sql and return all rows as dicts keyed by column name."""
+        return await self._timed(label, sql, params, fetch=True, as_dicts=True)
+
+    async def execute(self, label, sql, params=None):
+        """Run a statement that returns no rows; returns the affected row count."""
+        await self._timed(label, sql, params, fetch=False)
+        return self.timings[-1].rows
+
+    async def run_queries(self, queries):
+        """Run a mapping of label -> sql (or (sql, params)) concurrently and return label -> rows."""
+        started = time.perf_counter()
+        labels = list(queries)
+        statements = [queries[label] if isinstance(queries[label], tuple) else (queries[label], None)
+                      for label in labels]
+        rows = await asyncio.gather(*(self.query(label, sql, params)
+                                      for label, (sql, params) in zip(labels, statements)))
+        self.wall_seconds += time.perf_counter() - started
+        return dict(zip(labels, rows))
+
+    @property
+    def total_seconds(self):
+        return sum(t.seconds for t in self.timings)
+
+    def print_timings(self):
+        """Print a per-query timing table, with the wall time run_queries actually took."""
+        if not self.timings:
+            return
+        width = max(len(t.label) for t in self.timings)
+        print(f"\nQuery timings ({self.role}, async):")
+        for t in self.timings:
+            print(f"  {t.label:<{width}}  {t.seconds * 1000:8.1f} ms  {t.rows:>7} rows")
+        print(f"  {'total':<{width}}  {self.total_seconds * 1000:8.1f} ms")
+        if self.wall_seconds:
+            print(f"  {'wall (concurrent)':<{width}}  {self.wall_seconds * 1000:8.1f} ms")
+
+
+@asynccontextmanager
+async def session(readonly=False):
+    """
+    Open a pool wrapped in an AsyncSession and close it afterwards.
+
+    readonly=True uses the replica when db.check_replica() says it's usable,
+    and makes every statement READ ONLY either way.
+    """
+    role = REPLICA if readonly and check_replica()[0] else PRIMARY
+    pool = await create_pool(role, readonly)
+    try:
+        yield AsyncSession(pool, role)
+    finally:
+        await pool.close()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Current and longest habit streaks, maintained incrementally
+
+The habit_streaks view runs a window function over all of habit_completions
+and returns every historical streak group; callers only want each habit's
+current streak. This tool keeps one row per habit in habit_streak_state:
+
+    current_streak / current_streak_start   the most recent run of consecutive days
+    last_completed                          last day of that run
+    longest_streak / longest_streak_start   the longest run ever (earliest wins ties)
+
+- A trigger on habit_completions updates the row in O(1) when a completion
+  extends or starts a run (the normal case: logging today). Backdated
+  inserts, deletes and updates fall back to recompute_habit_streak(), which
+  re-derives one habit's state from its own completions.
+- `backfill` streams every completion ordered by (habit_id, date) through a
+  server-side cursor and computes all states in one sorted pass per habit,
+  then loads them with COPY.
+- `verify` checks the state table against the habit_streaks view; `bench`
+  does the same on ~10M synthetic completions in a scratch schema and times
+  lookups against the view.
+
+Whether a streak is still alive depends on today's date, so it isn't stored:
+a streak is active when last_completed >= CURRENT_DATE - 1.
+
+Usage:
+    python habit_streaks.py install       # state table, functions, trigger + backfill
+    python habit_streaks.py backfill
+    python habit_streaks.py verify
+    python habit_streaks.py bench --habits 30000 --days 365
+"""
+
+import argparse
+import io
+import sys
+import time
+from datetime import timedelta
+
+from db import format_latency, session, time_repeated
+
+ONE_DAY = timedelta(days=1)
+
+STREAK_DDL = """
+CREATE TABLE IF NOT EXISTS habit_streak_state (
+    habit_id UUID PRIMARY KEY,
+    current_streak INTEGER NOT NULL,
+    current_streak_start DATE NOT NULL,
+    last_completed DATE NOT NULL,
+    longest_streak INTEGER NOT NULL,
+    longest_streak_start DATE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Re-derive one habit's state from its completions (one sorted pass over
+-- that habit's rows via the UNIQUE (habit_id, date) index).
+CREATE OR REPLACE FUNCTION recompute_habit_streak(p_habit_id UUID)
+RETURNS void AS $$
+BEGIN
+    WITH runs AS (
+        SELECT date, date - ROW_NUMBER() OVER (ORDER BY date)::INTEGER AS streak_group
+        FROM habit_completions
+        WHERE habit_id = p_habit_id
+    ),
+    grouped AS (
+        SELECT MIN(date) AS start_date, MAX(date) AS end_date, COUNT(*)::INTEGER AS length
+        FROM runs
+        GROUP BY streak_group
+    ),
+    latest AS (SELECT * FROM grouped ORDER BY end_date DESC LIMIT 1),
+    longest AS (SELECT * FROM grouped ORDER BY length DESC, end_date ASC LIMIT 1)
+    INSERT INTO habit_streak_state AS s
+        (habit_id, current_streak, current_streak_start, last_completed,
+         longest_streak, longest_streak_start, updated_at)
+    SELECT p_habit_id, latest.length, latest.start_date, latest.end_date,
+           longest.length, longest.start_date, NOW()
+    FROM latest, longest
+    ON CONFLICT (habit_id) DO UPDATE SET
+        current_streak = EXCLUDED.current_streak,
+        current_streak_start = EXCLUDED.current_streak_start,
+        last_completed = EXCLUDED.last_completed,
+        longest_streak = EXCLUDED.longest_streak,
+        longest_streak_start = EXCLUDED.longest_streak_start,
+        updated_at = EXCLUDED.updated_at;
+
+    IF NOT FOUND THEN
+        DELETE FROM habit_streak_state WHERE habit_id = p_habit_id;
+    END IF;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION track_habit_streak()
+RETURNS TRIGGER AS $$
+DECLARE
+    s habit_streak_state%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF OLD.habit_id IS NOT NULL THEN
+            PERFORM recompute_habit_streak(OLD.habit_id);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        IF OLD.habit_id IS NOT DISTINCT FROM NEW.habit_id AND OLD.date = NEW.date THEN
+            RETURN NULL;
+        END IF;
+        IF OLD.habit_id IS NOT NULL THEN
+            PERFORM recompute_habit_streak(OLD.habit_id);
+        END IF;
+        IF NEW.habit_id IS NOT NULL AND NEW.habit_id IS DISTINCT FROM OLD.habit_id THEN
+            PERFORM recompute_habit_streak(NEW.habit_id);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF NEW.habit_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT * INTO s FROM habit_streak_state WHERE habit_id = NEW.habit_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        PERFORM recompute_habit_streak(NEW.habit_id);
+    ELSIF NEW.date = s.last_completed + 1 THEN
+        -- Extends the current run
+        UPDATE habit_streak_state SET
+            current_streak = s.current_streak + 1,
+            last_completed = NEW.date,
+            longest_streak = GREATEST(s.longest_streak, s.current_streak + 1),
+            longest_streak_start = CASE WHEN s.current_streak + 1 > s.longest_streak
+                                        THEN s.current_streak_start ELSE s.longest_streak_start END,
+            updated_at = NOW()
+        WHERE habit_id = NEW.habit_id;
+    ELSIF NEW.date > s.last_completed + 1 THEN
+        -- Gap: a new run starts
+        UPDATE habit_streak_state SET
+            current_streak = 1,
+            current_streak_start = NEW.date,
+            last_completed = NEW.date,
+            longest_streak = GREATEST(s.longest_streak, 1),
+            updated_at = NOW()
+        WHERE habit_id = NEW.habit_id;
+    ELSE
+        -- Backdated completion: may merge runs anywhere in the history
+        PERFORM recompute_habit_streak(NEW.habit_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS habit_completions_streak ON habit_completions;
+CREATE TRIGGER habit_completions_streak
+    AFTER INSERT OR UPDATE OR DELETE ON habit_completions
+    FOR EACH ROW
+    EXECUTE FUNCTION track_habit_streak();
+"""
+
+# Latest and longest group per habit, derived from the existing view. The
+# view's current_streak_start column is the gaps-and-islands group key
+# (date - row_number), which only grows with date, so the max key is the
+# most recent run.
+VERIFY_SQL = """
+WITH v AS (
+    SELECT habit_id, current_streak_start AS streak_group, streak_length
+    FROM habit_streaks
+    WHERE habit_id IS NOT NULL
+),
+latest AS (
+    SELECT DISTINCT ON (habit_id) habit_id, streak_length
+    FROM v
+    ORDER BY habit_id, streak_group DESC
+),
+longest AS (
+    SELECT habit_id, MAX(streak_length) AS longest_streak
+    FROM v
+    GROUP BY habit_id
+),
+expected AS (
+    SELECT l.habit_id, l.streak_length AS current_streak, g.longest_streak
+    FROM latest l
+    JOIN longest g USING (habit_id)
+)
+SELECT count(*)
+FROM expected e
+FULL JOIN habit_streak_state s USING (habit_id)
+WHERE e.habit_id IS NULL OR s.habit_id IS NULL
+   OR e.current_streak <> s.current_streak
+   OR e.longest_streak <> s.longest_streak;
+"""
+
+
+class StreakState:
+    """Streak state for one habit, fed completion dates in ascending order."""
+
+    __slots__ = ('habit_id', 'current_streak', 'current_streak_start', 'last_completed',
+                 'longest_streak', 'longest_streak_start')
+
+    def __init__(self, habit_id):
+        self.habit_id = habit_id
+        self.current_streak = 0
+        self.current_streak_start = None
+        self.last_completed = None
+        self.longest_streak = 0
+        self.longest_streak_start = None
+
+    def add(self, day):
+        last = self.last_completed
+        if last is not None and day <= last:
+            if day == last:
+                return
+            raise ValueError(f"completion {day} for {self.habit_id} arrived after {last}")
+        if last is not None and day - last == ONE_DAY:
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+            self.current_streak_start = day
+        self.last_completed = day
+        if self.current_streak > self.longest_streak:
+            self.longest_streak = self.current_streak
+            self.longest_streak_start = self.current_streak_start
+
+    def copy_line(self):
+        return (f"{self.habit_id}\t{self.current_streak}\t{self.current_streak_start}\t"
+                f"{self.last_completed}\t{self.longest_streak}\t{self.longest_streak_start}\n")
+
+
+def compute_states(rows):
+    """Turn (habit_id, date) rows sorted by habit then date into StreakState objects."""
+    state = None
+    for habit_id, day in rows:
+        if state is None or habit_id != state.habit_id:
+            if state is not None:
+                yield state
+            state = StreakState(habit_id)
+        state.add(day)
+    if state is not None:
+        yield state
+
+
+def _copy_states(db, buffer):
+    buffer.seek(0)
+    with db.conn.cursor() as cursor:
+        cursor.copy_expert("""
+            COPY habit_streak_staging (habit_id, current_streak, current_streak_start, last_completed,
+                                       longest_streak, longest_streak_start) FROM STDIN
+        """, buffer)
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def backfill(db, itersize=50000, flush_every=50000):
+    """
+    Recompute every habit's state in one streaming pass.
+
+    Completions come through a named (server-side) cursor, so memory stays at
+    one habit's state plus one COPY buffer regardless of table size. Returns
+    (completions read, habits written).
+    """
+    db.execute('staging table', """
+        CREATE TEMP TABLE IF NOT EXISTS habit_streak_staging
+            (LIKE habit_streak_state INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+    """)
+    db.execute('lock state', "LOCK TABLE habit_streak_state IN SHARE ROW EXCLUSIVE MODE")
+
+    started = time.perf_counter()
+    completions = habits = 0
+    buffer = io.StringIO()
+
+    def counted(cursor):
+        nonlocal completions
+        for row in cursor:
+            completions += 1
+            yield row
+
+    with db.conn.cursor(name='habit_completions_sorted') as cursor:
+        cursor.itersize = itersize
+        cursor.execute("""
+            SELECT habit_id, date FROM habit_completions
+            WHERE habit_id IS NOT NULL
+            ORDER BY habit_id, date
+        """)
+        for state in compute_states(counted(cursor)):
+            buffer.write(state.copy_line())
+            habits += 1
+            if habits % flush_every == 0:
+                _copy_states(db, buffer)
+    _copy_states(db, buffer)
+
+    db.execute('delete stale', """
+        DELETE FROM habit_streak_state s
+        WHERE NOT EXISTS (SELECT 1 FROM habit_streak_staging t WHERE t.habit_id = s.habit_id)
+    """)
+    db.execute('upsert states', """
+        INSERT INTO habit_streak_state
+            (habit_id, current_streak, current_streak_start, last_completed,
+             longest_streak, longest_streak_start, updated_at)
+        SELECT habit_id, current_streak, current_streak_start, last_completed,
+               longest_streak, longest_streak_start, NOW()
+        FROM habit_streak_staging
+        ON CONFLICT (habit_id) DO UPDATE SET
+            current_streak = EXCLUDED.current_streak,
+            current_streak_start = EXCLUDED.current_streak_start,
+            last_completed = EXCLUDED.last_completed,
+            longest_streak = EXCLUDED.longest_streak,
+            longest_streak_start = EXCLUDED.longest_streak_start,
+            updated_at = EXCLUDED.updated_at
+    """)
+    db.conn.commit()
+
+    elapsed = time.perf_counter() - started
+    rate = completions / elapsed if elapsed else 0
+    print(f"  backfill: {completions:,} completions -> {habits:,} habits in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return completions, habits
+
+
+def install(db):
+    db.execute('streak ddl', STREAK_DDL)
+    db.conn.commit()
+    return backfill(db)
+
+
+def verify(db):
+    """Return the number of habits whose state disagrees with the view."""
+    return db.query('verify', VERIFY_SQL)[0][0]
+
+
+BENCH_SCHEMA = 'habit_streaks_bench'
+
+BENCH_SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+SET search_path = {BENCH_SCHEMA}, public;
+CREATE TABLE habit_completions (LIKE public.habit_completions INCLUDING DEFAULTS INCLUDING INDEXES);
+CREATE VIEW habit_streaks AS
+WITH consecutive_days AS (
+    SELECT
+        habit_id,
+        date,
+        date - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY date)::INTEGER AS streak_group
+    FROM habit_completions
+)
+SELECT
+    habit_id,
+    MAX(streak_group) as current_streak_start,
+    COUNT(*) as streak_length
+FROM consecutive_days
+GROUP BY habit_id, streak_group
+ORDER BY habit_id, streak_group DESC;
+"""
+
+# Each habit completes on a given day with probability %(rate)s, which gives
+# realistic run lengths (mean 1 / (1 - rate)).
+BENCH_LOAD_SQL = """
+INSERT INTO habit_completions (habit_id, date)
+SELECT h.id, CURRENT_DATE - d
+FROM (SELECT uuid_generate_v4() AS id FROM generate_series(1, %(habits)s)) h
+CROSS JOIN generate_series(1, %(days)s) d
+WHERE random() < %(rate)s;
+"""
+
+
+def bench(db, habits, days, rate, repeat, keep=False):
+    """Backfill, verify and time lookups on synthetic completions in a scratch schema."""
+    print(f"Building {BENCH_SCHEMA} with ~{int(habits * days * rate):,} completions "
+          f"({habits} habits x {days} days at {rate:.0%})...")
+    try:
+        db.execute('bench setup', BENCH_SETUP_SQL)
+        started = time.perf_counter()
+        db.execute('bench load', BENCH_LOAD_SQL, {'habits': habits, 'days': days, 'rate': rate})
+        db.execute('analyze', "ANALYZE habit_completions")
+        db.conn.commit()
+        print(f"  loaded in {time.perf_counter() - started:.1f}s")
+
+        install(db)
+        started = time.perf_counter()
+        mismatches = verify(db)
+        print(f"  verify against view: {mismatches} mismatched habits "
+              f"({time.perf_counter() - started:.1f}s)")
+        db.conn.commit()
+
+        habit_id = db.query('pick habit', "SELECT habit_id FROM habit_streak_state LIMIT 1 OFFSET %s",
+                            (habits // 2,))[0][0]
+        habit_ids = [row[0] for row in db.query(
+            'pick habits', "SELECT habit_id FROM habit_streak_state LIMIT 10 OFFSET %s", (habits // 3,))]
+
+        cases = [
+            ('Current streak (one habit)',
+             "SELECT streak_length FROM habit_streaks WHERE habit_id = %(habit_id)s LIMIT 1",
+             "SELECT current_streak FROM habit_streak_state WHERE habit_id = %(habit_id)s"),
+            ('Current + longest (10 habits)',
+             "SELECT DISTINCT ON (habit_id) habit_id, streak_length, "
+             "MAX(streak_length) OVER (PARTITION BY habit_id) "
+             "FROM habit_streaks WHERE habit_id = ANY(%(habit_ids)s::uuid[]) "
+             "ORDER BY habit_id, current_streak_start DESC",
+             "SELECT habit_id, current_streak, longest_streak FROM habit_streak_state "
+             "WHERE habit_id = ANY(%(habit_ids)s::uuid[])"),
+        ]
+        params = {'habit_id': habit_id, 'habit_ids': habit_ids}
+        print(f"\n=== Lookup latency ({repeat} runs each) ===")
+        for name, view_sql, state_sql in cases:
+            view_ms = time_repeated(db, f'view: {name}', view_sql, params, repeat)
+            state_ms = time_repeated(db, f'state: {name}', state_sql, params, repeat)
+            print(f"\n{name}:")
+            print(f"  view   {format_latency(view_ms)}")
+            print(f"  state  {format_latency(state_ms)}")
+
+        print("\n=== Incremental maintenance ===")
+        started = time.perf_counter()
+        appended = db.execute('append today', """
+            INSERT INTO habit_completions (habit_id, date)
+            SELECT habit_id, CURRENT_DATE FROM habit_streak_state LIMIT 1000
+        """)
+        db.conn.commit()
+        print(f"  {appended} same-day completions applied in "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms (trigger, O(1) path)")
+        started = time.perf_counter()
+        backdated = db.execute('backdate', """
+            DELETE FROM habit_completions
+            WHERE (habit_id, date) IN (
+                SELECT habit_id, CURRENT_DATE - 3 FROM habit_streak_state LIMIT 200
+            )
+        """)
+        db.conn.commit()
+        print(f"  {backdated} backdated deletes applied in "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms (trigger, recompute path)")
+        print(f"  verify after updates: {verify(db)} mismatched habits")
+    finally:
+        db.conn.rollback()
+        if not keep:
+            db.execute('bench teardown', f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        db.execute('reset search_path', "RESET search_path")
+        db.conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain per-habit current and longest streaks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('install', help='Create the state table and trigger, then backfill')
+    sub.add_parser('backfill', help='Recompute every habit in one sorted pass')
+    sub.add_parser('verify', help='Compare the state table with the habit_streaks view')
+    bench_parser = sub.add_parser('bench', help='Benchmark on synthetic completions')
+    bench_parser.add_argument('--habits', type=int, default=30000)
+    bench_parser.add_argument('--days', type=int, default=365)
+    bench_parser.add_argument('--rate', type=float, default=0.92, help='Daily completion probability')
+    bench_parser.add_argument('--repeat', type=int, default=50)
+    bench_parser.add_argument('--keep', action='store_true', help=f'Leave the {BENCH_SCHEMA} schema in place')
+    args = parser.parse_args(argv)
+
+    try:
+        with session(readonly=args.command == 'verify') as db:
+            if args.command == 'install':
+                install(db)
+                print("[SUCCESS] Streak tracking installed")
+            elif args.command == 'backfill':
+                backfill(db)
+                print("[SUCCESS] Backfill complete")
+            elif args.command == 'verify':
+                mismatches = verify(db)
+                if mismatches:
+                    print(f"[ERROR] {mismatches} habits differ from the habit_streaks view")
+                    return 1
+                print("[SUCCESS] Streak state matches habit_streaks")
+            else:
+                bench(db, args.habits, args.days, args.rate, args.repeat, args.keep)
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
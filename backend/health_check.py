@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Multi-table database health check, sync or async
+
+For every table in the public schema, fetches its columns, an exact row
+count and its index usage (scans and size), then prints a summary and
+flags empty tables and never-scanned indexes. That is three independent
+queries per table. db.Session runs them one after another; db_async runs
+them concurrently over a small pool, which matters once every round trip
+costs tens of milliseconds (a hosted database from a laptop).
+
+`bench` shows the difference on a high-latency link without needing one:
+it starts a local TCP proxy in front of DATABASE_URL that holds every
+packet for half of --rtt-ms in each direction, then runs the health check
+both ways through it.
+
+Usage:
+    python health_check.py                    # async (default)
+    python health_check.py --sync
+    python health_check.py bench --rtt-ms 0 20 50 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import psycopg2.extensions
+
+import db
+from db import column_query, format_latency, percentile
+
+TABLES_SQL = """
+    SELECT table_name FROM information_schema.tables
+    WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+    ORDER BY table_name
+"""
+
+INDEX_STATS_SQL = """
+    SELECT indexrelname, idx_scan, pg_relation_size(indexrelid)
+    FROM pg_stat_user_indexes
+    WHERE schemaname = 'public' AND relname = %s
+    ORDER BY indexrelname
+"""
+
+
+def health_queries(tables):
+    """label -> (sql, params): columns, row count and index stats for each table."""
+    queries = {}
+    for table in tables:
+        quoted = '"' + table.replace('"', '""') + '"'
+        queries[f'{table} columns'] = column_query(table)
+        queries[f'{table} rows'] = (f"SELECT count(*) FROM public.{quoted}", None)
+        queries[f'{table} indexes'] = (INDEX_STATS_SQL, (table,))
+    return queries
+
+
+def print_report(tables, results):
+    print(f"\n{'table':<28} {'columns':>7} {'rows':>10} {'indexes':>7}  notes")
+    warnings = 0
+    for table in tables:
+        indexes = results[f'{table} indexes']
+        rows = results[f'{table} rows'][0][0]
+        notes = []
+        if not rows:
+            notes.append('empty')
+        unused = [name for name, scans, _size in indexes if not scans]
+        if rows and unused:
+            notes.append(f"{len(unused)} never scanned")
+        warnings += bool(notes)
+        print(f"{table:<28} {len(results[f'{table} columns']):>7} {rows:>10,} {len(indexes):>7}  "
+              f"{', '.join(notes)}")
+    return warnings
+
+
+# Both runners stay on the primary: pg_stat_user_indexes counters are per
+# server, so a replica would report every index as never scanned.
+
+
+def run_sync():
+    """Return (tables, results, session) using db.Session, one query at a time."""
+    with db.session() as session:
+        tables = [row[0] for row in session.query('tables', TABLES_SQL)]
+        results = session.run_queries(health_queries(tables))
+    return tables, results, session
+
+
+async def check_async(session):
+    """Return (tables, results) on an open AsyncSession: the table list, then one concurrent batch."""
+    tables = [row[0] for row in await session.query('tables', TABLES_SQL)]
+    return tables, await session.run_queries(health_queries(tables))
+
+
+async def run_async():
+    """Return (tables, results, session) using db_async."""
+    import db_async  # asyncpg is only needed without --sync
+
+    async with db_async.session() as session:
+        tables, results = await check_async(session)
+    return tables, results, session
+
+
+class LatencyProxy:
+    """
+    Local TCP proxy to a Postgres server that delays traffic in both directions.
+
+    Each chunk read is forwarded half an rtt later, in order, so every
+    round trip through the proxy costs rtt_ms. Bandwidth is not limited.
+    Runs its own event loop in a daemon thread.
+    """
+
+    def __init__(self, host, port, rtt_ms):
+        self.host = host or 'localhost'
+        self.target_port = int(port or 5432)
+        self.delay = rtt_ms / 2000
+        self.port = None
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _shutdown(self):
+        self.server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _handle(self, client_reader, client_writer):
+        if self.host.startswith('/'):
+            upstream = await asyncio.open_unix_connection(f"{self.host}/.s.PGSQL.{self.target_port}")
+        else:
+            upstream = await asyncio.open_connection(self.host, self.target_port)
+        upstream_reader, upstream_writer = upstream
+        try:
+            await asyncio.gather(self._pipe(client_reader, upstream_writer),
+                                 self._pipe(upstream_reader, client_writer), return_exceptions=True)
+        except asyncio.CancelledError:
+            pass  # stop() tearing down open connections
+
+    async def _pipe(self, reader, writer):
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    break
+                wait = due - self.loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                queue.put_nowait((self.loop.time() + self.delay, data))
+            queue.put_nowait((0, None))
+            await sender
+        finally:
+            sender.cancel()
+            writer.close()
+
+
+async def bench_async(repeat):
+    """Connect once, then time repeat health checks on the warm pool. Returns (connect_ms, run_ms)."""
+    import db_async
+
+    started = time.perf_counter()
+    async with db_async.session() as session:
+        await session.query('warmup', "SELECT 1")
+        connect_ms = (time.perf_counter() - started) * 1000
+        run_ms = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await check_async(session)
+            run_ms.append((time.perf_counter() - started) * 1000)
+    return connect_ms, run_ms
+
+
+def bench(rtts, concurrency, repeat):
+    """
+    Time the sync and async health checks through a proxy at each round-trip time.
+
+    Both sides are timed on warm connections; the async pool's connect time
+    (all --concurrency connections, opened up front) is reported separately.
+    """
+    dsn = db.get_dsn()
+    params = psycopg2.extensions.parse_dsn(dsn) if dsn else {}
+    os.environ['DB_POOL_MIN'] = os.environ['DB_POOL_MAX'] = str(concurrency)
+
+    for rtt in rtts:
+        proxy = LatencyProxy(params.get('host') or os.environ.get('PGHOST'),
+                             params.get('port') or os.environ.get('PGPORT'), rtt).start()
+        os.environ[db.DSN_ENV_VAR] = psycopg2.extensions.make_dsn(dsn, host='127.0.0.1', port=proxy.port)
+        try:
+            print(f"\n=== {rtt:g} ms round trip ===")
+            with db.session() as session:
+                session.query('warmup', "SELECT 1")
+            sync_ms = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                tables, _, _ = run_sync()
+                sync_ms.append((time.perf_counter() - started) * 1000)
+            connect_ms, async_ms = asyncio.run(bench_async(repeat))
+
+            print(f"  {1 + 3 * len(tables)} queries over {len(tables)} tables")
+            print(f"  sync   {format_latency(sync_ms)}")
+            print(f"  async  {format_latency(async_ms)}  (pool of {concurrency}, "
+                  f"{connect_ms:.0f} ms to connect)")
+            print(f"  speedup {percentile(sync_ms, 50) / percentile(async_ms, 50):.1f}x at p50")
+        finally:
+            db.close_pool()
+            proxy.stop()
+            os.environ[db.DSN_ENV_VAR] = dsn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check every table: columns, row count, index usage')
+    parser.add_argument('--sync', action='store_true', help='Use db.Session instead of db_async')
+    parser.add_argument('--timings', action='store_true', help='Print per-query timings')
+    sub = parser.add_subparsers(dest='command')
+    bench_parser = sub.add_parser('bench', help='Sync vs async through a latency-injecting proxy')
+    bench_parser.add_argument('--rtt-ms', type=float, nargs='+', default=[0, 20, 50])
+    bench_parser.add_argument('--concurrency', type=int, default=8, help='Async pool size')
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'bench':
+            bench(args.rtt_ms, args.concurrency, args.repeat)
+            print("\n[SUCCESS] Benchmark complete")
+            return 0
+
+        started = time.perf_counter()
+        tables, results, session = run_sync() if args.sync else asyncio.run(run_async())
+        elapsed = time.perf_counter() - started
+        warnings = print_report(tables, results)
+        if args.timings:
+            session.print_timings()
+        print(f"\nChecked {len(tables)} tables with {len(session.timings)} queries in {elapsed * 1000:.0f} ms "
+              f"({'sync' if args.sync else 'async'})")
+        if warnings:
+            print(f"[WARNING] {warnings} tables need a look")
+        else:
+            print("[SUCCESS] All tables look healthy")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
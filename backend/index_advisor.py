@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Index advisor driven by pg_stat_statements and EXPLAIN
+
+Looks at what the database is actually asked to do and which indexes it
+actually uses, then suggests changes:
+
+- Workload: the top statements from pg_stat_statements by total execution
+  time, plus the load_test.py scenarios run for a real user. When the
+  extension isn't installed only the scenarios are used.
+- Plans: EXPLAIN (ANALYZE, BUFFERS) for runnable SELECTs, and a generic plan
+  (PG 16+) for normalized pg_stat_statements text with $n parameters.
+- Index usage: scans and size per index from pg_stat_user_indexes. Indexes
+  that were never scanned are flagged as unused, and plain btree indexes
+  whose columns are a leading prefix of another index on the same table
+  are flagged as redundant.
+- Proposals: for each scan in the plans that filters on columns no index
+  leads with, a composite index with the equality columns first and the
+  range (or sort) column last, plus INCLUDE columns when a few narrow
+  columns would make it an index-only scan.
+
+Estimated benefit is the planner cost before and after. With hypopg
+installed the proposals are costed as hypothetical indexes. With
+--validate they are really built inside a transaction, every affected query
+is re-run with EXPLAIN ANALYZE and the transaction is rolled back; that
+holds a SHARE lock on each table while it runs, so use it on a copy or on
+data from synthetic_data.py, not production.
+
+Usage:
+    python synthetic_data.py load --users 1000 --days 180
+    python index_advisor.py
+    python index_advisor.py --validate --top 20
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+
+import psycopg2
+
+from db import session
+from load_test import SCENARIOS, sample_users
+
+SCAN_NODES = {'Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+
+# column <op> ... on the left-hand side of a condition, optionally alias-qualified
+CONDITION_RE = re.compile(r'\(\s*(?:"?(\w+)"?\.)?"?(\w+)"?\s+(=|>=|<=|>|<)\s+(ANY\b)?')
+PARAM_RE = re.compile(r'\$\d+')
+
+# Proposals that don't improve the plan by at least this much are dropped.
+MIN_IMPROVEMENT = 0.10
+
+TOP_STATEMENTS_SQL = """
+SELECT query, calls, {total} AS total_ms, {total} / NULLIF(calls, 0) AS mean_ms, rows,
+       shared_blks_hit, shared_blks_read
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+  AND query !~* '^\\s*(EXPLAIN|SET|RESET|BEGIN|COMMIT|ROLLBACK|SHOW|ANALYZE|VACUUM)\\y'
+  AND query !~* 'pg_stat_statements|pg_catalog|information_schema'
+ORDER BY {total} DESC
+LIMIT %s
+"""
+
+INDEXES_SQL = """
+SELECT t.relname AS table_name,
+       i.relname AS index_name,
+       am.amname AS method,
+       x.indisunique AS is_unique,
+       x.indisprimary AS is_primary,
+       x.indpred IS NOT NULL AS is_partial,
+       x.indexprs IS NOT NULL AS has_expressions,
+       ARRAY(
+           SELECT a.attname FROM unnest(x.indkey[:x.indnkeyatts - 1]) WITH ORDINALITY k(attnum, n)
+           JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+           ORDER BY k.n
+       ) AS columns,
+       ARRAY(
+           SELECT a.attname FROM unnest(x.indkey[x.indnkeyatts:]) WITH ORDINALITY k(attnum, n)
+           JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+           ORDER BY k.n
+       ) AS include_columns,
+       COALESCE(s.idx_scan, 0) AS scans,
+       pg_relation_size(i.oid) AS size_bytes,
+       pg_size_pretty(pg_relation_size(i.oid)) AS size
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_class t ON t.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+JOIN pg_am am ON am.oid = i.relam
+LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = x.indexrelid
+WHERE n.nspname = current_schema() AND t.relkind IN ('r', 'p')
+ORDER BY t.relname, i.relname
+"""
+
+COLUMNS_SQL = """
+SELECT c.relname, a.attname, a.attlen > 0 AS fixed_width
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND a.attnum > 0 AND NOT a.attisdropped
+"""
+
+
+class WorkloadQuery:
+    """One statement to plan: a scenario with params or a pg_stat_statements entry."""
+
+    def __init__(self, label, sql, params=None, calls=None, total_ms=None, mean_ms=None):
+        self.label = label
+        self.sql = sql
+        self.params = params
+        self.calls = calls
+        self.total_ms = total_ms
+        self.mean_ms = mean_ms
+        self.plan = None
+
+    @property
+    def generic(self):
+        """True when the text has $n placeholders we have no values for."""
+        return self.params is None and bool(PARAM_RE.search(self.sql))
+
+    @property
+    def is_select(self):
+        return bool(re.match(r'^\s*(SELECT|WITH\s+\w+\s+AS\s*\(\s*SELECT)\b', self.sql, re.IGNORECASE))
+
+
+class Proposal:
+    """A suggested index and the queries it should help."""
+
+    def __init__(self, table, columns, include, reason):
+        self.table = table
+        self.columns = columns
+        self.include = include
+        self.reasons = [reason]
+        self.queries = []
+        self.before = {}
+        self.after = {}
+
+    @property
+    def name(self):
+        short = [c[:-3] if c.endswith('_id') else c for c in self.columns]
+        return f"idx_{self.table}_{'_'.join(short)}" + ('_covering' if self.include else '')
+
+    def ddl(self, concurrently=False):
+        include = f" INCLUDE ({', '.join(self.include)})" if self.include else ''
+        keyword = 'INDEX CONCURRENTLY IF NOT EXISTS' if concurrently else 'INDEX'
+        return f"CREATE {keyword} {self.name} ON {self.table}({', '.join(self.columns)}){include}"
+
+    @property
+    def key(self):
+        return (self.table, tuple(self.columns), tuple(self.include))
+
+
+def pg_stat_statements_available(db):
+    """True if the extension is installed and loaded in this database."""
+    if not db.query('pgss installed', "SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'"):
+        return False
+    try:
+        db.execute('pgss savepoint', "SAVEPOINT pgss_probe")
+        db.query('pgss probe', "SELECT 1 FROM pg_stat_statements LIMIT 1")
+        db.execute('pgss release', "RELEASE SAVEPOINT pgss_probe")
+        return True
+    except psycopg2.Error:
+        db.execute('pgss rollback', "ROLLBACK TO SAVEPOINT pgss_probe")
+        return False
+
+
+def top_statements(db, limit):
+    server_version = db.conn.server_version
+    total = 'total_exec_time' if server_version >= 130000 else 'total_time'
+    rows = db.query_dicts('top statements', TOP_STATEMENTS_SQL.format(total=total), (limit,))
+    return [WorkloadQuery(f"pgss #{n}", row['query'], calls=row['calls'],
+                          total_ms=row['total_ms'], mean_ms=row['mean_ms'])
+            for n, row in enumerate(rows, 1)]
+
+
+def scenario_queries(db, names=None):
+    users = sample_users(db, 1, seed=7)
+    if not users:
+        return []
+    return [WorkloadQuery(name, sql, {'user_id': users[0]}) for name, sql in SCENARIOS.items()
+            if names is None or name in names]
+
+
+def explain(db, query, analyze):
+    """Return the JSON plan for query, or None if it can't be planned here."""
+    if query.generic:
+        if db.conn.server_version < 160000:
+            return None
+        options = 'GENERIC_PLAN, VERBOSE, FORMAT JSON'
+    elif analyze and query.is_select:
+        options = 'ANALYZE, BUFFERS, VERBOSE, FORMAT JSON'
+    else:
+        options = 'VERBOSE, FORMAT JSON'
+    try:
+        db.execute('explain savepoint', "SAVEPOINT advisor_explain")
+        rows = db.query(f'explain {query.label}', f"EXPLAIN ({options}) {query.sql}", query.params)
+        db.execute('explain release', "RELEASE SAVEPOINT advisor_explain")
+    except psycopg2.Error as e:
+        db.execute('explain rollback', "ROLLBACK TO SAVEPOINT advisor_explain")
+        print(f"  [WARNING] Could not plan {query.label}: {e.pgerror.strip() if e.pgerror else e}")
+        return None
+    plan = rows[0][0]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return plan[0]
+
+
+def plan_cost(plan):
+    return plan['Plan']['Total Cost']
+
+
+def plan_summary(plan):
+    """(total cost, execution ms or None, shared buffers touched or None)."""
+    top = plan['Plan']
+    buffers = None
+    if 'Shared Hit Blocks' in top:
+        buffers = top['Shared Hit Blocks'] + top.get('Shared Read Blocks', 0)
+    return top['Total Cost'], plan.get('Execution Time'), buffers
+
+
+def walk_scans(node, sort_keys=()):
+    """Yield (scan node, sort keys of the Sort directly above it)."""
+    node_type = node['Node Type']
+    if node_type in SCAN_NODES:
+        yield node, sort_keys
+    if node_type in ('Sort', 'Incremental Sort'):
+        child_keys = tuple(node.get('Sort Key', ()))
+    elif node_type == 'Limit':
+        child_keys = sort_keys
+    else:
+        child_keys = ()
+    for child in node.get('Plans', ()):
+        yield from walk_scans(child, child_keys)
+
+
+def scan_conditions(node):
+    """Return (equality columns, range columns) the scan filters its relation on."""
+    alias = node.get('Alias')
+    text = ' '.join(node.get(key, '') for key in ('Index Cond', 'Recheck Cond', 'Filter'))
+    equality, ranges = [], []
+    for qualifier, column, op, _any in CONDITION_RE.findall(text):
+        if qualifier and qualifier not in (alias, node.get('Relation Name')):
+            continue
+        target = equality if op == '=' else ranges
+        if column not in equality and column not in ranges:
+            target.append(column)
+    return equality, ranges
+
+
+def output_columns(node):
+    alias = node.get('Alias')
+    columns = []
+    for item in node.get('Output', ()):
+        match = re.fullmatch(r'(?:"?(\w+)"?\.)?"?(\w+)"?', item.strip())
+        if match and match.group(1) in (None, alias, node.get('Relation Name')):
+            columns.append(match.group(2))
+        else:
+            return None  # expressions: an index-only scan is unlikely
+    return columns
+
+
+def propose(queries, indexes, table_columns):
+    """Derive composite/covering index proposals from the scans in each plan."""
+    by_table = {}
+    for index in indexes:
+        by_table.setdefault(index['table_name'], []).append(index)
+
+    proposals = {}
+    for query in queries:
+        if query.plan is None:
+            continue
+        for node, sort_keys in walk_scans(query.plan['Plan']):
+            table = node.get('Relation Name')
+            if table not in table_columns:
+                continue
+            equality, ranges = scan_conditions(node)
+            equality = [c for c in equality if c in table_columns[table]]
+            ranges = [c for c in ranges if c in table_columns[table]]
+            if not equality and not ranges:
+                continue
+
+            columns = list(equality)
+            trailing = ranges[:1]
+            if not trailing and sort_keys:
+                match = re.match(r'(?:"?(\w+)"?\.)?"?(\w+)"?(\s+DESC)?$', sort_keys[0])
+                if match and match.group(2) in table_columns[table] and match.group(2) not in columns:
+                    trailing = [match.group(2)]
+            columns += trailing
+            if len(columns) < 2 and node['Node Type'] != 'Seq Scan':
+                continue  # a single-column index already serves this scan
+
+            existing = by_table.get(table, [])
+            covered = next((ix for ix in existing
+                            if sorted(ix['columns'][:len(equality)]) == sorted(equality)
+                            and ix['columns'][len(equality):len(columns)] == trailing), None)
+
+            include = []
+            outputs = output_columns(node)
+            if outputs is not None and node['Node Type'] != 'Index Only Scan':
+                extra = [c for c in dict.fromkeys(outputs) if c not in columns]
+                if 0 < len(extra) <= 3 and all(table_columns[table].get(c) for c in extra):
+                    include = extra
+
+            if covered is not None:
+                have = set(covered['columns']) | set(covered['include_columns'])
+                if not include or set(include) <= have:
+                    continue
+                reason = (f"{query.label}: {node['Node Type']} on {table} via {covered['index_name']} "
+                          f"also reads the heap for {', '.join(include)}")
+            else:
+                filtered = node.get('Rows Removed by Filter')
+                detail = f", {filtered} rows removed by filter" if filtered else ''
+                reason = (f"{query.label}: {node['Node Type']} on {table} filters "
+                          f"{' AND '.join(columns)}{detail}")
+                include = include if node['Node Type'] in ('Index Scan', 'Bitmap Heap Scan') else []
+
+            proposal = Proposal(table, columns, include, reason)
+            if proposal.key in proposals:
+                proposal = proposals[proposal.key]
+                if reason not in proposal.reasons:
+                    proposal.reasons.append(reason)
+            else:
+                proposals[proposal.key] = proposal
+            if query not in proposal.queries:
+                proposal.queries.append(query)
+    return list(proposals.values())
+
+
+def find_redundant(indexes, proposals=()):
+    """
+    Return [(index, covering index name)] for plain btree indexes whose key
+    columns lead another index (existing or proposed) on the same table.
+    Unique and primary-key indexes enforce constraints and are never flagged.
+    """
+    candidates = [(ix['table_name'], ix['index_name'], ix['columns']) for ix in indexes
+                  if ix['method'] == 'btree' and not ix['is_partial'] and not ix['has_expressions']]
+    candidates += [(p.table, f"{p.name} (proposed)", p.columns) for p in proposals]
+    redundant = []
+    for index in indexes:
+        if (index['is_unique'] or index['is_primary'] or index['is_partial'] or index['has_expressions']
+                or index['method'] != 'btree'):
+            continue
+        columns = index['columns']
+        for table, name, other in candidates:
+            if table != index['table_name'] or name == index['index_name']:
+                continue
+            if other[:len(columns)] == columns and (len(other) > len(columns) or name < index['index_name']):
+                redundant.append((index, name))
+                break
+    return redundant
+
+
+def measure(db, queries, analyze, repeat):
+    """Median plan summary per query label over repeat EXPLAIN runs."""
+    results = {}
+    for query in queries:
+        runs = [explain(db, query, analyze) for _ in range(repeat if analyze and not query.generic else 1)]
+        runs = [r for r in runs if r is not None]
+        if not runs:
+            continue
+        summaries = [plan_summary(r) for r in runs]
+        cost = summaries[0][0]
+        times = [s[1] for s in summaries if s[1] is not None]
+        buffers = summaries[-1][2]
+        results[query.label] = (cost, statistics.median(times) if times else None, buffers)
+    return results
+
+
+def has_hypopg(db):
+    return bool(db.query('hypopg', "SELECT 1 FROM pg_extension WHERE extname = 'hypopg'"))
+
+
+def estimate(db, proposals, validate, repeat):
+    """
+    Fill proposal.before / proposal.after with (cost, ms, buffers) per query.
+
+    Each proposal is tried on its own: hypothetically with hypopg, or for real
+    inside a savepoint that is rolled back with --validate.
+    """
+    use_hypopg = not validate and has_hypopg(db)
+    if not validate and not use_hypopg:
+        print("\n[WARNING] hypopg is not installed; benefit is not estimated. "
+              "Re-run with --validate on a non-production database to build and measure each proposal.")
+        return False
+
+    for proposal in proposals:
+        proposal.before = measure(db, proposal.queries, validate, repeat)
+        if use_hypopg:
+            db.query('hypopg create', "SELECT * FROM hypopg_create_index(%s)", (proposal.ddl(),))
+            proposal.after = measure(db, proposal.queries, False, 1)
+            db.query('hypopg reset', "SELECT hypopg_reset()")
+        else:
+            db.execute('validate savepoint', "SAVEPOINT advisor_validate")
+            try:
+                db.execute(f'build {proposal.name}', proposal.ddl())
+                proposal.after = measure(db, proposal.queries, True, repeat)
+            finally:
+                db.execute('validate rollback', "ROLLBACK TO SAVEPOINT advisor_validate")
+    return True
+
+
+def improvement(proposal):
+    """Best relative improvement across the proposal's queries (time if measured, else cost)."""
+    best = 0.0
+    for label, (cost, ms, _buffers) in proposal.before.items():
+        if label not in proposal.after:
+            continue
+        after_cost, after_ms, _ = proposal.after[label]
+        if ms and after_ms is not None:
+            best = max(best, 1 - after_ms / ms)
+        elif cost:
+            best = max(best, 1 - after_cost / cost)
+    return best
+
+
+def format_measure(before, after):
+    cost, ms, buffers = before
+    after_cost, after_ms, after_buffers = after
+    parts = [f"cost {cost:,.1f} -> {after_cost:,.1f}"]
+    if ms is not None and after_ms is not None:
+        parts.append(f"{ms:.3f} ms -> {after_ms:.3f} ms ({ms / after_ms if after_ms else 0:.1f}x)")
+    if buffers is not None and after_buffers is not None:
+        parts.append(f"buffers {buffers} -> {after_buffers}")
+    return ', '.join(parts)
+
+
+def print_statements(queries):
+    print("\n=== Top statements (pg_stat_statements) ===")
+    for query in queries:
+        text = ' '.join(query.sql.split())
+        print(f"  {query.label}: {query.calls} calls, {query.total_ms:,.1f} ms total, "
+              f"{query.mean_ms:.3f} ms mean")
+        print(f"    {text[:150]}{'...' if len(text) > 150 else ''}")
+
+
+def print_index_usage(indexes, redundant, show_all=False):
+    """Print scans and size per index; only flagged indexes unless show_all."""
+    redundant_by_name = {index['index_name']: other for index, other in redundant}
+    print("\n=== Index usage (scans since the last stats reset) ===")
+    width = max((len(ix['index_name']) for ix in indexes), default=10)
+    for index in indexes:
+        flags = []
+        if index['scans'] == 0 and not (index['is_unique'] or index['is_primary']):
+            flags.append('UNUSED')
+        if index['index_name'] in redundant_by_name:
+            flags.append(f"REDUNDANT with {redundant_by_name[index['index_name']]}")
+        if not flags and not show_all:
+            continue
+        columns = ', '.join(index['columns'])
+        print(f"  {index['index_name']:<{width}}  {index['scans']:>9} scans  {index['size']:>8}  "
+              f"({columns}){'  ' + '; '.join(flags) if flags else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Suggest composite/covering indexes and flag unused ones')
+    parser.add_argument('--top', type=int, default=10, help='pg_stat_statements entries to analyze')
+    parser.add_argument('--no-scenarios', action='store_true', help='Skip the load_test.py scenarios')
+    parser.add_argument('--validate', action='store_true',
+                        help='Build each proposal in a rolled-back transaction and measure it')
+    parser.add_argument('--repeat', type=int, default=5, help='EXPLAIN ANALYZE runs per measurement')
+    parser.add_argument('--all-indexes', action='store_true', help='List every index, not just flagged ones')
+    args = parser.parse_args(argv)
+
+    try:
+        with session() as db:
+            queries = []
+            if pg_stat_statements_available(db):
+                queries += top_statements(db, args.top)
+                print_statements(queries)
+            else:
+                print("[WARNING] pg_stat_statements is not available; add it to shared_preload_libraries "
+                      "and CREATE EXTENSION pg_stat_statements to analyze the live workload.")
+            if not args.no_scenarios:
+                queries += scenario_queries(db)
+            if not queries:
+                print("[ERROR] Nothing to analyze (no statements and no users for the scenarios)")
+                return 1
+
+            for query in queries:
+                query.plan = explain(db, query, analyze=True)
+
+            indexes = db.query_dicts('indexes', INDEXES_SQL)
+            table_columns = {}
+            for table, column, fixed_width in db.query('columns', COLUMNS_SQL):
+                table_columns.setdefault(table, {})[column] = fixed_width
+
+            proposals = propose(queries, indexes, table_columns)
+            estimated = estimate(db, proposals, args.validate, args.repeat) if proposals else False
+            if estimated:
+                proposals = [p for p in proposals if improvement(p) >= MIN_IMPROVEMENT]
+            print_index_usage(indexes, find_redundant(indexes, proposals), args.all_indexes)
+
+            print("\n=== Proposed indexes ===")
+            if not proposals:
+                print("  None: every filtered scan in the workload already has a fitting index.")
+            for proposal in sorted(proposals, key=improvement, reverse=True):
+                print(f"\n  {proposal.ddl()}")
+                for reason in proposal.reasons:
+                    print(f"    - {reason}")
+                for label, before in proposal.before.items():
+                    if label in proposal.after:
+                        print(f"    {label}: {format_measure(before, proposal.after[label])}")
+
+            redundant_after = [(ix, other) for ix, other in find_redundant(indexes, proposals)
+                               if other.endswith('(proposed)')]
+            if proposals:
+                print("\n=== Migration ===")
+                print("  -- migrate:no-transaction")
+                for proposal in proposals:
+                    print(f"  {proposal.ddl(concurrently=True)};")
+                for index, other in redundant_after:
+                    print(f"  -- then, once {other.replace(' (proposed)', '')} is in use:")
+                    print(f"  -- DROP INDEX CONCURRENTLY IF EXISTS {index['index_name']};")
+            db.conn.rollback()
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Query benchmark for the app's common database access paths
+
+Times the queries behind the main screens against whatever DATABASE_URL
+points at, normally a local Postgres loaded with synthetic_data.py. Each
+scenario runs for a sample of users (a different user per run, so the
+cache isn't just serving one user's pages) and reports latency percentiles
+and throughput. With --concurrency N, N threads each borrow a pooled
+connection and run the scenario at the same time.
+
+Scenarios:
+    todays_meals     today's meals for the dashboard, newest first
+    meal_detail      today's meals with their meal_foods
+    daily_summary    daily_nutrition_summary for the last 7 days
+    weekly_progress  weekly_progress for the last 12 weeks
+    calorie_bank     banked calories and stored running balance, last 30 days
+    habit_history    habit completions for the last 30 days
+
+Usage:
+    python synthetic_data.py load --users 1000 --days 180
+    python load_test.py
+    python load_test.py --scenarios todays_meals calorie_bank --repeat 500 --concurrency 8
+    python load_test.py --explain
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from db import format_latency, session
+from synthetic_data import EMAIL_PATTERN
+
+SCENARIOS = {
+    'todays_meals': """
+        SELECT id, meal_name, meal_type, calories, protein, carbs, fat, logged_at
+        FROM meals
+        WHERE user_id = %(user_id)s
+          AND logged_at >= CURRENT_DATE AND logged_at < CURRENT_DATE + 1
+        ORDER BY logged_at DESC
+    """,
+    'meal_detail': """
+        SELECT m.id, m.meal_name, m.meal_type, f.food_name, f.portion, f.calories
+        FROM meals m
+        JOIN meal_foods f ON f.meal_id = m.id
+        WHERE m.user_id = %(user_id)s
+          AND m.logged_at >= CURRENT_DATE AND m.logged_at < CURRENT_DATE + 1
+        ORDER BY m.logged_at DESC
+    """,
+    'daily_summary': """
+        SELECT date, total_calories, total_protein, total_carbs, total_fat, meal_count
+        FROM daily_nutrition_summary
+        WHERE user_id = %(user_id)s AND date > CURRENT_DATE - 7
+        ORDER BY date DESC
+    """,
+    'weekly_progress': """
+        SELECT week_start, avg_weight, min_weight, max_weight, weigh_ins
+        FROM weekly_progress
+        WHERE user_id = %(user_id)s AND week_start >= DATE_TRUNC('week', NOW()) - INTERVAL '12 weeks'
+        ORDER BY week_start DESC
+    """,
+    'calorie_bank': """
+        SELECT date, banked_calories, running_balance
+        FROM calorie_bank
+        WHERE user_id = %(user_id)s AND date > CURRENT_DATE - 30
+        ORDER BY date
+    """,
+    'habit_history': """
+        SELECT h.habit_name, c.date, c.value
+        FROM habits h
+        JOIN habit_completions c ON c.habit_id = h.id
+        WHERE h.user_id = %(user_id)s AND c.date > CURRENT_DATE - 30
+        ORDER BY c.date DESC
+    """,
+}
+
+
+def sample_users(db, count, seed):
+    """Pick up to count synthetic user ids (all users if none are synthetic)."""
+    rows = db.query('sample users', "SELECT id FROM users WHERE email LIKE %s", (EMAIL_PATTERN,))
+    if not rows:
+        rows = db.query('sample users', "SELECT id FROM users")
+    ids = [row[0] for row in rows]
+    random.Random(seed).shuffle(ids)
+    return ids[:count]
+
+
+def run_worker(sql, user_ids, runs, samples, lock):
+    """Run sql runs times on one pooled connection, cycling through user_ids."""
+    local = []
+    with session(readonly=True) as db:
+        with db.conn.cursor() as cursor:
+            for i in range(runs):
+                started = time.perf_counter()
+                cursor.execute(sql, {'user_id': user_ids[i % len(user_ids)]})
+                cursor.fetchall()
+                local.append((time.perf_counter() - started) * 1000)
+    with lock:
+        samples.extend(local)
+
+
+def run_scenario(name, user_ids, repeat, concurrency):
+    """Return (latency samples in ms, queries per second) for one scenario."""
+    sql = SCENARIOS[name]
+    samples, lock = [], threading.Lock()
+    repeat = max(1, repeat)
+    # The first repeat % concurrency workers take one extra run, so exactly repeat samples are taken
+    runs = [repeat // concurrency + (w < repeat % concurrency) for w in range(concurrency)]
+    workers = [
+        threading.Thread(target=run_worker, args=(sql, user_ids[w::concurrency] or user_ids,
+                                                  runs[w], samples, lock))
+        for w in range(concurrency) if runs[w]
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    if len(samples) != repeat:
+        raise RuntimeError(f"{name}: a worker failed, see the traceback above")
+    return samples, len(samples) / elapsed if elapsed else 0
+
+
+def explain(db, name, user_id):
+    rows = db.query(f'explain {name}', "EXPLAIN (ANALYZE, BUFFERS) " + SCENARIOS[name], {'user_id': user_id})
+    print(f"\n=== {name} ===")
+    for (line,) in rows:
+        print(f"  {line}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the common query paths')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=200, help='How many users to spread runs over')
+    parser.add_argument('--repeat', type=int, default=200, help='Runs per scenario')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed runs per scenario')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--explain', action='store_true', help='Print EXPLAIN (ANALYZE, BUFFERS) instead')
+    args = parser.parse_args(argv)
+
+    # Every worker needs its own pooled connection.
+    pool_max = int(os.environ.get('DB_POOL_MAX', '4'))
+    os.environ['DB_POOL_MAX'] = str(max(pool_max, args.concurrency + 1))
+
+    try:
+        with session(readonly=True) as db:
+            user_ids = sample_users(db, args.users, args.seed)
+            if not user_ids:
+                print("[ERROR] No users found; run synthetic_data.py load first")
+                return 1
+            if args.explain:
+                for name in args.scenarios:
+                    explain(db, name, user_ids[0])
+                return 0
+
+        print(f"Benchmarking {len(args.scenarios)} scenarios over {len(user_ids)} users "
+              f"({args.repeat} runs, concurrency {args.concurrency})...")
+        width = max(len(name) for name in args.scenarios)
+        for name in args.scenarios:
+            if args.warmup:
+                run_scenario(name, user_ids, args.warmup, 1)
+            samples, qps = run_scenario(name, user_ids, args.repeat, args.concurrency)
+            print(f"  {name:<{width}}  {format_latency(samples)}  {qps:8.0f} q/s")
+        print("[SUCCESS] Benchmark complete")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
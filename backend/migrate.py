@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Versioned migration runner for backend/migrations/
+
+Each migrations/<version>_<name>.sql file is applied once and recorded in a
+schema_migrations ledger together with a SHA-256 of its contents. Versions
+sort lexically, so use a date prefix (20260214_add_cardio_nutrition_columns).
+
+- The "anything to do?" check is a single query against the ledger, so the
+  common deploy where nothing is pending costs one round-trip.
+- Pending migrations are applied in one transaction per batch while holding
+  a transaction-scoped advisory lock; a concurrent deploy blocks on the lock,
+  then re-reads the ledger and finds nothing left to do.
+- A migration whose file changed after it was applied fails the checksum check
+  and stops the run until someone looks at it.
+- Every batch runs with SET LOCAL lock_timeout, so an ALTER TABLE that can't
+  get its lock gives up (and is retried with backoff) instead of stalling
+  API queries queued behind it.
+- A file containing a `-- migrate:no-transaction` line runs on its own,
+  statement by statement in autocommit mode, so it can use CREATE INDEX
+  CONCURRENTLY (see online_migrations.py). Write those migrations to be
+  re-runnable (IF NOT EXISTS), since a failure part-way isn't rolled back.
+
+Usage:
+    python migrate.py                 # apply everything pending (same as 'up')
+    python migrate.py status          # list applied / pending / changed
+    python migrate.py up --dry-run    # show what would run
+    python migrate.py up --batch-size 1   # one transaction per migration
+    python migrate.py up --lock-timeout 2s --retries 10
+    python migrate.py baseline        # record all files as applied without running them
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errorcodes
+
+from db import session
+from online_migrations import (
+    DEFAULT_LOCK_TIMEOUT, DEFAULT_RETRIES, run_online_statement, set_timeouts,
+    split_statements, with_lock_retry,
+)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Arbitrary but fixed key for pg_advisory_xact_lock; every runner must agree on it.
+MIGRATION_LOCK_KEY = 0x4843_4D47  # "HCMG"
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    execution_ms INTEGER
+);
+"""
+
+LEDGER_QUERY = "SELECT version, checksum FROM schema_migrations"
+
+LEDGER_INSERT = """
+    INSERT INTO schema_migrations (version, name, checksum, execution_ms)
+    VALUES (%s, %s, %s, %s)
+"""
+
+NO_TRANSACTION_RE = re.compile(r'^\s*--\s*migrate:no-transaction\s*$', re.MULTILINE | re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    """Raised when the ledger and the migrations directory disagree."""
+
+
+class Migration:
+    """One .sql file in the migrations directory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.basename(path)
+        stem = os.path.splitext(self.filename)[0]
+        self.version, _, self.name = stem.partition('_')
+        self.name = self.name or stem
+        with open(path, 'rb') as f:
+            raw = f.read()
+        self.sql = raw.decode('utf-8')
+        self.checksum = hashlib.sha256(raw).hexdigest()
+        self.transactional = not NO_TRANSACTION_RE.search(self.sql)
+
+    def __repr__(self):
+        return f"Migration({self.filename!r})"
+
+
+def load_migrations(migrations_dir=MIGRATIONS_DIR):
+    """Return every migration on disk, ordered by version."""
+    migrations = [Migration(path) for path in glob.glob(os.path.join(migrations_dir, '*.sql'))]
+    migrations.sort(key=lambda m: m.version)
+    seen = {}
+    for migration in migrations:
+        if migration.version in seen:
+            raise MigrationError(f"duplicate version {migration.version}: "
+                                 f"{seen[migration.version]} and {migration.filename}")
+        seen[migration.version] = migration.filename
+    return migrations
+
+
+def read_ledger(db):
+    """Return {version: checksum}, or {} if the ledger table doesn't exist yet."""
+    try:
+        rows = db.query('ledger', LEDGER_QUERY)
+    except psycopg2.Error as e:
+        if e.pgcode != errorcodes.UNDEFINED_TABLE:
+            raise
+        db.conn.rollback()
+        return {}
+    return {version: checksum.strip() for version, checksum in rows}
+
+
+def plan(migrations, ledger):
+    """Split migrations into (pending, changed) and list ledger versions with no file."""
+    pending, changed = [], []
+    for migration in migrations:
+        applied_checksum = ledger.get(migration.version)
+        if applied_checksum is None:
+            pending.append(migration)
+        elif applied_checksum != migration.checksum:
+            changed.append(migration)
+    on_disk = {m.version for m in migrations}
+    missing = sorted(v for v in ledger if v not in on_disk)
+    return pending, changed, missing
+
+
+def verify_checksums(changed):
+    if changed:
+        names = ', '.join(m.filename for m in changed)
+        raise MigrationError(f"applied migrations were modified on disk: {names}. "
+                             f"Add a new migration instead of editing an applied one.")
+
+
+def make_batches(pending, batch_size):
+    """Group consecutive transactional migrations; no-transaction ones run alone."""
+    batches, current = [], []
+    limit = batch_size if batch_size > 0 else len(pending)
+    for migration in pending:
+        if not migration.transactional:
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([migration])
+            continue
+        current.append(migration)
+        if len(current) >= limit:
+            batches.append(current)
+            current = []
+    if current:
+        batches.append(current)
+    return batches
+
+
+def apply_batch(db, batch, lock_timeout=DEFAULT_LOCK_TIMEOUT, statement_timeout='0'):
+    """
+    Apply one batch inside the current transaction while holding the lock.
+
+    Returns [(migration, seconds)] for what actually ran; migrations another
+    runner applied while we waited on the lock are skipped.
+    """
+    db.execute('advisory lock', "SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+    set_timeouts(db, lock_timeout, statement_timeout, local=True)
+    db.execute('ledger ddl', LEDGER_DDL)
+    ledger = read_ledger(db)
+    _, changed, _ = plan(batch, ledger)
+    verify_checksums(changed)
+
+    applied = []
+    for migration in batch:
+        if migration.version in ledger:
+            continue
+        print(f"  -> {migration.filename}")
+        started = time.perf_counter()
+        db.execute(migration.filename, migration.sql)
+        seconds = time.perf_counter() - started
+        db.execute('ledger insert', LEDGER_INSERT,
+                   (migration.version, migration.name, migration.checksum, round(seconds * 1000)))
+        applied.append((migration, seconds))
+    return applied
+
+
+def apply_online(db, migration, lock_timeout=DEFAULT_LOCK_TIMEOUT, statement_timeout='0',
+                 retries=DEFAULT_RETRIES):
+    """
+    Apply a no-transaction migration statement by statement in autocommit mode.
+
+    Holds the session-level advisory lock for the duration; the ledger row is
+    written only after every statement succeeded.
+    """
+    db.conn.commit()
+    db.conn.autocommit = True
+    try:
+        db.execute('advisory lock', "SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            db.execute('ledger ddl', LEDGER_DDL)
+            ledger = read_ledger(db)
+            verify_checksums(plan([migration], ledger)[1])
+            if migration.version in ledger:
+                return []
+            print(f"  -> {migration.filename} (no transaction)")
+            started = time.perf_counter()
+            for statement in split_statements(migration.sql):
+                run_online_statement(db, statement, lock_timeout, statement_timeout, retries)
+            seconds = time.perf_counter() - started
+            db.execute('ledger insert', LEDGER_INSERT,
+                       (migration.version, migration.name, migration.checksum, round(seconds * 1000)))
+            return [(migration, seconds)]
+        finally:
+            db.execute('advisory unlock', "SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    finally:
+        db.conn.autocommit = False
+
+
+def migrate_up(batch_size=0, dry_run=False, migrations_dir=MIGRATIONS_DIR,
+               lock_timeout=DEFAULT_LOCK_TIMEOUT, statement_timeout='0', retries=DEFAULT_RETRIES):
+    """Apply pending migrations. Returns the list of (migration, seconds) applied."""
+    migrations = load_migrations(migrations_dir)
+    applied = []
+    with session() as db:
+        pending, changed, missing = plan(migrations, read_ledger(db))
+        verify_checksums(changed)
+        for version in missing:
+            print(f"[WARNING] {version} is recorded as applied but has no file")
+
+        if not pending:
+            print("[SUCCESS] Database is up to date")
+            db.print_timings()
+            return applied
+
+        print(f"{len(pending)} pending migration(s):")
+        for migration in pending:
+            print(f"  - {migration.filename}")
+        if dry_run:
+            return applied
+
+        for number, batch in enumerate(make_batches(pending, batch_size), 1):
+            if not batch[0].transactional:
+                print(f"\nApplying batch {number} outside a transaction...")
+                applied.extend(apply_online(db, batch[0], lock_timeout, statement_timeout, retries))
+                continue
+            print(f"\nApplying batch {number} ({len(batch)} migration(s)) in one transaction...")
+            applied.extend(with_lock_retry(
+                db.conn,
+                lambda: apply_batch(db, batch, lock_timeout, statement_timeout),
+                retries, f'batch {number}'))
+            db.conn.commit()
+
+        db.print_timings()
+
+    if applied:
+        print("\n[SUCCESS] Applied:")
+        for migration, seconds in applied:
+            print(f"  - {migration.filename}: {seconds * 1000:.1f} ms")
+    else:
+        print("\n[SUCCESS] Nothing left to apply (another runner got there first)")
+    return applied
+
+
+def status(migrations_dir=MIGRATIONS_DIR):
+    migrations = load_migrations(migrations_dir)
+    with session() as db:
+        ledger = read_ledger(db)
+    pending, changed, missing = plan(migrations, ledger)
+    pending_versions = {m.version for m in pending}
+    changed_versions = {m.version for m in changed}
+    for migration in migrations:
+        if migration.version in changed_versions:
+            state = '[CHANGED]'
+        elif migration.version in pending_versions:
+            state = '[PENDING]'
+        else:
+            state = '[APPLIED]'
+        print(f"{state:<10} {migration.filename}")
+    for version in missing:
+        print(f"{'[MISSING]':<10} {version}")
+    return not changed
+
+
+def baseline(migrations_dir=MIGRATIONS_DIR):
+    """Record every migration on disk as applied without running it."""
+    migrations = load_migrations(migrations_dir)
+    with session() as db:
+        db.execute('advisory lock', "SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        db.execute('ledger ddl', LEDGER_DDL)
+        for migration in migrations:
+            db.execute('ledger insert', LEDGER_INSERT + " ON CONFLICT (version) DO NOTHING",
+                       (migration.version, migration.name, migration.checksum, None))
+    print(f"[SUCCESS] Baselined {len(migrations)} migration(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply versioned SQL migrations from backend/migrations/')
+    parser.add_argument('command', nargs='?', default='up', choices=['up', 'status', 'baseline'])
+    parser.add_argument('--dry-run', action='store_true', help='List pending migrations without applying them')
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help='Migrations per transaction (default: all pending in one transaction)')
+    parser.add_argument('--dir', default=MIGRATIONS_DIR, help='Migrations directory')
+    parser.add_argument('--lock-timeout', default=DEFAULT_LOCK_TIMEOUT,
+                        help='Give up waiting for a table lock after this long, then retry (default 5s)')
+    parser.add_argument('--statement-timeout', default='0', help='Per-statement limit (default none)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='Retries on lock timeout')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'status':
+            return 0 if status(args.dir) else 1
+        if args.command == 'baseline':
+            baseline(args.dir)
+            return 0
+        migrate_up(args.batch_size, args.dry_run, args.dir,
+                   args.lock_timeout, args.statement_timeout, args.retries)
+        return 0
+    except MigrationError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    except Exception as e:
+        print(f"[ERROR] Migration failed (rolled back): {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Incrementally refreshed daily nutrition rollup
+
+The daily_nutrition_summary view re-aggregates all of meals on every read.
+This tool maintains daily_nutrition_rollup, a real table with one row per
+(user_id, date), and only recomputes the buckets that changed:
+
+- Statement-level triggers on meals record every touched (user_id, date) in
+  daily_nutrition_dirty (the change log). A bulk insert of 10k meals adds
+  one trigger call, not 10k.
+- `refresh` claims dirty buckets in batches (FOR UPDATE SKIP LOCKED, so two
+  refreshers can run side by side), re-aggregates just those days from meals
+  and upserts or deletes the rollup rows.
+- `verify` compares the rollup against the view; `bench` builds a synthetic
+  multi-million-row copy of meals in a scratch schema and times view vs
+  rollup reads.
+
+Dates use DATE(logged_at) in the database's TimeZone setting, the same as
+the view, so the two agree as long as both run with the server default.
+
+The refresh query wants an index on meals(user_id, logged_at). `install`
+warns if it's missing; build it online rather than inside install:
+    python online_migrations.py run "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_meals_user_logged_at ON meals(user_id, logged_at)"
+
+Usage:
+    python nutrition_rollup.py install              # tables + triggers, then a full rebuild
+    python nutrition_rollup.py refresh              # recompute dirty buckets (run from cron)
+    python nutrition_rollup.py rebuild              # recompute everything
+    python nutrition_rollup.py verify
+    python nutrition_rollup.py bench --users 2000 --days 365
+"""
+
+import argparse
+import sys
+import time
+
+from db import format_latency, percentile, session, time_repeated
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS daily_nutrition_rollup (
+    user_id UUID NOT NULL,
+    date DATE NOT NULL,
+    meal_count INTEGER NOT NULL,
+    total_calories BIGINT,
+    total_protein NUMERIC,
+    total_carbs NUMERIC,
+    total_fat NUMERIC,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS daily_nutrition_dirty (
+    user_id UUID NOT NULL,
+    date DATE NOT NULL,
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, date)
+);
+
+CREATE OR REPLACE FUNCTION mark_daily_nutrition_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- DO UPDATE rather than DO NOTHING: it row-locks an already dirty bucket
+    -- until this transaction commits, so a refresh (FOR UPDATE SKIP LOCKED)
+    -- can't claim it and aggregate meals before this change is visible
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO daily_nutrition_dirty (user_id, date)
+        SELECT DISTINCT user_id, DATE(logged_at) FROM new_rows
+        WHERE user_id IS NOT NULL AND logged_at IS NOT NULL
+        ON CONFLICT (user_id, date) DO UPDATE SET marked_at = NOW();
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO daily_nutrition_dirty (user_id, date)
+        SELECT DISTINCT user_id, DATE(logged_at) FROM old_rows
+        WHERE user_id IS NOT NULL AND logged_at IS NOT NULL
+        ON CONFLICT (user_id, date) DO UPDATE SET marked_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS meals_nutrition_dirty_insert ON meals;
+CREATE TRIGGER meals_nutrition_dirty_insert
+    AFTER INSERT ON meals
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_daily_nutrition_dirty();
+
+DROP TRIGGER IF EXISTS meals_nutrition_dirty_update ON meals;
+CREATE TRIGGER meals_nutrition_dirty_update
+    AFTER UPDATE ON meals
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_daily_nutrition_dirty();
+
+DROP TRIGGER IF EXISTS meals_nutrition_dirty_delete ON meals;
+CREATE TRIGGER meals_nutrition_dirty_delete
+    AFTER DELETE ON meals
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION mark_daily_nutrition_dirty();
+"""
+
+AGGREGATE_COLUMNS = """
+    COUNT(*) AS meal_count,
+    SUM(m.calories) AS total_calories,
+    SUM(m.protein) AS total_protein,
+    SUM(m.carbs) AS total_carbs,
+    SUM(m.fat) AS total_fat
+"""
+
+# Claim a batch of dirty buckets, recompute them from meals (range scan on
+# user_id + logged_at per bucket) and write the results back. Buckets whose
+# meals were all deleted lose their rollup row.
+REFRESH_BATCH_SQL = f"""
+WITH claimed AS (
+    DELETE FROM daily_nutrition_dirty d
+    WHERE (d.user_id, d.date) IN (
+        SELECT user_id, date FROM daily_nutrition_dirty
+        ORDER BY user_id, date
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING d.user_id, d.date
+),
+fresh AS (
+    SELECT c.user_id, c.date, {AGGREGATE_COLUMNS}
+    FROM claimed c
+    JOIN meals m
+      ON m.user_id = c.user_id
+     AND m.logged_at >= c.date::timestamptz
+     AND m.logged_at < (c.date + 1)::timestamptz
+    GROUP BY c.user_id, c.date
+),
+removed AS (
+    DELETE FROM daily_nutrition_rollup r
+    USING claimed c
+    WHERE r.user_id = c.user_id AND r.date = c.date
+      AND NOT EXISTS (SELECT 1 FROM fresh f WHERE f.user_id = c.user_id AND f.date = c.date)
+    RETURNING 1
+),
+upserted AS (
+    INSERT INTO daily_nutrition_rollup
+        (user_id, date, meal_count, total_calories, total_protein, total_carbs, total_fat, refreshed_at)
+    SELECT user_id, date, meal_count, total_calories, total_protein, total_carbs, total_fat, NOW()
+    FROM fresh
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        meal_count = EXCLUDED.meal_count,
+        total_calories = EXCLUDED.total_calories,
+        total_protein = EXCLUDED.total_protein,
+        total_carbs = EXCLUDED.total_carbs,
+        total_fat = EXCLUDED.total_fat,
+        refreshed_at = EXCLUDED.refreshed_at
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM claimed), (SELECT count(*) FROM upserted), (SELECT count(*) FROM removed);
+"""
+
+REBUILD_SQL = f"""
+LOCK TABLE daily_nutrition_dirty IN EXCLUSIVE MODE;
+TRUNCATE daily_nutrition_rollup, daily_nutrition_dirty;
+INSERT INTO daily_nutrition_rollup
+    (user_id, date, meal_count, total_calories, total_protein, total_carbs, total_fat)
+SELECT m.user_id, DATE(m.logged_at), {AGGREGATE_COLUMNS}
+FROM meals m
+WHERE m.user_id IS NOT NULL AND m.logged_at IS NOT NULL
+GROUP BY m.user_id, DATE(m.logged_at);
+"""
+
+VERIFY_SQL = """
+SELECT count(*)
+FROM daily_nutrition_summary v
+FULL JOIN daily_nutrition_rollup r ON r.user_id = v.user_id AND r.date = v.date
+WHERE (v.user_id IS NOT NULL AND v.date IS NOT NULL OR r.user_id IS NOT NULL)
+  AND (r.user_id IS NULL OR v.user_id IS NULL
+       OR r.meal_count <> v.meal_count
+       OR r.total_calories IS DISTINCT FROM v.total_calories
+       OR r.total_protein IS DISTINCT FROM v.total_protein
+       OR r.total_carbs IS DISTINCT FROM v.total_carbs
+       OR r.total_fat IS DISTINCT FROM v.total_fat);
+"""
+
+INDEX_CHECK_SQL = """
+SELECT 1
+FROM pg_index x
+JOIN pg_attribute a1 ON a1.attrelid = x.indrelid AND a1.attnum = x.indkey[0]
+JOIN pg_attribute a2 ON a2.attrelid = x.indrelid AND a2.attnum = x.indkey[1]
+WHERE x.indrelid = 'meals'::regclass AND x.indisvalid
+  AND a1.attname = 'user_id' AND a2.attname = 'logged_at';
+"""
+
+
+def install(db):
+    db.execute('rollup ddl', ROLLUP_DDL)
+    if not db.query('index check', INDEX_CHECK_SQL):
+        print("[WARNING] meals has no (user_id, logged_at) index; refresh will fall back to "
+              "idx_meals_user. See the module docstring for the online build command.")
+
+
+def rebuild(db):
+    rows = db.execute('rebuild', REBUILD_SQL)
+    db.conn.commit()
+    return rows
+
+
+def refresh(db, batch_size=5000):
+    """Drain the change log batch by batch. Returns (buckets, upserted, removed)."""
+    totals = [0, 0, 0]
+    while True:
+        claimed, upserted, removed = db.query('refresh batch', REFRESH_BATCH_SQL,
+                                              {'batch_size': batch_size})[0]
+        db.conn.commit()
+        if not claimed:
+            break
+        totals[0] += claimed
+        totals[1] += upserted
+        totals[2] += removed
+    return tuple(totals)
+
+
+def verify(db):
+    """Return the number of (user_id, date) buckets where rollup and view disagree."""
+    return db.query('verify', VERIFY_SQL)[0][0]
+
+
+BENCH_SCHEMA = 'nutrition_rollup_bench'
+
+BENCH_SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+SET search_path = {BENCH_SCHEMA}, public;
+CREATE TABLE meals (LIKE public.meals INCLUDING DEFAULTS INCLUDING INDEXES);
+CREATE VIEW daily_nutrition_summary AS
+SELECT
+    user_id,
+    DATE(logged_at) as date,
+    COUNT(*) as meal_count,
+    SUM(calories) as total_calories,
+    SUM(protein) as total_protein,
+    SUM(carbs) as total_carbs,
+    SUM(fat) as total_fat
+FROM meals
+GROUP BY user_id, DATE(logged_at);
+"""
+
+BENCH_LOAD_SQL = """
+INSERT INTO meals (user_id, meal_name, meal_type, calories, protein, carbs, fat, logged_at)
+SELECT u.id,
+       'Synthetic meal',
+       (ARRAY['breakfast', 'lunch', 'dinner', 'snack'])[1 + m %% 4],
+       200 + (random() * 700)::int,
+       round((random() * 60)::numeric, 2),
+       round((random() * 90)::numeric, 2),
+       round((random() * 40)::numeric, 2),
+       date_trunc('day', NOW()) - make_interval(days => d) + make_interval(hours => 7 + m * 4)
+           + random() * interval '90 minutes'
+FROM (SELECT uuid_generate_v4() AS id FROM generate_series(1, %(users)s)) u
+CROSS JOIN generate_series(0, %(days)s - 1) d
+CROSS JOIN generate_series(0, %(meals_per_day)s - 1) m;
+"""
+
+
+def bench(db, users, days, meals_per_day, repeat, keep=False):
+    """Time view vs rollup reads on a synthetic copy of meals in a scratch schema."""
+    total_rows = users * days * meals_per_day
+    print(f"Building {BENCH_SCHEMA} with {total_rows:,} meals "
+          f"({users} users x {days} days x {meals_per_day} meals)...")
+    try:
+        db.execute('bench setup', BENCH_SETUP_SQL)
+        started = time.perf_counter()
+        db.execute('bench load', BENCH_LOAD_SQL,
+                   {'users': users, 'days': days, 'meals_per_day': meals_per_day})
+        db.execute('user/logged_at index',
+                   "CREATE INDEX idx_meals_user_logged_at ON meals(user_id, logged_at)")
+        db.execute('analyze', "ANALYZE meals")
+        db.conn.commit()
+        print(f"  loaded in {time.perf_counter() - started:.1f}s")
+
+        install(db)
+        started = time.perf_counter()
+        rebuild(db)
+        db.execute('analyze rollup', "ANALYZE daily_nutrition_rollup")
+        db.conn.commit()
+        print(f"  full rebuild in {time.perf_counter() - started:.1f}s")
+
+        user_id, day = db.query('pick user', """
+            SELECT user_id, date FROM daily_nutrition_rollup
+            ORDER BY user_id LIMIT 1 OFFSET %s
+        """, (users // 2 * days,))[0]
+        params = {'user_id': user_id, 'date': day}
+
+        cases = [
+            ('Daily Balance (one day)',
+             "SELECT * FROM daily_nutrition_summary WHERE user_id = %(user_id)s AND date = %(date)s",
+             "SELECT * FROM daily_nutrition_rollup WHERE user_id = %(user_id)s AND date = %(date)s"),
+            ('Last 30 days',
+             "SELECT * FROM daily_nutrition_summary WHERE user_id = %(user_id)s "
+             "AND date > %(date)s - 30 ORDER BY date",
+             "SELECT * FROM daily_nutrition_rollup WHERE user_id = %(user_id)s "
+             "AND date > %(date)s - 30 ORDER BY date"),
+        ]
+        print(f"\n=== Read latency ({repeat} runs each) ===")
+        for name, view_sql, rollup_sql in cases:
+            view_ms = time_repeated(db, f'view: {name}', view_sql, params, repeat)
+            rollup_ms = time_repeated(db, f'rollup: {name}', rollup_sql, params, repeat)
+            speedup = percentile(view_ms, 50) / max(percentile(rollup_ms, 50), 1e-6)
+            print(f"\n{name}:")
+            print(f"  view    {format_latency(view_ms)}")
+            print(f"  rollup  {format_latency(rollup_ms)}")
+            print(f"  speedup {speedup:.0f}x (p50)")
+
+        print("\n=== Incremental refresh ===")
+        db.execute('log meals', """
+            INSERT INTO meals (user_id, meal_name, meal_type, calories, logged_at)
+            SELECT user_id, 'Late snack', 'snack', 150, NOW()
+            FROM (SELECT DISTINCT user_id FROM daily_nutrition_rollup LIMIT 500) u
+        """)
+        db.conn.commit()
+        started = time.perf_counter()
+        buckets, _, _ = refresh(db)
+        print(f"  {buckets} dirty buckets refreshed in {(time.perf_counter() - started) * 1000:.1f} ms")
+        mismatches = verify(db)
+        print(f"  verify: {mismatches} mismatched buckets")
+    finally:
+        db.conn.rollback()
+        if not keep:
+            db.execute('bench teardown', f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        db.execute('reset search_path', "RESET search_path")
+        db.conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the incremental daily nutrition rollup')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('install', help='Create rollup tables and triggers, then rebuild')
+    refresh_parser = sub.add_parser('refresh', help='Recompute dirty (user_id, date) buckets')
+    refresh_parser.add_argument('--batch-size', type=int, default=5000)
+    sub.add_parser('rebuild', help='Recompute the whole rollup from meals')
+    sub.add_parser('verify', help='Compare the rollup with daily_nutrition_summary')
+    bench_parser = sub.add_parser('bench', help='Benchmark view vs rollup on synthetic data')
+    bench_parser.add_argument('--users', type=int, default=2000)
+    bench_parser.add_argument('--days', type=int, default=365)
+    bench_parser.add_argument('--meals-per-day', type=int, default=4)
+    bench_parser.add_argument('--repeat', type=int, default=50)
+    bench_parser.add_argument('--keep', action='store_true', help=f'Leave the {BENCH_SCHEMA} schema in place')
+    args = parser.parse_args(argv)
+
+    try:
+        with session() as db:
+            if args.command == 'install':
+                install(db)
+                rows = rebuild(db)
+                print(f"[SUCCESS] Installed; rollup holds {rows} day buckets")
+            elif args.command == 'refresh':
+                started = time.perf_counter()
+                buckets, upserted, removed = refresh(db, args.batch_size)
+                print(f"[SUCCESS] Refreshed {buckets} buckets ({upserted} upserted, {removed} removed) "
+                      f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+            elif args.command == 'rebuild':
+                print(f"[SUCCESS] Rebuilt {rebuild(db)} day buckets")
+            elif args.command == 'verify':
+                refresh(db)
+                mismatches = verify(db)
+                if mismatches:
+                    print(f"[ERROR] {mismatches} buckets differ from daily_nutrition_summary")
+                    return 1
+                print("[SUCCESS] Rollup matches daily_nutrition_summary")
+            else:
+                bench(db, args.users, args.days, args.meals_per_day, args.repeat, args.keep)
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Online, lock-aware schema changes for large tables
+
+Helpers for evolving meals, meal_foods, calorie_logs and friends while the
+API is serving traffic:
+
+- lock_timeout / statement_timeout guards with retry. A DDL statement that
+  can't get its lock within lock_timeout gives up instead of queueing behind a
+  long transaction (and making every API query queue behind it), then retries
+  with backoff.
+- CREATE INDEX CONCURRENTLY outside a transaction, cleaning up the INVALID
+  index a failed attempt leaves behind before retrying.
+- Chunked backfills: keyset-paginated UPDATEs in bounded batches, one short
+  transaction each, with progress reporting and a sleep between batches.
+
+migrate.py uses these for migrations marked with a `-- migrate:no-transaction`
+line. They can also be run by hand:
+
+Usage:
+    python online_migrations.py run "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_meals_user_logged ON meals(user_id, logged_at)"
+    python online_migrations.py backfill workout_plans \\
+        --set "cardio_recommendations = '[]'::jsonb" --where "cardio_recommendations IS NULL" \\
+        --batch-size 5000 --sleep 0.1
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errorcodes, sql
+
+from db import session
+
+DEFAULT_LOCK_TIMEOUT = '5s'
+DEFAULT_STATEMENT_TIMEOUT = '0'  # no limit; index builds on big tables take a while
+DEFAULT_RETRIES = 5
+
+# Errors that mean "someone else held the lock, try again later".
+RETRYABLE_CODES = {
+    errorcodes.LOCK_NOT_AVAILABLE,
+    errorcodes.DEADLOCK_DETECTED,
+    errorcodes.SERIALIZATION_FAILURE,
+}
+
+CONCURRENT_INDEX_RE = re.compile(
+    r'^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"?(\w+)"?',
+    re.IGNORECASE)
+
+
+def split_statements(script):
+    """
+    Split a SQL script into statements on top-level semicolons.
+
+    Understands quoted strings, quoted identifiers, $tag$ bodies and both
+    comment styles, so DO blocks and functions stay in one piece.
+    """
+    statements, current = [], []
+    i, n = 0, len(script)
+    while i < n:
+        ch = script[i]
+        if ch == '-' and script.startswith('--', i):
+            end = script.find('\n', i)
+            end = n if end == -1 else end
+            current.append(script[i:end])
+            i = end
+            continue
+        if ch == '/' and script.startswith('/*', i):
+            end = script.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            current.append(script[i:end])
+            i = end
+            continue
+        if ch in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if script[end] == ch:
+                    if end + 1 < n and script[end + 1] == ch:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(script[i:end + 1])
+            i = end + 1
+            continue
+        if ch == '$':
+            match = re.match(r'\$(\w*)\$', script[i:])
+            if match:
+                tag = match.group(0)
+                end = script.find(tag, i + len(tag))
+                end = n if end == -1 else end + len(tag)
+                current.append(script[i:end])
+                i = end
+                continue
+        if ch == ';':
+            statements.append(''.join(current))
+            current = []
+            i += 1
+            continue
+        current.append(ch)
+        i += 1
+    statements.append(''.join(current))
+
+    cleaned = []
+    for statement in statements:
+        without_comments = re.sub(r'--[^\n]*|/\*.*?\*/', '', statement, flags=re.DOTALL)
+        if without_comments.strip():
+            cleaned.append(statement.strip())
+    return cleaned
+
+
+def set_timeouts(db, lock_timeout, statement_timeout, local=True):
+    """Apply timeout guards for the current transaction (local) or session."""
+    scope = 'SET LOCAL' if local else 'SET'
+    db.execute('lock_timeout', f"{scope} lock_timeout = %s", (lock_timeout,))
+    db.execute('statement_timeout', f"{scope} statement_timeout = %s", (statement_timeout,))
+
+
+def reset_timeouts(db):
+    db.execute('reset timeouts', "RESET lock_timeout; RESET statement_timeout")
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def with_lock_retry(conn, fn, retries=DEFAULT_RETRIES, label='statement'):
+    """
+    Call fn(), retrying when it fails on lock contention.
+
+    fn must leave nothing behind when it fails (one transaction, or one
+    autocommit statement); the transaction is rolled back before each retry.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except psycopg2.Error as e:
+            if e.pgcode not in RETRYABLE_CODES or attempt == retries:
+                raise
+            if not conn.autocommit:
+                conn.rollback()
+            delay = backoff_delay(attempt)
+            print(f"  [RETRY] {label}: {e.pgerror.strip() if e.pgerror else e} "
+                  f"(attempt {attempt + 1}/{retries}, waiting {delay:.1f}s)")
+            time.sleep(delay)
+
+
+def drop_invalid_index(db, index_name):
+    """Drop index_name if a failed CONCURRENTLY build left it INVALID. Autocommit only."""
+    rows = db.query('invalid index check', """
+        SELECT n.nspname
+        FROM pg_class i
+        JOIN pg_index x ON x.indexrelid = i.oid
+        JOIN pg_namespace n ON n.oid = i.relnamespace
+        WHERE i.relname = %s AND NOT x.indisvalid
+    """, (index_name,))
+    for (schema,) in rows:
+        print(f"  [CLEANUP] Dropping invalid index {schema}.{index_name}")
+        db.execute('drop invalid index', sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}.{}").format(
+            sql.Identifier(schema), sql.Identifier(index_name)))
+
+
+def run_online_statement(db, statement, lock_timeout=DEFAULT_LOCK_TIMEOUT,
+                         statement_timeout=DEFAULT_STATEMENT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """
+    Run one statement on an autocommit session under timeout guards.
+
+    CREATE INDEX CONCURRENTLY can't run in a transaction block and leaves an
+    INVALID index behind when it fails; that index is dropped before each
+    attempt so IF NOT EXISTS doesn't mistake it for a finished build.
+    """
+    if not db.conn.autocommit:
+        raise ValueError('run_online_statement needs an autocommit session')
+    code_lines = [line for line in statement.splitlines() if line.strip() and not line.strip().startswith('--')]
+    index_match = CONCURRENT_INDEX_RE.match('\n'.join(code_lines))
+    label = (code_lines[0] if code_lines else statement).strip()[:60]
+
+    def attempt():
+        if index_match:
+            drop_invalid_index(db, index_match.group(1))
+        set_timeouts(db, lock_timeout, statement_timeout, local=False)
+        try:
+            db.execute(label, statement)
+        except psycopg2.Error:
+            if index_match:
+                drop_invalid_index(db, index_match.group(1))
+            raise
+        finally:
+            reset_timeouts(db)
+
+    return with_lock_retry(db.conn, attempt, retries, label)
+
+
+def backfill(db, table, set_clause, where, batch_size=1000, sleep=0.05, key='id',
+             lock_timeout=DEFAULT_LOCK_TIMEOUT, statement_timeout='30s',
+             retries=DEFAULT_RETRIES, count=True):
+    """
+    UPDATE table SET set_clause WHERE where, batch_size rows at a time.
+
+    Rows are walked in key order (keyset pagination), so each batch is an
+    index range scan and the run makes progress even if set_clause doesn't
+    clear the where predicate. Every batch commits on its own and takes row
+    locks only on the rows it touches. Returns the number of rows updated.
+    """
+    if db.conn.autocommit:
+        raise ValueError('backfill needs a transactional session')
+    table_id, key_id = sql.Identifier(table), sql.Identifier(key)
+
+    total = None
+    if count:
+        total = db.query('backfill count', sql.SQL("SELECT count(*) FROM {} WHERE {}").format(
+            table_id, sql.SQL(where)))[0][0]
+        db.conn.commit()
+        print(f"Backfilling {total} rows of {table} in batches of {batch_size}...")
+
+    batch_sql = sql.SQL("""
+        WITH batch AS (
+            SELECT {key} FROM {table}
+            WHERE ({where}) AND ({key} > %(last)s OR %(last)s IS NULL)
+            ORDER BY {key}
+            LIMIT %(limit)s
+        ),
+        updated AS (
+            UPDATE {table} t SET {set_clause}
+            FROM batch WHERE t.{key} = batch.{key}
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM updated),
+               (SELECT {key} FROM batch ORDER BY {key} DESC LIMIT 1)
+    """).format(key=key_id, table=table_id, where=sql.SQL(where), set_clause=sql.SQL(set_clause))
+
+    done, last_key, batches = 0, None, 0
+    started = time.perf_counter()
+    while True:
+        def run_batch():
+            set_timeouts(db, lock_timeout, statement_timeout, local=True)
+            result = db.query('backfill batch', batch_sql, {'last': last_key, 'limit': batch_size})[0]
+            db.conn.commit()
+            return result
+
+        updated, batch_last = with_lock_retry(db.conn, run_batch, retries, f'{table} batch')
+        if batch_last is None:
+            break
+        done += updated
+        last_key = batch_last
+        batches += 1
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        progress = f"{done}/{total} ({done / total * 100:.1f}%)" if total else f"{done}"
+        eta = f", ETA {(total - done) / rate:.0f}s" if total and rate else ''
+        print(f"  batch {batches}: {progress} rows, {rate:.0f} rows/s{eta}")
+        if sleep:
+            time.sleep(sleep)
+
+    elapsed = time.perf_counter() - started
+    print(f"[SUCCESS] Backfilled {done} rows in {batches} batches ({elapsed:.1f}s)")
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lock-aware online schema changes')
+    parser.add_argument('--lock-timeout', default=DEFAULT_LOCK_TIMEOUT)
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run statements outside a transaction with timeout guards')
+    run.add_argument('sql', help='SQL text (several statements allowed)')
+    run.add_argument('--statement-timeout', default=DEFAULT_STATEMENT_TIMEOUT)
+
+    fill = sub.add_parser('backfill', help='Chunked UPDATE of a large table')
+    fill.add_argument('table')
+    fill.add_argument('--set', required=True, dest='set_clause', help="e.g. \"col = '{}'::jsonb\"")
+    fill.add_argument('--where', required=True, help='Predicate for rows still to backfill')
+    fill.add_argument('--key', default='id', help='Indexed unique column to paginate on')
+    fill.add_argument('--batch-size', type=int, default=1000)
+    fill.add_argument('--sleep', type=float, default=0.05, help='Seconds to pause between batches')
+    fill.add_argument('--statement-timeout', default='30s')
+    fill.add_argument('--no-count', action='store_true', help='Skip the initial count(*) on huge tables')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'run':
+            with session(autocommit=True) as db:
+                for statement in split_statements(args.sql):
+                    run_online_statement(db, statement, args.lock_timeout,
+                                         args.statement_timeout, args.retries)
+            db.print_timings()
+            print("[SUCCESS] Done")
+        else:
+            with session() as db:
+                backfill(db, args.table, args.set_clause, args.where, args.batch_size, args.sleep,
+                         args.key, args.lock_timeout, args.statement_timeout, args.retries,
+                         count=not args.no_count)
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,732 @@
+#!/usr/bin/env python3
+"""
+Monthly range partitioning for the high-volume log tables
+
+meals, weight_logs, step_logs, hydration_logs and sleep_logs grow by a row
+per user per day (more with wearable sync). This tool converts each of them
+to a table declaratively partitioned by month on its date column, keeps
+future partitions created ahead of time and moves old ones out.
+
+A conversion is online. Each step below can be run on its own or all at
+once with `convert`:
+
+    prepare  create <table>_part, partitioned by RANGE on the date column,
+             with one partition per month from the oldest row to --premake
+             months ahead and a DEFAULT partition for anything outside
+             that range. Indexes, foreign keys and checks are recreated. A
+             trigger mirrors every write on the old table into the new one
+             from here on.
+    copy     copy existing rows in keyset-paginated chunks, one short
+             transaction each. The rows of a chunk are read FOR SHARE, so a
+             concurrent UPDATE waits for the chunk to commit and its mirror
+             write then lands on the copied row.
+    verify   compare the two tables row for row.
+    swap     in one short transaction under lock_timeout: rename the old
+             table to <table>_legacy and the new one into place, then
+             re-point the views and triggers that used the old table.
+
+Primary keys and unique constraints on a partitioned table must include the
+partition key, so meals' primary key becomes (id, logged_at) and logged_at
+becomes NOT NULL (prepare refuses to start while NULLs exist). For the same
+reason, foreign keys that reference a converted table (meal_foods.meal_id ->
+meals.id) can't be kept. They are replaced with triggers: one checks that the
+referenced row exists and one applies the ON DELETE action.
+
+Maintenance, from cron:
+    0 3 * * *  cd backend && python partition_logs.py maintain --premake 3 --keep-months 24
+
+`premake` creates missing partitions through --premake months ahead. It
+moves any matching rows out of the DEFAULT partition and attaches the new
+table, which only takes a SHARE UPDATE EXCLUSIVE lock on the parent.
+`archive` detaches partitions older than --keep-months into the log_archive
+schema, or drops them with --drop. Child rows that reference archived rows
+(meal_foods of archived meals) are left in place.
+
+Usage:
+    python partition_logs.py status
+    python partition_logs.py convert step_logs --batch-size 5000
+    python partition_logs.py explain meals --days 30
+    python partition_logs.py drop-legacy step_logs
+"""
+
+import argparse
+import re
+import sys
+import time
+from datetime import date
+
+from psycopg2 import sql
+
+from db import session
+from online_migrations import DEFAULT_LOCK_TIMEOUT, DEFAULT_RETRIES, set_timeouts, with_lock_retry
+
+# table -> partition key
+LOG_TABLES = {
+    'meals': 'logged_at',
+    'weight_logs': 'logged_at',
+    'step_logs': 'date',
+    'hydration_logs': 'date',
+    'sleep_logs': 'date',
+}
+
+ARCHIVE_SCHEMA = 'log_archive'
+PART_SUFFIX = '_part'
+LEGACY_SUFFIX = '_legacy'
+
+SUPPORT_DDL = """
+-- Mirrors writes on a table being converted into its partitioned copy.
+-- TG_ARGV: target table, partition key column.
+CREATE OR REPLACE FUNCTION partition_sync_mirror()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        EXECUTE format('DELETE FROM %s WHERE id = ($1).id AND %I IS NOT DISTINCT FROM ($1).%I',
+                       TG_ARGV[0], TG_ARGV[1], TG_ARGV[1]) USING OLD;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        EXECUTE format('INSERT INTO %s SELECT ($1).* ON CONFLICT DO NOTHING', TG_ARGV[0]) USING NEW;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Stands in for a foreign key from a child table to a partitioned parent:
+-- the referenced row must exist. Like a real foreign key it takes FOR KEY SHARE
+-- on that row, so a concurrent DELETE of the parent waits for this transaction
+-- (and then sees the child) instead of committing alongside it and leaving an
+-- orphan. TG_ARGV: parent table, parent column, child column.
+CREATE OR REPLACE FUNCTION partition_fk_check()
+RETURNS TRIGGER AS $$
+DECLARE
+    child_is_null BOOLEAN;
+    matched BIGINT;
+BEGIN
+    EXECUTE format('SELECT ($1).%I IS NULL', TG_ARGV[2]) INTO child_is_null USING NEW;
+    IF child_is_null THEN
+        RETURN NEW;
+    END IF;
+    -- EXECUTE doesn't set FOUND; the locked row count says whether the parent exists
+    EXECUTE format('SELECT 1 FROM %s WHERE %I = ($1).%I FOR KEY SHARE',
+                   TG_ARGV[0], TG_ARGV[1], TG_ARGV[2])
+        USING NEW;
+    GET DIAGNOSTICS matched = ROW_COUNT;
+    IF matched = 0 THEN
+        RAISE EXCEPTION 'insert or update on table "%" violates reference to "%"', TG_TABLE_NAME, TG_ARGV[0]
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- The ON DELETE half of that foreign key, run once per statement on the parent.
+-- TG_ARGV: child table, child column, parent column, action (CASCADE, SET NULL, RESTRICT).
+CREATE OR REPLACE FUNCTION partition_fk_on_delete()
+RETURNS TRIGGER AS $$
+DECLARE
+    referenced BOOLEAN;
+BEGIN
+    IF TG_ARGV[3] = 'CASCADE' THEN
+        EXECUTE format('DELETE FROM %s WHERE %I IN (SELECT %I FROM old_rows)',
+                       TG_ARGV[0], TG_ARGV[1], TG_ARGV[2]);
+    ELSIF TG_ARGV[3] = 'SET NULL' THEN
+        EXECUTE format('UPDATE %s SET %I = NULL WHERE %I IN (SELECT %I FROM old_rows)',
+                       TG_ARGV[0], TG_ARGV[1], TG_ARGV[1], TG_ARGV[2]);
+    ELSE
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE %I IN (SELECT %I FROM old_rows))',
+                       TG_ARGV[0], TG_ARGV[1], TG_ARGV[2]) INTO referenced;
+        IF referenced THEN
+            RAISE EXCEPTION 'delete on table "%" violates reference from "%"', TG_TABLE_NAME, TG_ARGV[0]
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+"""
+
+CONSTRAINTS_SQL = """
+SELECT k.conname, k.contype, pg_get_constraintdef(k.oid),
+       ARRAY(SELECT a.attname FROM unnest(k.conkey) WITH ORDINALITY c(attnum, n)
+             JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = c.attnum
+             ORDER BY c.n)
+FROM pg_constraint k
+WHERE k.conrelid = %s::regclass AND k.contype IN ('p', 'u', 'f')
+ORDER BY k.contype, k.conname
+"""
+
+# Plain indexes (not backing a constraint).
+INDEXES_SQL = """
+SELECT i.relname, pg_get_indexdef(x.indexrelid)
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+WHERE x.indrelid = %s::regclass
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = x.indexrelid)
+ORDER BY i.relname
+"""
+
+REFERENCING_FKS_SQL = """
+SELECT k.conname, k.conrelid::regclass::text, k.confdeltype,
+       ARRAY(SELECT a.attname FROM unnest(k.conkey) c(attnum)
+             JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = c.attnum),
+       ARRAY(SELECT a.attname FROM unnest(k.confkey) c(attnum)
+             JOIN pg_attribute a ON a.attrelid = k.confrelid AND a.attnum = c.attnum)
+FROM pg_constraint k
+WHERE k.confrelid = %s::regclass AND k.contype = 'f'
+"""
+
+DEPENDENT_VIEWS_SQL = """
+SELECT DISTINCT v.relname, pg_get_viewdef(v.oid)
+FROM pg_depend d
+JOIN pg_rewrite r ON r.oid = d.objid
+JOIN pg_class v ON v.oid = r.ev_class
+WHERE d.classid = 'pg_rewrite'::regclass
+  AND d.refobjid = %s::regclass
+  AND v.oid <> d.refobjid
+"""
+
+TRIGGERS_SQL = """
+SELECT tgname, pg_get_triggerdef(oid)
+FROM pg_trigger
+WHERE tgrelid = %s::regclass AND NOT tgisinternal AND tgname NOT LIKE '%%_partition_sync'
+"""
+
+PARTITIONS_SQL = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint,
+       pg_total_relation_size(c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = %s::regclass
+ORDER BY c.relname
+"""
+
+FK_ACTIONS = {'c': 'CASCADE', 'n': 'SET NULL', 'a': 'RESTRICT', 'r': 'RESTRICT', 'd': 'RESTRICT'}
+
+
+class PartitionError(Exception):
+    """Raised when a table can't be converted or maintained as asked."""
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_month(table, name):
+    match = re.fullmatch(re.escape(table) + r'_p(\d{4})(\d{2})', name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def relation_exists(db, name, schema='public'):
+    return db.query('exists', "SELECT to_regclass(%s) IS NOT NULL", (f'{schema}.{name}',))[0][0]
+
+
+def is_partitioned(db, table):
+    rows = db.query('relkind', "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    return bool(rows) and rows[0][0] == 'p'
+
+
+def key_type(db, table, key):
+    rows = db.query('key type', """
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+    """, (table, key))
+    if not rows:
+        raise PartitionError(f"{table}.{key} does not exist")
+    return rows[0][0]
+
+
+def bound(month, data_type):
+    """Partition bound literal; timestamptz months start at midnight UTC."""
+    if data_type == 'date':
+        return sql.Literal(month.isoformat())
+    return sql.Literal(f"{month.isoformat()} 00:00:00+00")
+
+
+def month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def current_month():
+    return month_of(date.today())
+
+
+def list_partitions(db, parent):
+    """[(name, bound expression, row estimate, total bytes)] for a partitioned table."""
+    return db.query('partitions', PARTITIONS_SQL, (parent,))
+
+
+def ensure_partition(db, parent, table, key, data_type, month, lock_timeout, retries):
+    """
+    Create and attach the partition for month if it's missing. Returns True if created.
+
+    Rows for that month already sitting in the DEFAULT partition are moved
+    into the new table before it's attached.
+    """
+    name = partition_name(table, month)
+    if relation_exists(db, name):
+        return False
+    default = f"{table}_default"
+
+    def attach():
+        set_timeouts(db, lock_timeout, '0', local=True)
+        db.execute(f'create {name}', sql.SQL(
+            "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(name), sql.Identifier(parent)))
+        if relation_exists(db, default):
+            moved = db.execute(f'move default rows {name}', sql.SQL("""
+                WITH moved AS (
+                    DELETE FROM {default} WHERE {key} >= {start} AND {key} < {end} RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """).format(default=sql.Identifier(default), key=sql.Identifier(key),
+                        start=bound(month, data_type), end=bound(add_months(month, 1), data_type),
+                        name=sql.Identifier(name)))
+            if moved:
+                print(f"  moved {moved} rows from {default} into {name}")
+        db.execute(f'attach {name}', sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(parent), sql.Identifier(name),
+            bound(month, data_type), bound(add_months(month, 1), data_type)))
+        db.conn.commit()
+
+    with_lock_retry(db.conn, attach, retries, f'attach {name}')
+    print(f"  [SUCCESS] Created {name}")
+    return True
+
+
+def premake(db, table, months, lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES, parent=None):
+    """Make sure partitions exist from the current month through months ahead."""
+    parent = parent or table
+    if not is_partitioned(db, parent):
+        raise PartitionError(f"{parent} is not partitioned; run convert first")
+    data_type = key_type(db, parent, LOG_TABLES[table])
+    start = current_month()
+    created = 0
+    for offset in range(months + 1):
+        created += ensure_partition(db, parent, table, LOG_TABLES[table], data_type,
+                                    add_months(start, offset), lock_timeout, retries)
+    return created
+
+
+def build_parent(db, table, key, data_type):
+    """Create <table>_part with the same columns, constraints and indexes, partitioned by key."""
+    parent = table + PART_SUFFIX
+    db.execute('create parent', sql.SQL(
+        "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({})").format(
+        sql.Identifier(parent), sql.Identifier(table), sql.Identifier(key)))
+
+    for name, contype, definition, columns in db.query('constraints', CONSTRAINTS_SQL, (table,)):
+        if contype == 'f':
+            db.execute(f'fk {name}', sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                sql.Identifier(parent), sql.Identifier(name), sql.SQL(definition)))
+            continue
+        keyed = list(columns) if key in columns else list(columns) + [key]
+        if keyed != list(columns):
+            print(f"  [WARNING] {name} becomes ({', '.join(keyed)}): {', '.join(columns)} alone is no "
+                  f"longer enforced unique across partitions, and {key} becomes NOT NULL")
+        kind = 'PRIMARY KEY' if contype == 'p' else 'UNIQUE'
+        db.execute(f'constraint {name}', sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {} ({})").format(
+            sql.Identifier(parent), sql.Identifier(name + PART_SUFFIX), sql.SQL(kind),
+            sql.SQL(', ').join(sql.Identifier(c) for c in keyed)))
+
+    for name, definition in db.query('indexes', INDEXES_SQL, (table,)):
+        match = re.match(r'CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?(\S+) (.*)$', definition)
+        if match.group(1):
+            raise PartitionError(f"unique index {name} doesn't include {key}; add it as a constraint first")
+        db.execute(f'index {name}', sql.SQL("CREATE INDEX {} ON {} {}").format(
+            sql.Identifier(name + PART_SUFFIX), sql.Identifier(parent), sql.SQL(match.group(4))))
+    return parent
+
+
+def prepare(db, table, months_ahead, lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Build the partitioned copy and start mirroring writes into it."""
+    key = LOG_TABLES[table]
+    parent = table + PART_SUFFIX
+    if is_partitioned(db, table):
+        raise PartitionError(f"{table} is already partitioned")
+    if relation_exists(db, parent):
+        raise PartitionError(f"{parent} already exists; finish with copy/swap or drop it to start over")
+    data_type = key_type(db, table, key)
+    nulls = db.query('null keys', sql.SQL("SELECT count(*) FROM {} WHERE {} IS NULL").format(
+        sql.Identifier(table), sql.Identifier(key)))[0][0]
+    if nulls:
+        raise PartitionError(f"{nulls} rows of {table} have no {key}; backfill them first, e.g.\n"
+                             f"  python online_migrations.py backfill {table} --set \"{key} = created_at\" "
+                             f"--where \"{key} IS NULL\"")
+
+    db.execute('support functions', SUPPORT_DDL)
+    build_parent(db, table, key, data_type)
+    db.execute('default partition', sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(f"{table}_default"), sql.Identifier(parent)))
+
+    oldest = db.query('oldest', sql.SQL("SELECT min({}) FROM {}").format(
+        sql.Identifier(key), sql.Identifier(table)))[0][0]
+    first = month_of(oldest) if oldest else current_month()
+    last = add_months(current_month(), months_ahead)
+    month = first
+    while month <= last:
+        db.execute('partition', sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(partition_name(table, month)), sql.Identifier(parent),
+            bound(month, data_type), bound(add_months(month, 1), data_type)))
+        month = add_months(month, 1)
+
+    def install_trigger():
+        set_timeouts(db, lock_timeout, '0', local=True)
+        db.execute('sync trigger', sql.SQL("""
+            CREATE TRIGGER {trigger}
+                AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION partition_sync_mirror({target}, {key})
+        """).format(trigger=sql.Identifier(f"{table}_partition_sync"), table=sql.Identifier(table),
+                    target=sql.Literal(parent), key=sql.Literal(key)))
+        db.conn.commit()
+
+    with_lock_retry(db.conn, install_trigger, retries, f'{table} sync trigger')
+    count = (last.year - first.year) * 12 + last.month - first.month + 1
+    print(f"[SUCCESS] Prepared {parent}: {count} monthly partitions ({first:%Y-%m} .. {last:%Y-%m}) + default")
+    return parent
+
+
+def copy_rows(db, table, batch_size=5000, sleep=0.05, lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Copy every row into <table>_part in id order, one committed chunk at a time."""
+    parent = table + PART_SUFFIX
+    total = db.query('estimate', "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table,))[0][0]
+    db.conn.commit()
+    batch_sql = sql.SQL("""
+        WITH batch AS (
+            SELECT * FROM {table}
+            WHERE (%(last)s::uuid IS NULL OR id > %(last)s::uuid)
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR SHARE
+        ),
+        copied AS (
+            INSERT INTO {parent} SELECT * FROM batch ON CONFLICT DO NOTHING RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM copied), (SELECT id FROM batch ORDER BY id DESC LIMIT 1)
+    """).format(table=sql.Identifier(table), parent=sql.Identifier(parent))
+
+    done, last_id, batches = 0, None, 0
+    started = time.perf_counter()
+    while True:
+        def run_batch():
+            set_timeouts(db, lock_timeout, '30s', local=True)
+            result = db.query('copy batch', batch_sql, {'last': last_id, 'limit': batch_size})[0]
+            db.conn.commit()
+            return result
+
+        copied, batch_last = with_lock_retry(db.conn, run_batch, retries, f'{table} copy batch')
+        if batch_last is None:
+            break
+        done += copied
+        last_id = batch_last
+        batches += 1
+        if batches % 20 == 0:
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed else 0
+            progress = f"{done}/~{total}" if total > 0 else f"{done}"
+            print(f"  batch {batches}: {progress} rows, {rate:.0f} rows/s")
+        if sleep:
+            time.sleep(sleep)
+
+    db.execute('analyze', sql.SQL("ANALYZE {}").format(sql.Identifier(parent)))
+    db.conn.commit()
+    elapsed = time.perf_counter() - started
+    print(f"[SUCCESS] Copied {done} rows of {table} in {batches} batches ({elapsed:.1f}s)")
+    return done
+
+
+def verify(db, table):
+    """Return (rows only in the old table, rows only in the new one), matched on (id, key)."""
+    key = sql.Identifier(LOG_TABLES[table])
+    old, new = sql.Identifier(table), sql.Identifier(table + PART_SUFFIX)
+    missing, extra = db.query('verify', sql.SQL("""
+        SELECT
+            (SELECT count(*) FROM {old} o WHERE NOT EXISTS (
+                SELECT 1 FROM {new} n WHERE n.id = o.id AND n.{key} IS NOT DISTINCT FROM o.{key})),
+            (SELECT count(*) FROM {new} n WHERE NOT EXISTS (
+                SELECT 1 FROM {old} o WHERE o.id = n.id AND o.{key} IS NOT DISTINCT FROM n.{key}))
+    """).format(old=old, new=new, key=key))[0]
+    db.conn.commit()
+    return missing, extra
+
+
+def swap(db, table, lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Put <table>_part in place of table in one short transaction."""
+    parent = table + PART_SUFFIX
+    legacy = table + LEGACY_SUFFIX
+    if relation_exists(db, legacy):
+        raise PartitionError(f"{legacy} already exists; drop it before swapping again")
+
+    def run_swap():
+        set_timeouts(db, lock_timeout, '0', local=True)
+        db.execute('lock', sql.SQL("LOCK TABLE {}, {} IN ACCESS EXCLUSIVE MODE").format(
+            sql.Identifier(table), sql.Identifier(parent)))
+        views = db.query('dependent views', DEPENDENT_VIEWS_SQL, (table,))
+        triggers = db.query('triggers', TRIGGERS_SQL, (table,))
+        referencing = db.query('referencing fks', REFERENCING_FKS_SQL, (table,))
+        constraints = db.query('constraints', CONSTRAINTS_SQL, (table,))
+        indexes = db.query('indexes', INDEXES_SQL, (table,))
+
+        db.execute('drop sync trigger', sql.SQL("DROP TRIGGER {} ON {}").format(
+            sql.Identifier(f"{table}_partition_sync"), sql.Identifier(table)))
+
+        for name, child, action, child_columns, parent_columns in referencing:
+            if len(child_columns) != 1:
+                raise PartitionError(f"{child}.{name} is a multi-column foreign key; drop it by hand first")
+            child_column, parent_column = child_columns[0], parent_columns[0]
+            db.execute(f'drop fk {name}', sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                sql.SQL(child), sql.Identifier(name)))
+            db.execute(f'fk check {name}', sql.SQL("""
+                CREATE TRIGGER {trigger}
+                    BEFORE INSERT OR UPDATE OF {column} ON {child}
+                    FOR EACH ROW EXECUTE FUNCTION partition_fk_check({parent}, {parent_column}, {child_column})
+            """).format(trigger=sql.Identifier(f"{name}_check"), column=sql.Identifier(child_column),
+                        child=sql.SQL(child), parent=sql.Literal(table),
+                        parent_column=sql.Literal(parent_column), child_column=sql.Literal(child_column)))
+            db.execute(f'fk delete {name}', sql.SQL("""
+                CREATE TRIGGER {trigger}
+                    AFTER DELETE ON {parent}
+                    REFERENCING OLD TABLE AS old_rows
+                    FOR EACH STATEMENT
+                    EXECUTE FUNCTION partition_fk_on_delete({child}, {child_column}, {parent_column}, {action})
+            """).format(trigger=sql.Identifier(f"{name}_on_delete"), parent=sql.Identifier(parent),
+                        child=sql.Literal(child), child_column=sql.Literal(child_column),
+                        parent_column=sql.Literal(parent_column), action=sql.Literal(FK_ACTIONS[action])))
+            print(f"  [WARNING] {child}.{child_column} -> {table}.{parent_column} is now enforced by triggers")
+
+        db.execute('rename old', sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(table), sql.Identifier(legacy)))
+        for name, contype, _definition, _columns in constraints:
+            if contype in ('p', 'u'):
+                db.execute(f'rename {name}', sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(legacy), sql.Identifier(name), sql.Identifier(name + LEGACY_SUFFIX)))
+                db.execute(f'rename {name}{PART_SUFFIX}', sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(parent), sql.Identifier(name + PART_SUFFIX), sql.Identifier(name)))
+        for name, _definition in indexes:
+            db.execute(f'rename {name}', sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                sql.Identifier(name), sql.Identifier(name + LEGACY_SUFFIX)))
+            db.execute(f'rename {name}{PART_SUFFIX}', sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                sql.Identifier(name + PART_SUFFIX), sql.Identifier(name)))
+        db.execute('rename new', sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(parent), sql.Identifier(table)))
+
+        # Views and triggers were bound to the old table's OID; recreate them
+        # from the definitions captured above, which name the table as before.
+        for view, definition in views:
+            db.execute(f'view {view}', sql.SQL("CREATE OR REPLACE VIEW {} AS {}").format(
+                sql.Identifier(view), sql.SQL(definition.rstrip().rstrip(';'))))
+        for name, definition in triggers:
+            db.execute(f'drop legacy trigger {name}', sql.SQL("DROP TRIGGER {} ON {}").format(
+                sql.Identifier(name), sql.Identifier(legacy)))
+            db.execute(f'trigger {name}', definition)
+        db.conn.commit()
+        return views, triggers
+
+    views, triggers = with_lock_retry(db.conn, run_swap, retries, f'{table} swap')
+    print(f"[SUCCESS] {table} is now partitioned; the old heap is {legacy} "
+          f"({len(views)} views and {len(triggers)} triggers re-pointed)")
+
+
+def convert(db, table, months_ahead=3, batch_size=5000, sleep=0.05,
+            lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES):
+    """prepare + copy + verify + swap, resuming after an interrupted run."""
+    if not relation_exists(db, table + PART_SUFFIX):
+        prepare(db, table, months_ahead, lock_timeout, retries)
+    copy_rows(db, table, batch_size, sleep, lock_timeout, retries)
+    missing, extra = verify(db, table)
+    if missing or extra:
+        raise PartitionError(f"{table} and {table}{PART_SUFFIX} differ ({missing} missing, {extra} extra); "
+                             f"re-run copy, then verify")
+    swap(db, table, lock_timeout, retries)
+
+
+def archive(db, table, keep_months, drop=False, lock_timeout=DEFAULT_LOCK_TIMEOUT, retries=DEFAULT_RETRIES):
+    """
+    Detach partitions that end before the retention window. Autocommit session.
+
+    Detached tables move to the log_archive schema (or are dropped with
+    drop=True). DETACH ... CONCURRENTLY is used when there's no DEFAULT
+    partition; otherwise a plain DETACH under lock_timeout.
+    """
+    if not db.conn.autocommit:
+        raise ValueError('archive needs an autocommit session')
+    cutoff = add_months(current_month(), -keep_months)
+    has_default = relation_exists(db, f"{table}_default")
+    if not drop:
+        db.execute('archive schema', sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(ARCHIVE_SCHEMA)))
+
+    archived = []
+    for name, _bound, rows, _size in list_partitions(db, table):
+        month = partition_month(table, name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        concurrently = sql.SQL('' if has_default else ' CONCURRENTLY')
+
+        def detach():
+            set_timeouts(db, lock_timeout, '0', local=False)
+            try:
+                db.execute(f'detach {name}', sql.SQL("ALTER TABLE {} DETACH PARTITION {}{}").format(
+                    sql.Identifier(table), sql.Identifier(name), concurrently))
+            finally:
+                db.execute('reset timeouts', "RESET lock_timeout; RESET statement_timeout")
+
+        with_lock_retry(db.conn, detach, retries, f'detach {name}')
+        if drop:
+            db.execute(f'drop {name}', sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            print(f"  [CLEANUP] Dropped {name} (~{max(rows, 0)} rows)")
+        else:
+            db.execute(f'archive {name}', sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+                sql.Identifier(name), sql.Identifier(ARCHIVE_SCHEMA)))
+            print(f"  [SAVED] {name} (~{max(rows, 0)} rows) moved to {ARCHIVE_SCHEMA}")
+        archived.append(name)
+    return archived
+
+
+def drop_legacy(db, table):
+    db.execute('drop legacy', sql.SQL("DROP TABLE {}").format(sql.Identifier(table + LEGACY_SUFFIX)))
+    db.conn.commit()
+
+
+def explain_window(db, table, days):
+    """Show which partitions a recent-window query on table actually scans."""
+    key = LOG_TABLES[table]
+    rows = db.query('explain', sql.SQL("""
+        EXPLAIN (ANALYZE, COSTS OFF, SUMMARY OFF, FORMAT JSON)
+        SELECT count(*) FROM {table} WHERE {key} >= CURRENT_DATE - %s::integer AND {key} < CURRENT_DATE + 1
+    """).format(table=sql.Identifier(table), key=sql.Identifier(key)), (days,))
+    plan = rows[0][0][0]['Plan']
+    scanned, removed = [], 0
+
+    def walk(node):
+        nonlocal removed
+        removed += node.get('Subplans Removed', 0)
+        if 'Relation Name' in node and node.get('Actual Loops', 1) > 0:
+            scanned.append(node['Relation Name'])
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    walk(plan)
+    return scanned, removed
+
+
+def status(db, tables):
+    for table in tables:
+        if not relation_exists(db, table):
+            print(f"\n[WARNING] {table} not found")
+            continue
+        if not is_partitioned(db, table):
+            state = 'copy in progress' if relation_exists(db, table + PART_SUFFIX) else 'not partitioned'
+            print(f"\n{table}: {state}")
+            continue
+        partitions = list_partitions(db, table)
+        months = [partition_month(table, name) for name, *_ in partitions]
+        months = [m for m in months if m]
+        ahead = (months[-1].year - current_month().year) * 12 + months[-1].month - current_month().month if months else 0
+        print(f"\n{table}: {len(partitions)} partitions, {ahead} months ahead"
+              f"{', legacy table present' if relation_exists(db, table + LEGACY_SUFFIX) else ''}")
+        for name, bound_expr, rows, size in partitions:
+            print(f"  {name:<24} {max(rows, 0):>10} rows  {size / 1024 / 1024:8.1f} MB  {bound_expr}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monthly range partitions for the log tables')
+    parser.add_argument('--lock-timeout', default=DEFAULT_LOCK_TIMEOUT)
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def table_parser(name, help_text, many=False):
+        p = sub.add_parser(name, help=help_text)
+        if many:
+            p.add_argument('tables', nargs='*', metavar='table', help=f"Default: {', '.join(LOG_TABLES)}")
+        else:
+            p.add_argument('table', choices=list(LOG_TABLES))
+        return p
+
+    table_parser('status', 'Show partitions per table', many=True)
+    for name, help_text in [('prepare', 'Create the partitioned copy and start mirroring writes'),
+                            ('convert', 'prepare + copy + verify + swap')]:
+        p = table_parser(name, help_text)
+        p.add_argument('--premake', type=int, default=3, help='Months of partitions to create ahead')
+        if name == 'convert':
+            p.add_argument('--batch-size', type=int, default=5000)
+            p.add_argument('--sleep', type=float, default=0.05)
+    p = table_parser('copy', 'Copy existing rows in chunks')
+    p.add_argument('--batch-size', type=int, default=5000)
+    p.add_argument('--sleep', type=float, default=0.05)
+    table_parser('verify', 'Compare the old and partitioned tables')
+    table_parser('swap', 'Put the partitioned table in place')
+    table_parser('drop-legacy', 'Drop <table>_legacy after a successful swap')
+    p = table_parser('premake', 'Create partitions ahead of time', many=True)
+    p.add_argument('--months', type=int, default=3)
+    p = table_parser('archive', 'Detach partitions older than the retention window', many=True)
+    p.add_argument('--keep-months', type=int, required=True)
+    p.add_argument('--drop', action='store_true', help='Drop instead of moving to the archive schema')
+    p = table_parser('maintain', 'premake, then archive if --keep-months is given (for cron)', many=True)
+    p.add_argument('--premake', type=int, default=3)
+    p.add_argument('--keep-months', type=int)
+    p.add_argument('--drop', action='store_true')
+    p = table_parser('explain', 'Show the partitions a recent-window query scans')
+    p.add_argument('--days', type=int, default=30)
+    args = parser.parse_args(argv)
+    if hasattr(args, 'tables'):
+        unknown = sorted(set(args.tables) - set(LOG_TABLES))
+        if unknown:
+            parser.error(f"not a log table: {', '.join(unknown)}")
+        args.tables = args.tables or list(LOG_TABLES)
+
+    try:
+        lock = (args.lock_timeout, args.retries)
+        if args.command in ('archive', 'maintain'):
+            with session() as db:
+                partitioned = [t for t in args.tables if is_partitioned(db, t)]
+                if args.command == 'maintain':
+                    for table in partitioned:
+                        created = premake(db, table, args.premake, *lock)
+                        print(f"  {table}: {created} partitions created")
+            if args.keep_months is not None:
+                with session(autocommit=True) as db:
+                    for table in partitioned:
+                        archived = archive(db, table, args.keep_months, args.drop, *lock)
+                        print(f"  {table}: {len(archived)} partitions archived")
+            print("[SUCCESS] Maintenance complete")
+            return 0
+
+        with session(readonly=args.command in ('status', 'explain')) as db:
+            if args.command == 'status':
+                status(db, args.tables)
+            elif args.command == 'prepare':
+                prepare(db, args.table, args.premake, *lock)
+            elif args.command == 'copy':
+                copy_rows(db, args.table, args.batch_size, args.sleep, *lock)
+            elif args.command == 'verify':
+                missing, extra = verify(db, args.table)
+                if missing or extra:
+                    print(f"[ERROR] {missing} rows missing from {args.table}{PART_SUFFIX}, {extra} extra")
+                    return 1
+                print(f"[SUCCESS] {args.table} and {args.table}{PART_SUFFIX} match")
+            elif args.command == 'swap':
+                swap(db, args.table, *lock)
+            elif args.command == 'convert':
+                convert(db, args.table, args.premake, args.batch_size, args.sleep, *lock)
+            elif args.command == 'drop-legacy':
+                drop_legacy(db, args.table)
+                print(f"[SUCCESS] Dropped {args.table}{LEGACY_SUFFIX}")
+            elif args.command == 'premake':
+                for table in args.tables:
+                    if is_partitioned(db, table):
+                        print(f"  {table}: {premake(db, table, args.months, *lock)} partitions created")
+            else:
+                scanned, removed = explain_window(db, args.table, args.days)
+                print(f"Last {args.days} days of {args.table} scan {len(scanned)} partitions "
+                      f"({removed} pruned): {', '.join(scanned)}")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
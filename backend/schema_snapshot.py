@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Schema snapshot and drift check
+
+Pulls columns, types, nullability, indexes, constraints and row estimates for
+every table and view in the public schema with a single pg_catalog query
+(one round-trip, however many tables there are), caches the result to disk
+and diffs it against the schema declared in database/schema.sql plus the
+ALTER TABLE / CREATE INDEX statements in migrations/.
+
+Usage:
+    python schema_snapshot.py                 # diff, reusing a fresh cached snapshot
+    python schema_snapshot.py --refresh       # always re-read the live catalog
+    python schema_snapshot.py --show          # print the snapshot instead of diffing
+    python schema_snapshot.py --max-age 0     # never trust the cache
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(BACKEND_DIR, 'database', 'schema.sql')
+MIGRATIONS_DIR = os.path.join(BACKEND_DIR, 'migrations')
+DEFAULT_CACHE_PATH = os.path.join(BACKEND_DIR, '.schema_snapshot.json')
+
+# Tables owned by the backend tooling rather than declared in schema.sql.
+TOOLING_TABLES = {'schema_migrations', 'daily_nutrition_rollup', 'daily_nutrition_dirty', 'habit_streak_state',
+                  'calorie_bank_dirty'}
+
+# Everything the drift check needs, aggregated server-side into one JSON
+# document so the whole catalog comes back in a single round-trip.
+SNAPSHOT_SQL = """
+WITH rels AS (
+    SELECT c.oid, c.relname, c.relkind, c.reltuples
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %(schema)s AND c.relkind IN ('r', 'p', 'v', 'm') AND NOT c.relispartition
+),
+cols AS (
+    SELECT a.attrelid,
+           json_agg(json_build_object(
+               'name', a.attname,
+               'type', format_type(a.atttypid, a.atttypmod),
+               'nullable', NOT a.attnotnull,
+               'default', pg_get_expr(d.adbin, d.adrelid)
+           ) ORDER BY a.attnum) AS columns
+    FROM pg_attribute a
+    JOIN rels r ON r.oid = a.attrelid
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE a.attnum > 0 AND NOT a.attisdropped
+    GROUP BY a.attrelid
+),
+idx AS (
+    SELECT x.indrelid,
+           json_agg(json_build_object(
+               'name', i.relname,
+               'definition', pg_get_indexdef(x.indexrelid),
+               'unique', x.indisunique,
+               'primary', x.indisprimary,
+               'valid', x.indisvalid,
+               'size_bytes', pg_relation_size(x.indexrelid)
+           ) ORDER BY i.relname) AS indexes
+    FROM pg_index x
+    JOIN rels r ON r.oid = x.indrelid
+    JOIN pg_class i ON i.oid = x.indexrelid
+    GROUP BY x.indrelid
+),
+cons AS (
+    SELECT k.conrelid,
+           json_agg(json_build_object(
+               'name', k.conname,
+               'type', k.contype,
+               'definition', pg_get_constraintdef(k.oid)
+           ) ORDER BY k.conname) AS constraints
+    FROM pg_constraint k
+    JOIN rels r ON r.oid = k.conrelid
+    GROUP BY k.conrelid
+)
+SELECT current_setting('server_version'),
+       COALESCE(json_object_agg(r.relname, json_build_object(
+           'kind', CASE r.relkind WHEN 'v' THEN 'view' WHEN 'm' THEN 'matview' ELSE 'table' END,
+           'row_estimate', CASE WHEN r.reltuples < 0 THEN NULL ELSE r.reltuples::bigint END,
+           'columns', COALESCE(cols.columns, '[]'::json),
+           'indexes', COALESCE(idx.indexes, '[]'::json),
+           'constraints', COALESCE(cons.constraints, '[]'::json)
+       )), '{}'::json)
+FROM rels r
+LEFT JOIN cols ON cols.attrelid = r.oid
+LEFT JOIN idx ON idx.indrelid = r.oid
+LEFT JOIN cons ON cons.conrelid = r.oid;
+"""
+
+# schema.sql spells types the way people write them; the catalog spells them
+# the way format_type() prints them.
+TYPE_ALIASES = {
+    'varchar': 'character varying',
+    'char': 'character',
+    'decimal': 'numeric',
+    'int': 'integer',
+    'int4': 'integer',
+    'int8': 'bigint',
+    'int2': 'smallint',
+    'serial': 'integer',
+    'bigserial': 'bigint',
+    'float': 'double precision',
+    'float8': 'double precision',
+    'float4': 'real',
+    'bool': 'boolean',
+    'time': 'time without time zone',
+    'timestamp': 'timestamp without time zone',
+    'timestamptz': 'timestamp with time zone',
+}
+
+COLUMN_STOP_WORDS = {
+    'PRIMARY', 'REFERENCES', 'DEFAULT', 'NOT', 'NULL', 'UNIQUE', 'CHECK',
+    'CONSTRAINT', 'GENERATED', 'COLLATE',
+}
+TABLE_CONSTRAINT_WORDS = ('UNIQUE', 'PRIMARY', 'CHECK', 'CONSTRAINT', 'FOREIGN', 'EXCLUDE')
+
+
+def normalize_type(sql_type):
+    """Map a type as written in DDL to format_type() spelling."""
+    t = ' '.join(sql_type.lower().split())
+    array = t.endswith('[]')
+    if array:
+        t = t[:-2].strip()
+    match = re.match(r'^([a-z ]+?)\s*(\(.*\))?$', t)
+    if match:
+        base, args = match.group(1), match.group(2) or ''
+        base = TYPE_ALIASES.get(base, base)
+        t = base + args.replace(' ', '')
+    return t + ('[]' if array else '')
+
+
+def _strip_comments(sql):
+    return re.sub(r'--[^\n]*', '', sql)
+
+
+def _split_top_level(body):
+    """Split a CREATE TABLE body on commas that are not inside parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in body:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
+
+
+def _parse_column(definition):
+    tokens = definition.split()
+    name = tokens[0].strip('"')
+    type_tokens = []
+    for token in tokens[1:]:
+        if token.upper() in COLUMN_STOP_WORDS:
+            break
+        type_tokens.append(token)
+    upper = definition.upper()
+    nullable = 'NOT NULL' not in upper and 'PRIMARY KEY' not in upper
+    return {'name': name, 'type': normalize_type(' '.join(type_tokens)), 'nullable': nullable}
+
+
+def parse_expected_schema(schema_path=SCHEMA_PATH, migrations_dir=MIGRATIONS_DIR):
+    """
+    Read the declared schema out of schema.sql and the migrations directory.
+
+    Returns {'tables': {name: {'columns': {col: {...}}, 'indexes': set()}},
+    'views': set()}. Only what the DDL states is recorded; anything the
+    parser can't follow is left out rather than guessed.
+    """
+    sources = [schema_path] + sorted(glob.glob(os.path.join(migrations_dir, '*.sql')))
+    tables, views = {}, set()
+
+    for path in sources:
+        with open(path, encoding='utf-8') as f:
+            sql = _strip_comments(f.read())
+
+        for match in re.finditer(
+                r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*?)\)\s*;',
+                sql, re.IGNORECASE | re.DOTALL):
+            name, body = match.group(1).lower(), match.group(2)
+            table = tables.setdefault(name, {'columns': {}, 'indexes': set()})
+            for part in _split_top_level(body):
+                if not part or part.upper().startswith(TABLE_CONSTRAINT_WORDS):
+                    continue
+                column = _parse_column(part)
+                table['columns'][column['name']] = column
+
+        for match in re.finditer(r'ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(\w+)(.*?);',
+                                 sql, re.IGNORECASE | re.DOTALL):
+            table = tables.setdefault(match.group(1).lower(), {'columns': {}, 'indexes': set()})
+            for part in _split_top_level(match.group(2)):
+                add = re.match(r'ADD\s+(?:COLUMN\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(.*)$',
+                               part.strip(), re.IGNORECASE | re.DOTALL)
+                if add and not add.group(1).upper().startswith(TABLE_CONSTRAINT_WORDS):
+                    column = _parse_column(add.group(1))
+                    table['columns'][column['name']] = column
+
+        for match in re.finditer(
+                r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(?:ONLY\s+)?(\w+)',
+                sql, re.IGNORECASE):
+            tables.setdefault(match.group(2).lower(), {'columns': {}, 'indexes': set()})
+            tables[match.group(2).lower()]['indexes'].add(match.group(1).lower())
+
+        for match in re.finditer(r'CREATE\s+(?:OR\s+REPLACE\s+)?(?:MATERIALIZED\s+)?VIEW\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+                                 sql, re.IGNORECASE):
+            views.add(match.group(1).lower())
+
+    return {'tables': tables, 'views': views}
+
+
+def fetch_snapshot(db, schema='public'):
+    """Read the live catalog over db (a db.Session) in one query."""
+    (server_version, relations), = db.query('schema snapshot', SNAPSHOT_SQL, {'schema': schema})
+    return {
+        'taken_at': datetime.now(timezone.utc).isoformat(),
+        'server_version': server_version,
+        'schema': schema,
+        'relations': relations,
+    }
+
+
+def load_cached_snapshot(cache_path, source, max_age, schema='public'):
+    """Return the cached snapshot if it is for source and schema and newer than max_age seconds."""
+    if max_age <= 0 or not os.path.exists(cache_path):
+        return None
+    if time.time() - os.path.getmtime(cache_path) > max_age:
+        return None
+    with open(cache_path, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    if snapshot.get('source') != source or snapshot.get('schema') != schema:
+        return None
+    return snapshot
+
+
+def save_snapshot(snapshot, cache_path):
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def diff_schema(expected, snapshot):
+    """
+    Compare the declared schema with a snapshot.
+
+    Returns a list of (severity, message) tuples. 'error' means something the
+    app depends on is missing or has the wrong type; 'warning' covers drift
+    that is usually harmless (nullability, undeclared extra objects).
+    """
+    problems = []
+    relations = snapshot['relations']
+
+    for table_name, table in sorted(expected['tables'].items()):
+        live = relations.get(table_name)
+        if live is None or live['kind'] == 'view':
+            problems.append(('error', f"missing table {table_name}"))
+            continue
+        live_columns = {c['name']: c for c in live['columns']}
+        for column_name, column in table['columns'].items():
+            live_column = live_columns.get(column_name)
+            if live_column is None:
+                problems.append(('error', f"missing column {table_name}.{column_name} ({column['type']})"))
+                continue
+            if live_column['type'] != column['type']:
+                problems.append(('error', f"type mismatch {table_name}.{column_name}: "
+                                          f"expected {column['type']}, found {live_column['type']}"))
+            if live_column['nullable'] != column['nullable']:
+                expected_null = 'NULL' if column['nullable'] else 'NOT NULL'
+                problems.append(('warning', f"nullability {table_name}.{column_name}: expected {expected_null}"))
+        for column_name in sorted(set(live_columns) - set(table['columns'])):
+            problems.append(('warning', f"undeclared column {table_name}.{column_name}"))
+        live_indexes = {i['name'] for i in live['indexes']}
+        for index_name in sorted(table['indexes'] - live_indexes):
+            problems.append(('error', f"missing index {index_name} on {table_name}"))
+        for index in live['indexes']:
+            if not index['valid']:
+                problems.append(('error', f"invalid index {index['name']} on {table_name}"))
+
+    for view_name in sorted(expected['views']):
+        if view_name not in relations:
+            problems.append(('error', f"missing view {view_name}"))
+
+    declared = set(expected['tables']) | expected['views'] | TOOLING_TABLES
+    for name in sorted(set(relations) - declared):
+        problems.append(('warning', f"undeclared {relations[name]['kind']} {name}"))
+
+    return problems
+
+
+def print_snapshot(snapshot):
+    print(f"\nPostgreSQL {snapshot['server_version']} - snapshot taken {snapshot['taken_at']}")
+    for name, rel in sorted(snapshot['relations'].items()):
+        rows = rel['row_estimate']
+        rows_text = 'not analyzed' if rows is None else f"~{rows} rows"
+        print(f"\n  {name} ({rel['kind']}, {rows_text})")
+        for col in rel['columns']:
+            print(f"    - {col['name']}: {col['type']} (nullable: {'YES' if col['nullable'] else 'NO'})")
+        for index in rel['indexes']:
+            print(f"    # {index['definition']}")
+        for con in rel['constraints']:
+            print(f"    ! {con['name']}: {con['definition']}")
+
+
+def get_snapshot(refresh=False, cache_path=DEFAULT_CACHE_PATH, max_age=300, schema='public'):
+    """Return (snapshot, from_cache), hitting the database only when the cache is stale."""
+    from db import describe_dsn, get_dsn, session
+
+    source = describe_dsn(get_dsn())
+    if not refresh:
+        cached = load_cached_snapshot(cache_path, source, max_age, schema)
+        if cached is not None:
+            return cached, True
+
+    with session(readonly=True) as db:
+        snapshot = fetch_snapshot(db, schema)
+    snapshot['source'] = source
+    db.print_timings()
+    save_snapshot(snapshot, cache_path)
+    return snapshot, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Snapshot the live schema and diff it against schema.sql')
+    parser.add_argument('--refresh', action='store_true', help='Ignore the cached snapshot')
+    parser.add_argument('--max-age', type=int, default=300, help='Seconds a cached snapshot stays valid (default 300)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='Snapshot cache file')
+    parser.add_argument('--schema', default='public')
+    parser.add_argument('--show', action='store_true', help='Print the snapshot instead of diffing')
+    parser.add_argument('--strict', action='store_true', help='Treat warnings as failures')
+    args = parser.parse_args(argv)
+
+    try:
+        snapshot, from_cache = get_snapshot(args.refresh, args.cache, args.max_age, args.schema)
+    except Exception as e:
+        print(f"[ERROR] Snapshot failed: {e}")
+        return 1
+
+    if from_cache:
+        print(f"Using cached snapshot from {snapshot['taken_at']} ({args.cache})")
+
+    if args.show:
+        print_snapshot(snapshot)
+        return 0
+
+    problems = diff_schema(parse_expected_schema(), snapshot)
+    errors = [message for severity, message in problems if severity == 'error']
+    warnings = [message for severity, message in problems if severity == 'warning']
+    for message in errors:
+        print(f"[ERROR] {message}")
+    for message in warnings:
+        print(f"[WARNING] {message}")
+
+    if not problems:
+        print(f"\n[SUCCESS] Schema matches ({len(snapshot['relations'])} tables and views)")
+    else:
+        print(f"\n{len(errors)} errors, {len(warnings)} warnings")
+    return 1 if errors or (args.strict and warnings) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
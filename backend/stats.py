@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Nearest-rank percentiles shared by the benchmarks and result queries
+
+Standard library only, so the Playwright tools and run_history.py can use
+it without loading psycopg2:
+
+    from stats import percentile            # backend scripts (db.py re-exports it)
+    from backend.stats import percentile    # scripts at the repo root
+
+The pth percentile of n sorted samples is the ceil(p * n / 100)-th
+smallest (1-based), so p50 of 10 samples is the 5th and p95 of 20 is the
+19th, never the max:
+
+    >>> percentile(range(1, 11), 50)
+    5
+    >>> percentile(range(1, 21), 95)
+    19
+    >>> percentile([1, 2], 50)
+    1
+    >>> percentile([3, 1, 2], 100), percentile([3, 1, 2], 0)
+    (3, 1)
+    >>> percentile(range(1, 101), 7)
+    7
+    >>> percentile([], 95)
+    0.0
+
+Check: python stats.py (runs the examples above)
+"""
+
+
+def percentile(samples, pct, default=0.0):
+    """Nearest-rank percentile of a list of numbers (pct in 0-100); default when there are none."""
+    ordered = sorted(samples)
+    if not ordered:
+        return default
+    # Integer ceiling of pct * n / 100; pct / 100 * n picks up float error (0.07 * 100 > 7)
+    rank = -(-pct * len(ordered) // 100)
+    return ordered[max(0, min(len(ordered), int(rank)) - 1)]
+
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+
+    failed, tried = doctest.testmod()
+    print(f"[{'ERROR' if failed else 'SUCCESS'}] {tried - failed}/{tried} percentile checks passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for load-testing the schema
+
+Creates realistic users with goals, habits and a history of meals (with
+meal_foods), weight_logs, step_logs, sleep_logs, habit_completions and
+calorie_bank rows, ending today. Everything is streamed into Postgres with
+COPY FROM STDIN: rows are produced lazily and read by copy_expert in 64 KB
+chunks, so memory stays flat no matter how many rows are loaded.
+
+Generation is deterministic for a given --seed. Each user's history comes
+from its own seeded RNG, which lets meals, meal_foods and calorie_bank be
+streamed as separate COPYs that still agree with each other.
+
+Synthetic users have emails like synthetic+42@heirclark.test; `clean`
+deletes them (and, by cascade, everything they own).
+
+Usage:
+    python synthetic_data.py load --users 1000 --days 180
+    python synthetic_data.py load --users 20000 --days 365 --replica-mode
+    python synthetic_data.py clean
+    python load_test.py                 # then benchmark the access paths
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+from db import session
+
+EMAIL_DOMAIN = 'heirclark.test'
+EMAIL_PATTERN = f'synthetic+%@{EMAIL_DOMAIN}'
+
+FIRST_NAMES = ['Ava', 'Ben', 'Chloe', 'Diego', 'Emma', 'Farah', 'Gabe', 'Hana', 'Isaac', 'Jade',
+               'Kofi', 'Lena', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq']
+LAST_NAMES = ['Adams', 'Brooks', 'Chen', 'Davis', 'Evans', 'Garcia', 'Hughes', 'Ito', 'Jones',
+              'Khan', 'Lopez', 'Martin', 'Nguyen', 'Okafor', 'Patel', 'Reyes', 'Smith', 'Walker']
+
+# name, portion, calories, protein, carbs, fat
+FOODS = {
+    'breakfast': [
+        ('Scrambled eggs', '2 large', 182, 12.6, 1.6, 13.4),
+        ('Greek yogurt', '170 g', 100, 17.0, 6.0, 0.7),
+        ('Rolled oats', '1 cup cooked', 166, 5.9, 28.1, 3.6),
+        ('Banana', '1 medium', 105, 1.3, 27.0, 0.4),
+        ('Whole wheat toast', '2 slices', 160, 8.0, 28.0, 2.0),
+        ('Blueberries', '1 cup', 84, 1.1, 21.4, 0.5),
+        ('Turkey bacon', '3 slices', 90, 9.0, 1.0, 6.0),
+    ],
+    'lunch': [
+        ('Grilled chicken breast', '6 oz', 280, 52.8, 0.0, 6.1),
+        ('Brown rice', '1 cup', 216, 5.0, 44.8, 1.8),
+        ('Mixed green salad', '2 cups', 20, 1.6, 3.8, 0.2),
+        ('Turkey sandwich', '1 sandwich', 350, 24.0, 38.0, 10.0),
+        ('Black bean soup', '1 bowl', 230, 12.0, 38.0, 3.0),
+        ('Avocado', '1/2 fruit', 120, 1.5, 6.4, 11.0),
+        ('Quinoa', '1 cup', 222, 8.1, 39.4, 3.6),
+    ],
+    'dinner': [
+        ('Salmon fillet', '6 oz', 350, 34.0, 0.0, 22.0),
+        ('Sirloin steak', '6 oz', 410, 46.0, 0.0, 24.0),
+        ('Sweet potato', '1 medium', 112, 2.0, 26.0, 0.1),
+        ('Steamed broccoli', '1 cup', 55, 3.7, 11.2, 0.6),
+        ('Pasta with marinara', '1.5 cups', 330, 11.0, 62.0, 4.0),
+        ('Roasted vegetables', '1 cup', 90, 2.0, 14.0, 3.5),
+        ('Tofu stir fry', '1.5 cups', 290, 18.0, 20.0, 15.0),
+    ],
+    'snack': [
+        ('Almonds', '1 oz', 164, 6.0, 6.1, 14.2),
+        ('Protein bar', '1 bar', 210, 20.0, 23.0, 7.0),
+        ('Apple', '1 medium', 95, 0.5, 25.1, 0.3),
+        ('String cheese', '1 stick', 80, 7.0, 1.0, 6.0),
+        ('Hummus and carrots', '1 serving', 150, 5.0, 17.0, 8.0),
+    ],
+}
+
+# meal_type -> (probability per day, hour range)
+MEAL_SLOTS = [
+    ('breakfast', 0.85, (6, 10)),
+    ('lunch', 0.92, (11, 14)),
+    ('dinner', 0.95, (17, 21)),
+    ('snack', 0.60, (14, 17)),
+    ('snack', 0.30, (20, 23)),
+]
+
+HABITS = [
+    ('Drink 8 glasses of water', 'hydration'),
+    ('Walk 10k steps', 'activity'),
+    ('Meditate', 'mindfulness'),
+    ('Log every meal', 'nutrition'),
+    ('Stretch', 'activity'),
+    ('In bed by 11pm', 'sleep'),
+]
+
+SOURCES = ['manual', 'photo', 'voice', 'barcode']
+
+COPY_COLUMNS = {
+    'users': ('id', 'email', 'full_name', 'created_at', 'last_login'),
+    'user_goals': ('user_id', 'daily_calories', 'daily_protein', 'daily_carbs', 'daily_fat', 'daily_steps'),
+    'habits': ('id', 'user_id', 'habit_name', 'habit_type'),
+    'meals': ('id', 'user_id', 'meal_name', 'meal_type', 'calories', 'protein', 'carbs', 'fat',
+              'fiber', 'sodium', 'logged_at', 'source', 'created_at'),
+    'meal_foods': ('meal_id', 'food_name', 'portion', 'calories', 'protein', 'carbs', 'fat'),
+    'weight_logs': ('user_id', 'weight', 'unit', 'body_fat_percent', 'logged_at', 'source'),
+    'step_logs': ('user_id', 'date', 'steps', 'distance_km', 'active_minutes', 'source'),
+    'sleep_logs': ('user_id', 'date', 'bed_time', 'wake_time', 'total_hours', 'deep_sleep_hours',
+                   'rem_sleep_hours', 'quality_score', 'source'),
+    'habit_completions': ('habit_id', 'user_id', 'date', 'value', 'completed_at'),
+    'calorie_bank': ('user_id', 'date', 'banked_calories', 'running_balance'),
+}
+
+# Parents before children so foreign keys are satisfied.
+LOAD_ORDER = ['users', 'user_goals', 'habits', 'meals', 'meal_foods', 'weight_logs',
+              'step_logs', 'sleep_logs', 'habit_completions', 'calorie_bank']
+
+
+def copy_value(value):
+    """Format one value for COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+    return str(value)
+
+
+def copy_line(values):
+    return '\t'.join(copy_value(v) for v in values) + '\n'
+
+
+class CopyStream(io.TextIOBase):
+    """Read-only file object over an iterator of COPY lines, for copy_expert."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._pending = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._pending]
+        length = len(self._pending)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def make_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, dt_time(hour, minute), tzinfo=timezone.utc)
+
+
+class SyntheticUser:
+    """One generated user and the parameters that shape their history."""
+
+    __slots__ = ('index', 'id', 'email', 'full_name', 'calorie_target', 'start_weight',
+                 'weight_trend', 'body_fat', 'step_mean', 'sleep_mean', 'habits', 'seed')
+
+    def __init__(self, index, seed):
+        rng = random.Random(f"{seed}:user:{index}")
+        self.index = index
+        self.seed = seed
+        self.id = make_uuid(rng)
+        self.email = f"synthetic+{index}@{EMAIL_DOMAIN}"
+        self.full_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        self.calorie_target = rng.choice([1600, 1800, 2000, 2200, 2400, 2600, 2800])
+        self.start_weight = round(rng.uniform(120, 260), 1)
+        self.weight_trend = rng.choice([-0.12, -0.06, 0.0, 0.0, 0.04])  # lbs/day
+        self.body_fat = round(rng.uniform(12, 35), 1)
+        self.step_mean = rng.randint(3000, 14000)
+        self.sleep_mean = rng.uniform(6.0, 8.5)
+        self.habits = [(make_uuid(rng), name, kind, rng.uniform(0.5, 0.95))
+                       for name, kind in rng.sample(HABITS, rng.randint(1, 4))]
+
+    def rng(self, stream):
+        """A deterministic RNG for one of this user's row streams."""
+        return random.Random(f"{self.seed}:{stream}:{self.index}")
+
+
+def user_meal_days(user, days, end):
+    """Yield (day, [(meal_id, meal_type, logged_at, source, foods), ...]) oldest first."""
+    rng = user.rng('meals')
+    for offset in range(days - 1, -1, -1):
+        day = end - timedelta(days=offset)
+        meals = []
+        for meal_type, probability, (first_hour, last_hour) in MEAL_SLOTS:
+            if rng.random() > probability:
+                continue
+            foods = []
+            for food in rng.sample(FOODS[meal_type], rng.randint(1, 3 if meal_type == 'snack' else 4)):
+                scale = rng.choice([0.5, 1.0, 1.0, 1.0, 1.5, 2.0])
+                name, portion, calories, protein, carbs, fat = food
+                foods.append((name, portion if scale == 1.0 else f"{scale}x {portion}",
+                              round(calories * scale), round(protein * scale, 2),
+                              round(carbs * scale, 2), round(fat * scale, 2)))
+            logged_at = at(day, rng.randint(first_hour, last_hour), rng.randint(0, 59))
+            meals.append((make_uuid(rng), meal_type, logged_at, rng.choice(SOURCES), foods))
+        yield day, meals
+
+
+def meal_rows(users, days, end):
+    for user in users:
+        for _day, meals in user_meal_days(user, days, end):
+            for meal_id, meal_type, logged_at, source, foods in meals:
+                name = foods[0][0] if len(foods) == 1 else f"{foods[0][0]} with {foods[1][0].lower()}"
+                calories = sum(f[2] for f in foods)
+                protein = round(sum(f[3] for f in foods), 2)
+                carbs = round(sum(f[4] for f in foods), 2)
+                fat = round(sum(f[5] for f in foods), 2)
+                fiber = round(carbs * 0.12, 2)
+                sodium = round(calories * 1.4, 2)
+                yield copy_line((meal_id, user.id, name, meal_type, calories, protein, carbs, fat,
+                                 fiber, sodium, logged_at, source, logged_at))
+
+
+def meal_food_rows(users, days, end):
+    for user in users:
+        for _day, meals in user_meal_days(user, days, end):
+            for meal in meals:
+                for food in meal[4]:
+                    yield copy_line((meal[0],) + food)
+
+
+def calorie_bank_rows(users, days, end):
+    for user in users:
+        balance = 0
+        for day, meals in user_meal_days(user, days, end):
+            consumed = sum(food[2] for meal in meals for food in meal[4])
+            banked = max(-500, min(500, user.calorie_target - consumed))
+            balance += banked
+            yield copy_line((user.id, day, banked, balance))
+
+
+def user_rows(users, days, end):
+    for user in users:
+        created = at(end - timedelta(days=days), 9)
+        yield copy_line((user.id, user.email, user.full_name, created, at(end, 8)))
+
+
+def goal_rows(users, days, end):
+    for user in users:
+        target = user.calorie_target
+        yield copy_line((user.id, target, round(target * 0.3 / 4), round(target * 0.4 / 4),
+                         round(target * 0.3 / 9), 10000))
+
+
+def habit_rows(users, days, end):
+    for user in users:
+        for habit_id, name, kind, _rate in user.habits:
+            yield copy_line((habit_id, user.id, name, kind))
+
+
+def weight_rows(users, days, end):
+    for user in users:
+        rng = user.rng('weight')
+        for offset in range(days - 1, -1, -1):
+            if rng.random() > 0.7:
+                continue
+            day = end - timedelta(days=offset)
+            weight = user.start_weight + user.weight_trend * (days - offset) + rng.gauss(0, 0.8)
+            yield copy_line((user.id, round(weight, 2), 'lbs', user.body_fat,
+                             at(day, rng.randint(6, 9), rng.randint(0, 59)),
+                             rng.choice(['manual', 'apple_health'])))
+
+
+def step_rows(users, days, end):
+    for user in users:
+        rng = user.rng('steps')
+        for offset in range(days - 1, -1, -1):
+            if rng.random() > 0.9:
+                continue
+            steps = max(0, int(rng.gauss(user.step_mean, user.step_mean * 0.3)))
+            yield copy_line((user.id, end - timedelta(days=offset), steps, round(steps * 0.00076, 2),
+                             steps // 110, 'apple_health'))
+
+
+def sleep_rows(users, days, end):
+    for user in users:
+        rng = user.rng('sleep')
+        for offset in range(days - 1, -1, -1):
+            if rng.random() > 0.8:
+                continue
+            day = end - timedelta(days=offset)
+            hours = max(3.0, min(11.0, rng.gauss(user.sleep_mean, 0.8)))
+            bed_time = at(day - timedelta(days=1), 22) + timedelta(minutes=rng.randint(-60, 90))
+            yield copy_line((user.id, day, bed_time, bed_time + timedelta(hours=hours), round(hours, 2),
+                             round(hours * rng.uniform(0.15, 0.25), 2),
+                             round(hours * rng.uniform(0.18, 0.25), 2),
+                             max(1, min(100, int(hours / 8 * 85 + rng.gauss(0, 6)))), 'apple_health'))
+
+
+def habit_completion_rows(users, days, end):
+    for user in users:
+        rng = user.rng('habits')
+        for habit_id, _name, _kind, rate in user.habits:
+            for offset in range(days - 1, -1, -1):
+                if rng.random() < rate:
+                    day = end - timedelta(days=offset)
+                    yield copy_line((habit_id, user.id, day, 1, at(day, rng.randint(7, 22))))
+
+
+ROW_GENERATORS = {
+    'users': user_rows,
+    'user_goals': goal_rows,
+    'habits': habit_rows,
+    'meals': meal_rows,
+    'meal_foods': meal_food_rows,
+    'weight_logs': weight_rows,
+    'step_logs': step_rows,
+    'sleep_logs': sleep_rows,
+    'habit_completions': habit_completion_rows,
+    'calorie_bank': calorie_bank_rows,
+}
+
+
+def copy_table(db, table, lines):
+    """Stream lines into table with COPY FROM STDIN; returns (rows, seconds)."""
+    columns = ', '.join(COPY_COLUMNS[table])
+    started = time.perf_counter()
+    with db.conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", CopyStream(lines), size=65536)
+        rows = cursor.rowcount
+    return rows, time.perf_counter() - started
+
+
+def refresh_derived(db):
+    """Bring the nutrition rollup and habit streak tables up to date if installed."""
+    installed = {row[0] for row in db.query('derived tables', """
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = current_schema()
+          AND table_name IN ('daily_nutrition_rollup', 'habit_streak_state')
+    """)}
+    if 'daily_nutrition_rollup' in installed:
+        from nutrition_rollup import rebuild
+        print(f"  daily_nutrition_rollup rebuilt: {rebuild(db)} day buckets")
+    if 'habit_streak_state' in installed:
+        from habit_streaks import backfill
+        backfill(db)
+
+
+def load(db, users, days, seed=42, first_index=0, end=None, replica_mode=False, tables=None):
+    """
+    Generate and COPY users first_index..first_index+users-1. Returns table -> rows.
+
+    replica_mode sets session_replication_role = replica for the load, which
+    skips foreign key checks and triggers (superuser only); derived tables
+    are rebuilt afterwards.
+    """
+    end = end or date.today()
+    people = [SyntheticUser(i, seed) for i in range(first_index, first_index + users)]
+    counts = {}
+    total_started = time.perf_counter()
+    if replica_mode:
+        db.execute('replica mode', "SET session_replication_role = replica")
+    try:
+        for table in tables or LOAD_ORDER:
+            rows, seconds = copy_table(db, table, ROW_GENERATORS[table](people, days, end))
+            db.conn.commit()
+            counts[table] = rows
+            print(f"  {table:<18} {rows:>11,} rows  {seconds:7.1f}s  {rows / seconds if seconds else 0:>10,.0f} rows/s")
+    finally:
+        if replica_mode:
+            db.conn.rollback()
+            db.execute('origin mode', "SET session_replication_role = origin")
+            db.conn.commit()
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - total_started
+    print(f"  {'total':<18} {total:>11,} rows  {elapsed:7.1f}s  {total / elapsed if elapsed else 0:>10,.0f} rows/s")
+    if replica_mode:
+        refresh_derived(db)
+        db.conn.commit()
+    db.execute('analyze', "ANALYZE " + ', '.join(tables or LOAD_ORDER))
+    db.conn.commit()
+    return counts
+
+
+def clean(db):
+    """Delete every synthetic user; their rows go with them via ON DELETE CASCADE."""
+    removed = db.execute('delete synthetic users', "DELETE FROM users WHERE email LIKE %s", (EMAIL_PATTERN,))
+    db.conn.commit()
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic Heirclark data with COPY')
+    sub = parser.add_subparsers(dest='command', required=True)
+    load_parser = sub.add_parser('load', help='Generate and load synthetic users and history')
+    load_parser.add_argument('--users', type=int, default=1000)
+    load_parser.add_argument('--days', type=int, default=180, help='Days of history ending today')
+    load_parser.add_argument('--seed', type=int, default=42)
+    load_parser.add_argument('--first-index', type=int, default=0,
+                             help='Start numbering here to add users to an existing load')
+    load_parser.add_argument('--tables', nargs='+', choices=LOAD_ORDER, help='Only load these tables')
+    load_parser.add_argument('--replica-mode', action='store_true',
+                             help='Skip FK checks and triggers during COPY (superuser only)')
+    sub.add_parser('clean', help='Delete all synthetic users and their data')
+    args = parser.parse_args(argv)
+
+    try:
+        with session() as db:
+            if args.command == 'load':
+                print(f"Loading {args.users} synthetic users x {args.days} days (seed {args.seed})...")
+                load(db, args.users, args.days, args.seed, args.first_index,
+                     replica_mode=args.replica_mode, tables=args.tables)
+                print("[SUCCESS] Synthetic data loaded")
+            else:
+                print(f"[SUCCESS] Removed {clean(db)} synthetic users")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of wearable history into the step, sleep, weight and calorie logs
+
+Backfilling months of Apple Health, Fitbit or Google Fit history one
+INSERT per day is far too slow. This tool streams a provider export, stages
+the rows in a temp table with COPY and merges each batch with one
+INSERT ... ON CONFLICT (user_id, date) DO UPDATE per table, then reports
+rows per second.
+
+Formats:
+    apple-health   export.xml from Health > Profile > Export All Health Data,
+                   streamed by apple_health_export.py into per-day rows for
+                   step_logs, sleep_logs, weight_logs and calorie_logs.
+    csv            rows for one table (--table), header names matching its
+                   columns: date,steps,distance_km,active_minutes for
+                   step_logs, and so on. Use this for Fitbit / Google Fit
+                   exports reshaped to one row per day.
+
+Rows that already exist are only rewritten when a value actually changed,
+so re-ingesting the same export is cheap. weight_logs has no unique key,
+so a reading is matched on (user_id, logged_at) instead of ON CONFLICT. The user's connected_devices row
+for the provider gets last_sync_at = NOW().
+
+Usage:
+    python wearable_ingest.py --user guest@heirclark.app apple-health ~/Downloads/export.xml
+    python wearable_ingest.py --user <uuid> --provider fitbit csv steps.csv --table step_logs
+    python wearable_ingest.py --user <uuid> --dry-run apple-health export.xml
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+from apple_health_export import ROW_COLUMNS, parse
+from db import resolve_user, session
+from synthetic_data import CopyStream, copy_line
+
+# table -> (columns loaded from the export, SET clause for rows that already exist)
+TARGETS = {
+    'step_logs': (
+        ROW_COLUMNS['step_logs'],
+        """steps = EXCLUDED.steps,
+           distance_km = EXCLUDED.distance_km,
+           active_minutes = EXCLUDED.active_minutes,
+           source = EXCLUDED.source""",
+    ),
+    'sleep_logs': (
+        ROW_COLUMNS['sleep_logs'],
+        """bed_time = EXCLUDED.bed_time,
+           wake_time = EXCLUDED.wake_time,
+           total_hours = EXCLUDED.total_hours,
+           deep_sleep_hours = EXCLUDED.deep_sleep_hours,
+           rem_sleep_hours = EXCLUDED.rem_sleep_hours,
+           source = EXCLUDED.source""",
+    ),
+    'calorie_logs': (
+        ROW_COLUMNS['calorie_logs'],
+        """calories_burned = EXCLUDED.calories_burned,
+           net_calories = t.calories_consumed - EXCLUDED.calories_burned""",
+    ),
+    # No unique key: a reading is identified by (user_id, logged_at), see LOOKUP_MERGE_SQL
+    'weight_logs': (
+        ROW_COLUMNS['weight_logs'],
+        """weight = s.weight,
+           unit = s.unit,
+           body_fat_percent = s.body_fat_percent,
+           source = s.source""",
+    ),
+}
+KEYS = {'weight_logs': ('user_id', 'logged_at')}
+DEFAULT_KEY = ('user_id', 'date')
+NOT_COMPARED = {'user_id', 'date', 'logged_at', 'source', 'net_calories'}
+
+# The existing CTE reads the snapshot from before the insert, so it counts
+# the conflicts (xmax = 0 can't be read through a partitioned table).
+MERGE_SQL = """
+WITH staged AS (
+    SELECT DISTINCT ON ({key}) {columns}
+    FROM {stage}
+    ORDER BY {key}
+), existing AS (
+    SELECT count(*) AS n FROM staged s JOIN {table} t USING ({key})
+), merged AS (
+    INSERT INTO {table} AS t ({columns})
+    SELECT {columns} FROM staged
+    ON CONFLICT ({key}) DO UPDATE SET {updates}
+    WHERE ({compare_existing}) IS DISTINCT FROM ({compare_new})
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM staged) - existing.n, (SELECT count(*) FROM merged)
+FROM existing
+"""
+
+# For tables without a unique key to conflict on: update matching rows whose
+# values changed, insert the rest.
+LOOKUP_MERGE_SQL = """
+WITH staged AS (
+    SELECT DISTINCT ON ({key}) {columns}
+    FROM {stage}
+    ORDER BY {key}
+), updated AS (
+    UPDATE {table} t SET {updates}
+    FROM staged s
+    WHERE {match}
+      AND ({compare_existing}) IS DISTINCT FROM ({compare_staged})
+    RETURNING 1
+), inserted AS (
+    INSERT INTO {table} ({columns})
+    SELECT {columns} FROM staged s
+    WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM inserted), (SELECT count(*) FROM inserted) + (SELECT count(*) FROM updated)
+"""
+
+
+def read_csv(path, table, user_id, source):
+    """Yield row tuples for table from a CSV whose header names its columns."""
+    columns = TARGETS[table][0]
+    with open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            values = {'user_id': user_id, 'source': source, **record}
+            if table == 'calorie_logs':
+                values['net_calories'] = -int(float(values['calories_burned']))
+            yield tuple(values.get(c) or None for c in columns)
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge_sql(table):
+    columns, updates = TARGETS[table]
+    key = KEYS.get(table, DEFAULT_KEY)
+    compared = [c for c in columns if c not in NOT_COMPARED]
+    params = {
+        'table': table, 'stage': f"stage_{table}", 'columns': ', '.join(columns), 'updates': updates,
+        'key': ', '.join(key), 'compare_existing': ', '.join(f"t.{c}" for c in compared),
+    }
+    if table in KEYS:
+        return LOOKUP_MERGE_SQL.format(
+            match=' AND '.join(f"t.{c} = s.{c}" for c in key),
+            compare_staged=', '.join(f"s.{c}" for c in compared), **params)
+    return MERGE_SQL.format(compare_new=', '.join(f"EXCLUDED.{c}" for c in compared), **params)
+
+
+def ingest(db, table, rows, batch_size=5000):
+    """
+    COPY rows into a staging table and merge them batch by batch.
+
+    Returns (inserted, updated, unchanged, seconds); unchanged rows matched an
+    existing day with identical values and were not rewritten.
+    """
+    columns = TARGETS[table][0]
+    db.execute(f'stage {table}', f"""
+        CREATE TEMP TABLE IF NOT EXISTS stage_{table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+    """)
+    sql = merge_sql(table)
+    inserted = updated = staged = 0
+    started = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        with db.conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY stage_{table} ({', '.join(columns)}) FROM STDIN",
+                               CopyStream(copy_line(row) for row in batch), size=65536)
+        new, written = db.query(f'merge {table}', sql)[0]
+        db.conn.commit()
+        staged += len(batch)
+        inserted += new
+        updated += written - new
+    return inserted, updated, staged - inserted - updated, time.perf_counter() - started
+
+
+def mark_synced(db, user_id, provider, tables):
+    data_types = sorted(tables)
+    updated = db.execute('device sync', """
+        UPDATE connected_devices SET last_sync_at = NOW(), sync_status = 'active', data_types = %s
+        WHERE user_id = %s AND provider = %s
+    """, (data_types, user_id, provider))
+    if not updated:
+        db.execute('device insert', """
+            INSERT INTO connected_devices (user_id, provider, last_sync_at, data_types)
+            VALUES (%s, %s, NOW(), %s)
+        """, (user_id, provider, data_types))
+    db.conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-ingest wearable history with COPY + ON CONFLICT')
+    parser.add_argument('--user', required=True, help='User id or email')
+    parser.add_argument('--provider', default='apple_health', help='connected_devices provider name')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--dry-run', action='store_true', help='Parse and count, write nothing')
+    sub = parser.add_subparsers(dest='format', required=True)
+    apple = sub.add_parser('apple-health', help='Apple Health export.xml')
+    apple.add_argument('path')
+    csv_parser = sub.add_parser('csv', help='Daily rows for one table')
+    csv_parser.add_argument('path')
+    csv_parser.add_argument('--table', required=True, choices=list(TARGETS))
+    args = parser.parse_args(argv)
+
+    try:
+        with session() as db:
+            user_id = resolve_user(db, args.user)
+            db.conn.commit()
+            started = time.perf_counter()
+            if args.format == 'apple-health':
+                print(f"Parsing {args.path}...")
+                totals = parse(args.path)
+                print(f"  parsed {totals.records:,} records in {time.perf_counter() - started:.1f}s")
+                sources = totals.rows(user_id, args.provider)
+            else:
+                sources = {args.table: read_csv(args.path, args.table, user_id, args.provider)}
+
+            if args.dry_run:
+                for table, rows in sources.items():
+                    print(f"  {table:<13} {sum(1 for _ in rows):>8} rows (dry run)")
+                return 0
+
+            total = 0
+            for table, rows in sources.items():
+                inserted, updated, unchanged, seconds = ingest(db, table, rows, args.batch_size)
+                count = inserted + updated + unchanged
+                total += count
+                rate = count / seconds if seconds else 0
+                print(f"  {table:<13} {inserted:>7} new {updated:>7} updated {unchanged:>7} unchanged  "
+                      f"{seconds:6.2f}s  {rate:>9,.0f} rows/s")
+            mark_synced(db, user_id, args.provider, sources)
+            elapsed = time.perf_counter() - started
+            print(f"[SUCCESS] Ingested {total} rows in {elapsed:.1f}s")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import asyncio
 import time
 from playwright.async_api import async_playwright
+from har_replay import attach_async
 
 async def capture_screenshots():
     async with async_playwright() as p:
@@ -14,6 +15,7 @@ async def capture_screenshots():
             has_touch=True,
         )
 
+        await attach_async(context)  # HAR record/replay when HAR_MODE is set (see har_replay.py)
         page = await context.new_page()
 
         try:
@@ -1,5 +1,7 @@
 import asyncio
 from playwright.async_api import async_playwright
+from har_replay import attach_async
+from layout_assertions import check, collect_async, print_report
 
 async def capture_screenshots():
     async with async_playwright() as p:
@@ -13,6 +15,7 @@ async def capture_screenshots():
             has_touch=True,
         )
 
+        await attach_async(context)  # HAR record/replay when HAR_MODE is set (see har_replay.py)
         page = await context.new_page()
 
         try:
@@ -30,6 +33,10 @@ async def capture_screenshots():
                 await skip_button.click()
                 await page.wait_for_timeout(3000)
 
+            # Numeric clipping/overlap check before spending time on screenshots
+            snapshot = await collect_async(page)
+            print_report(snapshot, check(snapshot))
+
             # Scroll specifically to show macro cards
             print("Scrolling to macro cards (attempt 1)...")
             await page.evaluate('window.scrollTo(0, 550)')
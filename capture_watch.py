@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watch mode: re-run only the captures affected by a UI change
+
+Polls app/, components/, theme/ and constants/ for changed files. Each
+change is mapped to the capture steps in capture_manifest.json that depend
+on it, and only those steps run, against a browser and page kept warm
+between runs.
+
+How a file maps to steps: each step lists the source files it exercises,
+for example DailyFatLossCard.tsx for the fat-loss card capture. The
+watcher builds the import graph of the watched directories from relative
+import / export ... from / require() statements. A change to a file then
+affects every step whose sources import it, directly or transitively. So
+an edit to GlassCard.tsx reruns every card that renders a GlassCard, while
+constants/Theme.ts reruns everything.
+
+Steps come in two kinds:
+- action steps run in-process on the warm page: fit, click, scroll, wait,
+  layout (layout_assertions gate), screenshot, sweep (scroll_capture)
+  A step whose component isn't on the page stops there with one problem
+  instead of waiting out Playwright's click timeout
+- script steps (--scripts) run an existing capture/diagnostic script in a
+  subprocess, which starts its own cold browser
+
+Before each batch the page is reloaded so Metro's rebuilt bundle is used.
+Under HAR_MODE=replay no network is touched. Each batch is recorded as a
+'watch' run in run_history.sqlite, with screenshot hashes per step.
+
+Usage:
+    python capture_watch.py                       # watch, run affected steps
+    python capture_watch.py --all                 # run everything once, then watch
+    python capture_watch.py --once components/GlassCard.tsx
+    python capture_watch.py --once $(git diff --name-only)
+    python capture_watch.py explain components/GlassCard.tsx
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+MANIFEST = 'capture_manifest.json'
+SOURCE_EXTENSIONS = ('.tsx', '.ts', '.jsx', '.js')
+SKIPPED_DIRS = {'__tests__', 'node_modules', '.expo'}
+POLL_SECONDS = 0.5
+DEBOUNCE_SECONDS = 0.4
+
+IMPORT_RE = re.compile(r"""(?:\bfrom\s*|\brequire\(\s*|\bimport\s*\(\s*|^\s*import\s+)['"](\.{1,2}/[^'"]+)['"]""",
+                       re.MULTILINE)
+
+
+def load_manifest(path=MANIFEST):
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    names = [step['name'] for step in manifest['steps']]
+    duplicates = {n for n in names if names.count(n) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate step names in {path}: {', '.join(sorted(duplicates))}")
+    return manifest
+
+
+def _norm(path):
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def scan(roots):
+    """path -> mtime for every source file under roots."""
+    mtimes = {}
+    stack = [r for r in roots if os.path.isdir(r)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIPPED_DIRS:
+                        stack.append(entry.path)
+                elif entry.name.endswith(SOURCE_EXTENSIONS):
+                    mtimes[_norm(entry.path)] = entry.stat().st_mtime_ns
+    return mtimes
+
+
+def resolve(importer, spec, files):
+    """Source file a relative import points at, or None if it's outside the watched tree."""
+    base = _norm(os.path.join(os.path.dirname(importer), spec))
+    for candidate in [base] + [base + ext for ext in SOURCE_EXTENSIONS] + \
+            [f"{base}/index{ext}" for ext in SOURCE_EXTENSIONS]:
+        if candidate in files:
+            return candidate
+    return None
+
+
+_specs_cache = {}
+
+
+def _import_specs(path, mtime):
+    """Relative import specifiers in a file, cached by mtime so rescans only re-read edited files."""
+    key = (path, mtime)
+    if key not in _specs_cache:
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                _specs_cache[key] = IMPORT_RE.findall(f.read())
+        except OSError:
+            _specs_cache[key] = []
+    return _specs_cache[key]
+
+
+def build_importers(files):
+    """imported file -> set of files importing it (direct edges only). files maps path -> mtime."""
+    importers = defaultdict(set)
+    for path, mtime in files.items():
+        for spec in _import_specs(path, mtime):
+            target = resolve(path, spec, files)
+            if target:
+                importers[target].add(path)
+    return importers
+
+
+def dependents(changed, importers):
+    """changed files plus everything that imports them, transitively."""
+    seen = set(changed)
+    stack = list(changed)
+    while stack:
+        for parent in importers.get(stack.pop(), ()):
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return seen
+
+
+def affected_steps(manifest, changed, importers, scripts=False):
+    """Steps (in manifest order) whose sources are touched by changed files."""
+    touched = dependents({_norm(c) for c in changed}, importers)
+    steps = []
+    for step in manifest['steps']:
+        if step.get('script') and not scripts:
+            continue
+        if touched & {_norm(s) for s in step['sources']}:
+            steps.append(step)
+    return steps
+
+
+async def run_actions(page, step, output_dir):
+    """Run an action step on the warm page; returns a list of problems."""
+    from layout_assertions import DEFAULT_RULES, check, collect_async, locate
+    from scroll_capture import sweep_capture
+
+    problems = []
+    for action in step['actions']:
+        kind, value = next(iter(action.items()))
+        target = value[0] if kind == 'fit' else value if kind == 'click' else action.get('component')
+        if target and not await locate(page, target).count():
+            problems.append(f"{target} is not on the page; rest of step skipped")
+            break
+        if kind == 'fit':
+            await locate(page, value[0]).evaluate("el => el.scrollIntoView({block: 'start'})")
+            await page.wait_for_timeout(100)
+        elif kind == 'click':
+            await locate(page, value).click()
+            await page.wait_for_timeout(400)  # expand/collapse animation
+        elif kind == 'scroll':
+            await page.mouse.wheel(0, value)
+            await page.wait_for_timeout(200)
+        elif kind == 'wait':
+            await page.wait_for_timeout(value)
+        elif kind == 'layout':
+            rules = [r for r in DEFAULT_RULES if not value or r[1] in value]
+            problems += check(await collect_async(page), rules)
+        elif kind == 'screenshot':
+            path = os.path.join(output_dir, value)
+            if action.get('component'):
+                await locate(page, action['component']).screenshot(path=path, animations='disabled')
+            else:
+                await page.screenshot(path=path, animations='disabled')
+        elif kind == 'sweep':
+            from PIL import Image
+
+            Image.fromarray(await sweep_capture(page)).save(os.path.join(output_dir, value))
+        else:
+            raise ValueError(f"{step['name']}: unknown action {kind!r}")
+    return problems
+
+
+def step_outputs(step, output_dir):
+    """Image files an action step writes."""
+    return [os.path.join(output_dir, value) for action in step.get('actions', ())
+            for kind, value in action.items() if kind in ('screenshot', 'sweep')]
+
+
+async def run_steps(page, steps, manifest, reload=True):
+    from run_history import record_run
+
+    os.makedirs(manifest['output_dir'], exist_ok=True)
+    started = time.perf_counter()
+    failed = 0
+    with record_run('watch', meta={'steps': [step['name'] for step in steps]}) as run:
+        if reload and any('actions' in step for step in steps):
+            await page.reload(wait_until='networkidle')
+            print(f"  reload                       {time.perf_counter() - started:6.2f}s")
+            run.mark('reload')
+        for step in steps:
+            step_started = time.perf_counter()
+            try:
+                if step.get('script'):
+                    code = await asyncio.to_thread(subprocess.call, [sys.executable, step['script']],
+                                                   stdout=subprocess.DEVNULL)
+                    problems = [f"exited with {code}"] if code else []
+                else:
+                    await page.evaluate('window.scrollTo(0, 0)')
+                    problems = await run_actions(page, step, manifest['output_dir'])
+            except Exception as e:
+                problems = [str(e).splitlines()[0]]
+            failed += bool(problems)
+            mark = '✗' if problems else '✓'
+            print(f"  {mark} {step['name']:<26} {time.perf_counter() - step_started:6.2f}s")
+            for problem in problems:
+                print(f"      {problem}")
+            run.record(step['name'], not problems, (time.perf_counter() - step_started) * 1000,
+                       detail='; '.join(problems) or None,
+                       artifacts=[path for path in step_outputs(step, manifest['output_dir']) if os.path.exists(path)])
+    total = time.perf_counter() - started
+    if failed:
+        print(f"[WARNING] {failed} of {len(steps)} steps reported problems ({total:.1f}s)")
+    else:
+        print(f"[SUCCESS] {len(steps)} steps in {total:.1f}s")
+    return failed
+
+
+async def open_page(manifest):
+    from playwright.async_api import async_playwright
+    from har_replay import attach_async
+
+    p = await async_playwright().start()
+    browser = await p.chromium.launch()
+    context = await browser.new_context(viewport=manifest['viewport'],
+                                        device_scale_factor=manifest.get('device_scale_factor', 1),
+                                        is_mobile=True, has_touch=True)
+    await attach_async(context, scenario='capture_watch')
+    page = await context.new_page()
+    await page.goto(manifest['url'], wait_until='networkidle', timeout=60000)
+    skip = await page.query_selector('text=Skip')
+    if skip:
+        await skip.click()
+        await page.wait_for_load_state('networkidle')
+    return p, browser, page
+
+
+async def watch(manifest, args):
+    roots = manifest['watch']
+    mtimes = scan(roots)
+    importers = build_importers(mtimes)
+    started = time.perf_counter()
+    p, browser, page = await open_page(manifest)
+    print(f"Warm browser ready in {time.perf_counter() - started:.1f}s; "
+          f"{len(mtimes)} files, {sum(map(len, importers.values()))} imports in {', '.join(roots)}")
+    try:
+        if args.once is not None:
+            steps = affected_steps(manifest, args.once, importers, args.scripts)
+            if not steps:
+                print("No steps depend on those files")
+                return 0
+            return 1 if await run_steps(page, steps, manifest, reload=False) else 0
+        if args.all:
+            await run_steps(page, [s for s in manifest['steps'] if args.scripts or not s.get('script')],
+                            manifest, reload=False)
+
+        print(f"\nWatching {', '.join(roots)} (Ctrl+C to stop)...")
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            current = scan(roots)
+            changed = {path for path in current.keys() | mtimes.keys() if current.get(path) != mtimes.get(path)}
+            if not changed:
+                continue
+            # Let editors finish multi-file saves before reacting
+            while True:
+                await asyncio.sleep(DEBOUNCE_SECONDS)
+                latest = scan(roots)
+                more = {path for path in latest.keys() | current.keys() if latest.get(path) != current.get(path)}
+                current = latest
+                if not more:
+                    break
+                changed |= more
+            mtimes = current
+            importers = build_importers(mtimes)
+            steps = affected_steps(manifest, changed, importers, args.scripts)
+            names = ', '.join(sorted(os.path.basename(c) for c in changed)[:5])
+            print(f"\n{time.strftime('%H:%M:%S')} changed: {names}{' ...' if len(changed) > 5 else ''}")
+            if steps:
+                await run_steps(page, steps, manifest, reload=not args.no_reload)
+            else:
+                print("  no capture steps depend on this change")
+    finally:
+        await browser.close()
+        await p.stop()
+
+
+def explain(manifest, files, scripts):
+    importers = build_importers(scan(manifest['watch']))
+    for path in files:
+        touched = dependents({_norm(path)}, importers)
+        steps = affected_steps(manifest, [path], importers, scripts=True)
+        print(f"{path}: imported (transitively) by {len(touched) - 1} files")
+        for step in steps:
+            via = sorted(touched & {_norm(s) for s in step['sources']})
+            kind = 'script' if step.get('script') else 'warm'
+            skipped = '' if scripts or kind == 'warm' else ' (needs --scripts)'
+            print(f"  -> {step['name']:<26} [{kind}] via {', '.join(via)}{skipped}")
+        if not steps:
+            print("  -> no capture steps")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-run only the captures affected by changed UI files')
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--all', action='store_true', help='Run every step once before watching')
+    parser.add_argument('--once', nargs='*', metavar='FILE', help='Run the steps affected by these files and exit')
+    parser.add_argument('--scripts', action='store_true', help='Include script steps (cold browser, slow)')
+    parser.add_argument('--no-reload', action='store_true', help='Rely on Fast Refresh instead of reloading')
+    sub = parser.add_subparsers(dest='command')
+    explain_parser = sub.add_parser('explain', help='Show which steps a file change would run')
+    explain_parser.add_argument('files', nargs='+')
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = load_manifest(args.manifest)
+        if args.command == 'explain':
+            explain(manifest, args.files, args.scripts)
+            return 0
+        return asyncio.run(watch(manifest, args)) or 0
+    except KeyboardInterrupt:
+        print("\nStopped")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
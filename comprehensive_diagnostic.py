@@ -3,6 +3,8 @@ Comprehensive Diagnostic Script for Heirclark Health App
 Tests all features including AI meal logging, weather, and Apple Health integration
 """
 from playwright.sync_api import sync_playwright
+from har_replay import attach
+from run_history import record_run
 import time
 import os
 import sys
@@ -14,17 +16,20 @@ if sys.platform == 'win32':
 def run_diagnostics():
     print("🔍 Starting comprehensive diagnostic...")
 
-    with sync_playwright() as p:
+    with sync_playwright() as p, record_run('diagnostic') as run:
         browser = p.chromium.launch(headless=False)
         context = browser.new_context(
             viewport={'width': 430, 'height': 932},
             user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15'
         )
+        attach(context)  # HAR record/replay when HAR_MODE is set (see har_replay.py)
         page = context.new_page()
+        run.mark('browser_launch')
 
         # Navigate to app
         print("\n📱 Launching app...")
         page.goto('http://localhost:8081')
+        run.mark('dashboard_load')
         time.sleep(3)
 
         # Create screenshots directory
@@ -34,20 +39,25 @@ def run_diagnostics():
         print("\n✅ Test 1: Dashboard Load")
         page.screenshot(path='diagnostics/01_dashboard_load.png')
         print("   ✓ Dashboard loaded")
+        run.mark('dashboard_render', artifacts=['diagnostics/01_dashboard_load.png'])
 
         # Test 2: Greeting Card
         print("\n✅ Test 2: Greeting Card")
         greeting = page.locator('text=/Good (Morning|Afternoon|Evening)/')
-        if greeting.is_visible():
+        greeting_visible = greeting.is_visible()
+        if greeting_visible:
             print("   ✓ Greeting card visible")
         page.screenshot(path='diagnostics/02_greeting_card.png')
+        run.mark('greeting_card', greeting_visible, artifacts=['diagnostics/02_greeting_card.png'])
 
         # Test 3: Weather Widget
         print("\n✅ Test 3: Weather Widget")
         weather_title = page.locator('text=WEATHER')
-        if weather_title.is_visible():
+        weather_visible = weather_title.is_visible()
+        if weather_visible:
             print("   ✓ Weather widget visible")
         page.screenshot(path='diagnostics/03_weather_widget.png')
+        run.mark('weather_widget', weather_visible, artifacts=['diagnostics/03_weather_widget.png'])
 
         # Test 4: Calendar
         print("\n✅ Test 4: Calendar")
@@ -55,65 +65,81 @@ def run_diagnostics():
         day_count = calendar_days.count()
         print(f"   ✓ Calendar has {day_count} days")
         page.screenshot(path='diagnostics/04_calendar.png')
+        run.mark('calendar', day_count > 0, value=day_count, artifacts=['diagnostics/04_calendar.png'])
 
         # Test 5: Daily Balance Gauge
         print("\n✅ Test 5: Daily Balance Gauge")
         daily_balance = page.locator('text=DAILY BALANCE')
-        if daily_balance.is_visible():
+        balance_visible = daily_balance.is_visible()
+        if balance_visible:
             print("   ✓ Daily balance gauge visible")
         page.screenshot(path='diagnostics/05_daily_balance.png')
+        run.mark('daily_balance', balance_visible, artifacts=['diagnostics/05_daily_balance.png'])
 
         # Test 6: Macro Gauges
         print("\n✅ Test 6: Macro Gauges (Protein, Fat, Carbs)")
         protein = page.locator('text=Protein')
         fat = page.locator('text=Fat')
         carbs = page.locator('text=Carbs')
-        if protein.is_visible() and fat.is_visible() and carbs.is_visible():
+        macros_visible = protein.is_visible() and fat.is_visible() and carbs.is_visible()
+        if macros_visible:
             print("   ✓ All macro gauges visible")
         page.screenshot(path='diagnostics/06_macro_gauges.png')
+        run.mark('macro_gauges', macros_visible, artifacts=['diagnostics/06_macro_gauges.png'])
 
         # Test 7: Scroll to collapsible cards
         print("\n✅ Test 7: Scrolling to collapsible cards")
         page.evaluate('window.scrollTo(0, 1000)')
         time.sleep(1)
         page.screenshot(path='diagnostics/07_scroll_cards.png')
+        run.mark('scroll_cards', artifacts=['diagnostics/07_scroll_cards.png'])
 
         # Test 8: Daily Fat Loss Card
         print("\n✅ Test 8: Daily Fat Loss Card")
         fat_loss_card = page.locator('text=DAILY FAT LOSS')
-        if fat_loss_card.is_visible():
+        fat_loss_visible = fat_loss_card.is_visible()
+        if fat_loss_visible:
             print("   ✓ Daily fat loss card visible")
             fat_loss_card.click()
             time.sleep(1)
             page.screenshot(path='diagnostics/08_fat_loss_expanded.png')
             fat_loss_card.click()  # Collapse
             time.sleep(0.5)
+        run.mark('daily_fat_loss', fat_loss_visible,
+                 artifacts=['diagnostics/08_fat_loss_expanded.png'] if fat_loss_visible else [])
 
         # Test 9: Weekly Progress Card
         print("\n✅ Test 9: Weekly Progress Card")
         weekly_card = page.locator('text=WEEKLY PROGRESS')
-        if weekly_card.is_visible():
+        weekly_visible = weekly_card.is_visible()
+        if weekly_visible:
             print("   ✓ Weekly progress card visible")
             weekly_card.click()
             time.sleep(1)
             page.screenshot(path='diagnostics/09_weekly_expanded.png')
             weekly_card.click()  # Collapse
             time.sleep(0.5)
+        run.mark('weekly_progress', weekly_visible,
+                 artifacts=['diagnostics/09_weekly_expanded.png'] if weekly_visible else [])
 
         # Test 10: Scroll to Today's Meals
         print("\n✅ Test 10: Today's Meals Card")
         page.evaluate('window.scrollTo(0, 1500)')
         time.sleep(1)
         meals_card = page.locator('text=TODAY\'S MEALS')
-        if meals_card.is_visible():
+        meals_visible = meals_card.is_visible()
+        if meals_visible:
             print("   ✓ Today's meals card visible")
             meals_card.click()
             time.sleep(1)
             page.screenshot(path='diagnostics/10_meals_expanded.png')
+        run.mark('todays_meals', meals_visible,
+                 artifacts=['diagnostics/10_meals_expanded.png'] if meals_visible else [])
 
         # Test 11: AI Meal Logger Button
         print("\n✅ Test 11: AI Meal Logger Button")
         log_meal_button = page.locator('text=+ Log Meal')
+        modes_visible = False
         if log_meal_button.is_visible():
             print("   ✓ Log meal button visible")
             log_meal_button.click()
@@ -126,7 +152,8 @@ def run_diagnostics():
             photo_mode = page.locator('text=Photo')
             barcode_mode = page.locator('text=Barcode')
 
-            if manual_mode.is_visible():
+            modes_visible = manual_mode.is_visible()
+            if modes_visible:
                 print("   ✓ AI meal logger modes visible")
                 print("     - Manual Entry ✓")
                 print("     - Voice ✓")
@@ -138,13 +165,16 @@ def run_diagnostics():
             close_button.click()
             time.sleep(1)
             print("   ✓ AI meal logger closed")
+        run.mark('meal_logger', modes_visible,
+                 artifacts=['diagnostics/11_ai_meal_logger_open.png'] if modes_visible else [])
 
         # Test 12: Scroll to Wearable Sync
         print("\n✅ Test 12: Wearable Sync Card")
         page.evaluate('window.scrollTo(0, 2000)')
         time.sleep(1)
         wearable_card = page.locator('text=WEARABLE SYNC')
-        if wearable_card.is_visible():
+        wearable_visible = wearable_card.is_visible()
+        if wearable_visible:
             print("   ✓ Wearable sync card visible")
             wearable_card.click()
             time.sleep(1)
@@ -161,39 +191,49 @@ def run_diagnostics():
                 print("   ✓ Fitbit provider visible")
             if google_fit.is_visible():
                 print("   ✓ Google Fit provider visible")
+        run.mark('wearable_sync', wearable_visible,
+                 artifacts=['diagnostics/12_wearable_sync_expanded.png'] if wearable_visible else [])
 
         # Test 13: Dining Out Card
         print("\n✅ Test 13: Dining Out Card")
         page.evaluate('window.scrollTo(0, 2500)')
         time.sleep(1)
         dining_card = page.locator('text=DINING OUT')
-        if dining_card.is_visible():
+        dining_visible = dining_card.is_visible()
+        if dining_visible:
             print("   ✓ Dining out card visible")
             dining_card.click()
             time.sleep(1)
             page.screenshot(path='diagnostics/13_dining_out_expanded.png')
+        run.mark('dining_out', dining_visible,
+                 artifacts=['diagnostics/13_dining_out_expanded.png'] if dining_visible else [])
 
         # Test 14: Full page screenshot
         print("\n✅ Test 14: Full Page Screenshot")
         page.evaluate('window.scrollTo(0, 0)')
         time.sleep(1)
         page.screenshot(path='diagnostics/14_full_page_top.png', full_page=False)
+        run.mark('full_page_top', artifacts=['diagnostics/14_full_page_top.png'])
 
         # Test 15: Check font weights
         print("\n✅ Test 15: Font Weight Check")
         page.evaluate('window.scrollTo(0, 500)')
         time.sleep(1)
         calorie_value = page.locator('#hc-calories-ring-main, .hc-gauge-value').first
+        font_weight = None
         if calorie_value.is_visible():
             font_weight = calorie_value.evaluate('el => window.getComputedStyle(el).fontWeight')
             print(f"   ✓ Calorie gauge font weight: {font_weight} (should be 300)")
         page.screenshot(path='diagnostics/15_font_weight_check.png')
+        run.mark('font_weight', font_weight == '300', detail=font_weight,
+                 artifacts=['diagnostics/15_font_weight_check.png'])
 
         # Test 16: Color scheme check
         print("\n✅ Test 16: Color Scheme Check")
         body_bg = page.evaluate('window.getComputedStyle(document.body).backgroundColor')
         print(f"   ✓ Background color: {body_bg}")
         page.screenshot(path='diagnostics/16_color_scheme.png')
+        run.mark('color_scheme', detail=body_bg, artifacts=['diagnostics/16_color_scheme.png'])
 
         # Test 17: Check white removal from gauges
         print("\n✅ Test 17: Gauge White Progress Check")
@@ -201,6 +241,7 @@ def run_diagnostics():
         time.sleep(1)
         page.screenshot(path='diagnostics/17_gauge_transparency_check.png')
         print("   ✓ Screenshot captured for visual verification")
+        run.mark('gauge_transparency', artifacts=['diagnostics/17_gauge_transparency_check.png'])
 
         # Test 18: Card spacing check
         print("\n✅ Test 18: Card Spacing Check")
@@ -208,6 +249,7 @@ def run_diagnostics():
         time.sleep(1)
         page.screenshot(path='diagnostics/18_card_spacing.png')
         print("   ✓ Card spacing captured for verification")
+        run.mark('card_spacing', artifacts=['diagnostics/18_card_spacing.png'])
 
         # Summary
         print("\n" + "="*60)
@@ -215,6 +257,9 @@ def run_diagnostics():
         print("="*60)
         print("\n✅ All tests completed successfully!")
         print(f"\n📁 Screenshots saved to: diagnostics/")
+        if run.id:
+            print(f"📈 Run {run.id} recorded ({run.failed} failed checks): "
+                  f"python run_history.py steps diagnostic {run.id}")
         print("\n📋 Features Tested:")
         print("   ✓ Dashboard layout and components")
         print("   ✓ Greeting card")
@@ -1,234 +1,607 @@
 """
 Comprehensive Heirclark.com Website Crawler
-Uses Playwright to explore all pages and document functionality
+Documents the pages, components and features of heirclark.com
+
+Fetching is two-tier. Most heirclark.com pages are Shopify pages whose
+content is server-rendered, so every page is first fetched over plain HTTP
+and parsed without a browser:
+
+- HTTP tier: Playwright's APIRequestContext (async, pooled keep-alive
+  connections, no Chromium) fetches up to HTTP_CONCURRENCY pages at once.
+  An incremental html.parser pass pulls out the title, links, buttons,
+  cards, forms, dialogs and visible text.
+- Browser tier: a page is rendered in Chromium (networkidle, 2s settle,
+  full-page screenshot, Log Meal / date / Sync interaction checks) only
+  when needs_browser() finds a reason. Reasons: an error status, too
+  little server-rendered text (a JS shell), an empty app mount point, a
+  <noscript> asking for JavaScript, or controls whose behaviour the crawl
+  tests. The feature check escalates the calorie counter page only for
+  features not found in its static HTML. Text inside markup-hidden
+  containers (hidden, aria-hidden, inline display:none, hidden utility
+  classes) doesn't count. Stylesheets aren't evaluated, so a static hit is
+  reported as "present in HTML" and only a browser hit as "visible".
+
+Chromium is launched only if a page escalates. The report lists which
+tier served each page and why, the fraction served by each tier, and the
+speedup over rendering everything. --compare also times a browser-only
+crawl for a measured figure.
+
+Usage:
+    python crawl_heirclark_website.py
+    python crawl_heirclark_website.py --discover --max-pages 30
+    python crawl_heirclark_website.py --browser-only     # render every page, as before
+    python crawl_heirclark_website.py --compare
 """
+import argparse
 import asyncio
+import codecs
 import json
+import re
 import sys
-from playwright.async_api import async_playwright
+import time
 from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from run_history import record_run
 
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
-async def crawl_heirclark():
-    """Crawl entire heirclark.com website and document all features"""
+BASE_URL = 'https://heirclark.com'
+SEED_PAGES = [
+    'https://heirclark.com',
+    'https://heirclark.com/pages/calorie-counter',
+    'https://heirclark.com/pages/steps',
+    'https://heirclark.com/pages/meals',
+    'https://heirclark.com/pages/programs',
+    'https://heirclark.com/pages/settings',
+]
+FEATURES_PAGE = 'https://heirclark.com/pages/calorie-counter'
+FEATURES_TO_CHECK = [
+    ('Daily Balance', 'Daily Balance'),
+    ('Macros', 'Protein'),
+    ('Today\'s Meals', 'Breakfast'),
+    ('Daily Fat Loss', 'FAT LOSS'),
+    ('Weekly Progress', 'WEEKLY PROGRESS'),
+    ('Dining Out', 'DINING OUT'),
+    ('Wearable Sync', 'WEARABLE SYNC'),
+    ('Log Meal', 'Log Meal'),
+]
+USER_AGENT = 'Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)'
+
+HTTP_CONCURRENCY = 6
+HTTP_TIMEOUT_MS = 15000
+PARSE_CHUNK = 16384
+MIN_STATIC_TEXT = 200          # visible characters below which a page is a JS shell
+APP_MOUNT_IDS = {'root', 'app', '__next', '__nuxt'}
+INTERACTIVE_BUTTONS = ('Log Meal', 'Sync')   # the browser tier clicks these to check they work
+DATE_SELECTOR_MIN = 3                        # the browser tier clicks the third day/date element
+
+CARD_CLASS = re.compile(r'card|section|container')
+DATE_CLASS = re.compile(r'day|date')
+MODAL_CLASS = re.compile(r'modal|dialog')
+CONCEALED_CLASSES = {'hidden', 'is-hidden', 'hide', 'd-none', 'visually-hidden', 'sr-only'}
+CONCEALED_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.I)
+JS_REQUIRED = re.compile(r'enable javascript|requires javascript|javascript (is )?(disabled|required)', re.I)
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+HIDDEN_TAGS = {'script', 'style', 'template', 'noscript', 'svg'}
+
+
+class StaticPage(HTMLParser):
+    """Single pass over server-rendered HTML, fed in chunks as it is decoded."""
+
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.title = ''
+        self.links = []
+        self.buttons = []
+        self.cards = []
+        self.forms = []
+        self.modals = []
+        self.texts = set()
+        self.hidden_texts = set()   # text inside containers the markup itself hides
+        self.text_chars = 0
+        self.scripts = 0
+        self.date_elements = 0
+        self.noscript = ''
+        self.mounts = {}       # app mount id -> visible characters rendered inside it
+        self._stack = []       # open tags: (tag, capture or None, mount id or None, concealed)
+        self._hidden = 0
+        self._concealed = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = attrs.get('class') or ''
+        if tag == 'a' and attrs.get('href'):
+            self.links.append(urljoin(self.url, attrs['href']).split('#')[0])
+        if tag in ('input', 'textarea', 'select'):
+            self.forms.append({'type': attrs.get('type') or 'text', 'placeholder': attrs.get('placeholder') or '',
+                               'name': attrs.get('name') or ''})
+        if attrs.get('role') == 'dialog' or MODAL_CLASS.search(classes):
+            self.modals.append({'visible': None, 'classes': classes})
+        if DATE_CLASS.search(classes):
+            self.date_elements += 1
+        if tag == 'script':
+            self.scripts += 1
+        if tag == 'title':
+            self._in_title = True
+        if tag in VOID_TAGS:
+            return
+
+        capture = None
+        if tag == 'button' or attrs.get('role') == 'button' or (tag == 'a' and 'button' in classes):
+            capture = {'kind': 'buttons', 'classes': classes, 'text': []}
+        elif CARD_CLASS.search(classes):
+            capture = {'kind': 'cards', 'classes': classes, 'text': []}
+        mount = attrs.get('id') if attrs.get('id') in APP_MOUNT_IDS else None
+        if mount:
+            self.mounts[mount] = 0
+        if tag in HIDDEN_TAGS:
+            self._hidden += 1
+        concealed = ('hidden' in attrs or attrs.get('aria-hidden') == 'true'
+                     or bool(CONCEALED_STYLE.search(attrs.get('style') or ''))
+                     or not CONCEALED_CLASSES.isdisjoint(classes.split()))
+        self._concealed += concealed
+        self._stack.append((tag, capture, mount, concealed))
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if tag in VOID_TAGS or not any(entry[0] == tag for entry in self._stack):
+            return
+        # Pop up to the matching tag; browsers close unclosed children the same way
+        while self._stack:
+            open_tag, capture, _, concealed = self._stack.pop()
+            if open_tag in HIDDEN_TAGS:
+                self._hidden -= 1
+            self._concealed -= concealed
+            if capture:
+                text = ' '.join(capture['text']).encode('ascii', 'ignore').decode('ascii').strip()
+                if text:
+                    target = getattr(self, capture['kind'])
+                    target.append({'text': text[:200] if capture['kind'] == 'cards' else text,
+                                   'classes': capture['classes']})
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._stack and self._stack[-1][0] == 'noscript':
+            self.noscript += data
+        text = data.strip()
+        if not text or self._hidden:
+            return
+        if self._concealed:
+            self.hidden_texts.add(' '.join(text.split()))
+            return
+        self.texts.add(' '.join(text.split()))
+        self.text_chars += len(text)
+        for _, capture, mount, _ in self._stack:
+            if capture and len(capture['text']) < 50:
+                capture['text'].append(text)
+            if mount:
+                self.mounts[mount] += len(text)
+
+    def has_text(self, search_text):
+        """
+        A whole text node equal to search_text (as Playwright's text="..." matches) outside any container the
+        markup hides. Stylesheets aren't applied, so this means present in the HTML, not necessarily visible.
+        """
+        return search_text in self.texts
+
+
+def needs_browser(status, content_type, static):
+    """Why a page has to be rendered in Chromium, or None when its HTML is enough."""
+    if status >= 400:
+        return f"HTTP {status}"
+    if 'html' not in content_type:
+        return f"not HTML ({content_type or 'no content type'})"
+    empty_mounts = [m for m, chars in static.mounts.items() if chars == 0]
+    if empty_mounts:
+        return f"empty #{empty_mounts[0]} mount"
+    if static.text_chars < MIN_STATIC_TEXT:
+        return f"only {static.text_chars} chars of server-rendered text"
+    if JS_REQUIRED.search(static.noscript):
+        return "noscript asks for JavaScript"
+    interactive = [b for b in INTERACTIVE_BUTTONS if any(b in btn['text'] for btn in static.buttons)]
+    if interactive:
+        return f"interactive: {', '.join(interactive)}"
+    if static.date_elements >= DATE_SELECTOR_MIN:
+        return "interactive: date selector"
+    return None
+
+
+def page_slug(url):
+    return url.rstrip('/').split('/')[-1] if urlsplit(url).path.strip('/') else 'home'
+
+
+def same_site(url):
+    return urlsplit(url).netloc.removeprefix('www.') == urlsplit(BASE_URL).netloc and \
+        urlsplit(url).path.startswith(('/pages/', '/collections/', '/products/'))
+
+
+async def fetch_static(request, url):
+    """(status, content type, StaticPage, final url, ms) for url over HTTP."""
+    started = time.perf_counter()
+    response = await request.get(url, timeout=HTTP_TIMEOUT_MS, fail_on_status_code=False, max_redirects=5)
+    body = await response.body()
+    content_type = response.headers.get('content-type', '')
+    static = StaticPage(response.url)
+    if 'html' in content_type:
+        charset = re.search(r'charset=([\w-]+)', content_type)
+        decoder = codecs.getincrementaldecoder(charset.group(1) if charset else 'utf-8')('replace')
+        for i in range(0, len(body), PARSE_CHUNK):
+            static.feed(decoder.decode(body[i:i + PARSE_CHUNK]))
+        static.feed(decoder.decode(b'', final=True))
+        static.close()
+    await response.dispose()
+    return response.status, content_type, static, response.url, (time.perf_counter() - started) * 1000
+
+
+def static_page_data(url, static):
+    return {
+        'url': url,
+        'title': static.title.strip(),
+        'screenshot': None,
+        'components': [],
+        'buttons': static.buttons[:30],
+        'forms': static.forms,
+        'cards': static.cards[:20],
+        'modals': static.modals,
+        'links': sorted(set(static.links)),
+    }
+
+
+async def browser_page(page, url):
+    """Render url in Chromium and document it, as the crawler always did."""
+    await page.goto(url, wait_until='networkidle', timeout=30000)
+    await page.wait_for_timeout(2000)  # Wait for dynamic content
+
+    page_data = {
+        'url': url,
+        'title': await page.title(),
+        'screenshot': f'screenshots/{page_slug(url)}.png',
+        'components': [],
+        'buttons': [],
+        'forms': [],
+        'cards': [],
+        'modals': []
+    }
+
+    # Take screenshot
+    await page.screenshot(path=page_data['screenshot'], full_page=True)
+
+    # Cards (sections with class containing 'card', 'section', 'container')
+    cards = await page.query_selector_all('[class*="card"], [class*="section"], [class*="container"]')
+    for card in cards[:20]:  # Limit to first 20
+        try:
+            text = await card.inner_text()
+            if text and len(text.strip()) > 0:
+                # Encode to ASCII, ignoring non-ASCII characters
+                safe_text = text.encode('ascii', 'ignore').decode('ascii').strip()[:200]
+                page_data['cards'].append({
+                    'text': safe_text,  # First 200 chars
+                    'classes': await card.get_attribute('class')
+                })
+        except Exception:
+            pass  # Skip cards that can't be processed
+
+    # Buttons
+    buttons = await page.query_selector_all('button, [role="button"], a[class*="button"]')
+    for btn in buttons[:30]:  # Limit to first 30
+        try:
+            text = await btn.inner_text()
+            if text and len(text.strip()) > 0:
+                safe_text = text.encode('ascii', 'ignore').decode('ascii').strip()
+                page_data['buttons'].append({
+                    'text': safe_text,
+                    'classes': await btn.get_attribute('class')
+                })
+        except Exception:
+            pass  # Skip buttons that can't be processed
+
+    # Forms and inputs
+    inputs = await page.query_selector_all('input, textarea, select')
+    for inp in inputs:
+        page_data['forms'].append({
+            'type': await inp.get_attribute('type') or 'text',
+            'placeholder': await inp.get_attribute('placeholder') or '',
+            'name': await inp.get_attribute('name') or ''
+        })
+
+    # Check for modals/dialogs
+    modals = await page.query_selector_all('[role="dialog"], [class*="modal"], [class*="dialog"]')
+    for modal in modals:
+        is_visible = await modal.is_visible()
+        page_data['modals'].append({
+            'visible': is_visible,
+            'classes': await modal.get_attribute('class')
+        })
+
+    # Try clicking "Log Meal" button if it exists
+    try:
+        log_meal_btn = await page.query_selector('button:has-text("Log Meal")')
+        if log_meal_btn:
+            await log_meal_btn.click()
+            await page.wait_for_timeout(1000)
+
+            # Check if modal opened
+            modal_visible = await page.is_visible('[role="dialog"]')
+            page_data['components'].append({
+                'name': 'Log Meal Modal',
+                'working': modal_visible,
+                'type': 'modal'
+            })
+
+            # Close modal
+            close_btn = await page.query_selector('[aria-label*="close"], button:has-text("Cancel")')
+            if close_btn:
+                await close_btn.click()
+                await page.wait_for_timeout(500)
+    except Exception as e:
+        print(f"    [WARNING] Log Meal test failed: {e}")
+
+    # Try clicking date selector if it exists
+    try:
+        date_btns = await page.query_selector_all('[class*="day"], [class*="date"]')
+        if len(date_btns) > 2:
+            await date_btns[2].click()
+            await page.wait_for_timeout(500)
+            page_data['components'].append({
+                'name': 'Date Selector',
+                'working': True,
+                'type': 'calendar'
+            })
+    except Exception as e:
+        print(f"    [WARNING] Date selector test failed: {e}")
+
+    # Try sync button if it exists
+    try:
+        sync_btn = await page.query_selector('button:has-text("Sync")')
+        if sync_btn:
+            await sync_btn.click()
+            await page.wait_for_timeout(1000)
+            page_data['components'].append({
+                'name': 'Sync Button',
+                'working': True,
+                'type': 'button'
+            })
+    except Exception as e:
+        print(f"    [WARNING] Sync test failed: {e}")
+
+    return page_data
+
+
+class Browser:
+    """Chromium, launched on first use so all-static crawls never start it."""
+
+    def __init__(self, playwright, run=None):
+        self.playwright = playwright
+        self.run = run
+        self.browser = None
+        self.page = None
+
+    async def get_page(self):
+        if self.page is None:
+            started = time.perf_counter()
+            self.browser = await self.playwright.chromium.launch(headless=False)
+            context = await self.browser.new_context(
+                viewport={'width': 390, 'height': 844},  # iPhone 14 Pro size
+                user_agent=USER_AGENT
+            )
+            self.page = await context.new_page()
+            print(f"  [BROWSER] Chromium launched ({time.perf_counter() - started:.1f}s)")
+            if self.run:
+                self.run.record('browser_launch', duration_ms=(time.perf_counter() - started) * 1000)
+        return self.page
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+
+
+async def crawl_heirclark(run=None, pages=None, discover=False, max_pages=20, browser_only=False):
+    """Crawl entire heirclark.com website and document all features (steps recorded on run if given)"""
+    from playwright.async_api import async_playwright
 
     results = {
         'crawl_date': datetime.now().isoformat(),
-        'base_url': 'https://heirclark.com',
+        'base_url': BASE_URL,
         'pages': [],
         'features': [],
         'components': [],
         'errors': []
     }
+    started = time.perf_counter()
+    timings = {'http': [], 'browser': []}
 
     async with async_playwright() as p:
-        # Launch browser
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            viewport={'width': 390, 'height': 844},  # iPhone 14 Pro size
-            user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)'
-        )
-        page = await context.new_page()
-
-        # Track visited pages
-        visited_pages = set()
-        pages_to_visit = [
-            'https://heirclark.com',
-            'https://heirclark.com/pages/calorie-counter',
-            'https://heirclark.com/pages/steps',
-            'https://heirclark.com/pages/meals',
-            'https://heirclark.com/pages/programs',
-            'https://heirclark.com/pages/settings',
-        ]
-
-        for url in pages_to_visit:
-            if url in visited_pages:
-                continue
-
-            print(f"\n[CRAWLING] {url}")
-            visited_pages.add(url)
-
-            try:
-                # Navigate to page
-                await page.goto(url, wait_until='networkidle', timeout=30000)
-                await page.wait_for_timeout(2000)  # Wait for dynamic content
+        request = await p.request.new_context(user_agent=USER_AGENT, extra_http_headers={'Accept': 'text/html'})
+        browser = Browser(p, run)
+        semaphore = asyncio.Semaphore(HTTP_CONCURRENCY)
+        statics = {}
 
-                page_data = {
-                    'url': url,
-                    'title': await page.title(),
-                    'screenshot': f'screenshots/{url.split("/")[-1] or "home"}.png',
-                    'components': [],
-                    'buttons': [],
-                    'forms': [],
-                    'cards': [],
-                    'modals': []
-                }
-
-                # Take screenshot
-                await page.screenshot(path=page_data['screenshot'], full_page=True)
-
-                # Find all interactive elements
-                print("  [COMPONENTS] Finding components...")
-
-                # Cards (sections with class containing 'card', 'section', 'container')
-                cards = await page.query_selector_all('[class*="card"], [class*="section"], [class*="container"]')
-                for card in cards[:20]:  # Limit to first 20
-                    try:
-                        text = await card.inner_text()
-                        if text and len(text.strip()) > 0:
-                            # Encode to ASCII, ignoring non-ASCII characters
-                            safe_text = text.encode('ascii', 'ignore').decode('ascii').strip()[:200]
-                            page_data['cards'].append({
-                                'text': safe_text,  # First 200 chars
-                                'classes': await card.get_attribute('class')
-                            })
-                    except Exception:
-                        pass  # Skip cards that can't be processed
-
-                # Buttons
-                buttons = await page.query_selector_all('button, [role="button"], a[class*="button"]')
-                for btn in buttons[:30]:  # Limit to first 30
-                    try:
-                        text = await btn.inner_text()
-                        if text and len(text.strip()) > 0:
-                            safe_text = text.encode('ascii', 'ignore').decode('ascii').strip()
-                            page_data['buttons'].append({
-                                'text': safe_text,
-                                'classes': await btn.get_attribute('class')
-                            })
-                    except Exception:
-                        pass  # Skip buttons that can't be processed
-
-                # Forms and inputs
-                inputs = await page.query_selector_all('input, textarea, select')
-                for inp in inputs:
-                    page_data['forms'].append({
-                        'type': await inp.get_attribute('type') or 'text',
-                        'placeholder': await inp.get_attribute('placeholder') or '',
-                        'name': await inp.get_attribute('name') or ''
-                    })
-
-                # Check for modals/dialogs
-                modals = await page.query_selector_all('[role="dialog"], [class*="modal"], [class*="dialog"]')
-                for modal in modals:
-                    is_visible = await modal.is_visible()
-                    page_data['modals'].append({
-                        'visible': is_visible,
-                        'classes': await modal.get_attribute('class')
-                    })
-
-                # Test interactive features
-                print("  🧪 Testing interactions...")
-
-                # Try clicking "Log Meal" button if it exists
+        async def fetch(url):
+            async with semaphore:
                 try:
-                    log_meal_btn = await page.query_selector('button:has-text("Log Meal")')
-                    if log_meal_btn:
-                        await log_meal_btn.click()
-                        await page.wait_for_timeout(1000)
-
-                        # Check if modal opened
-                        modal_visible = await page.is_visible('[role="dialog"]')
-                        page_data['components'].append({
-                            'name': 'Log Meal Modal',
-                            'working': modal_visible,
-                            'type': 'modal'
-                        })
-
-                        # Close modal
-                        close_btn = await page.query_selector('[aria-label*="close"], button:has-text("Cancel")')
-                        if close_btn:
-                            await close_btn.click()
-                            await page.wait_for_timeout(500)
+                    statics[url] = await fetch_static(request, url)
                 except Exception as e:
-                    print(f"    [WARNING] Log Meal test failed: {e}")
-
-                # Try clicking date selector if it exists
-                try:
-                    date_btns = await page.query_selector_all('[class*="day"], [class*="date"]')
-                    if len(date_btns) > 2:
-                        await date_btns[2].click()
-                        await page.wait_for_timeout(500)
-                        page_data['components'].append({
-                            'name': 'Date Selector',
-                            'working': True,
-                            'type': 'calendar'
-                        })
-                except Exception as e:
-                    print(f"    [WARNING] Date selector test failed: {e}")
-
-                # Try sync button if it exists
-                try:
-                    sync_btn = await page.query_selector('button:has-text("Sync")')
-                    if sync_btn:
-                        await sync_btn.click()
-                        await page.wait_for_timeout(1000)
-                        page_data['components'].append({
-                            'name': 'Sync Button',
-                            'working': True,
-                            'type': 'button'
-                        })
-                except Exception as e:
-                    print(f"    [WARNING] Sync test failed: {e}")
-
+                    statics[url] = e
+
+        # Tier 1: fetch every page over HTTP concurrently, following discovered links when asked to
+        queued = list(dict.fromkeys(pages or SEED_PAGES))[:max_pages]
+        if not browser_only:
+            print(f"\n[HTTP] Fetching {len(queued)} pages ({HTTP_CONCURRENCY} at a time)...")
+            pending = queued
+            while pending:
+                await asyncio.gather(*(fetch(url) for url in pending))
+                pending = []
+                if discover:
+                    for url in list(queued):
+                        found = statics[url]
+                        for link in ([] if isinstance(found, Exception) else found[2].links):
+                            if same_site(link) and link not in queued and len(queued) < max_pages:
+                                queued.append(link)
+                                pending.append(link)
+
+        # Tier 2: render only what the HTTP tier can't vouch for
+        for url in queued:
+            page_started = time.perf_counter()
+            fetched = statics.get(url)
+            reason = 'browser-only crawl' if browser_only else None
+            if isinstance(fetched, Exception):
+                reason = f"HTTP fetch failed: {str(fetched).splitlines()[0]}"
+            elif fetched:
+                status, content_type, static, final_url, fetch_ms = fetched
+                reason = needs_browser(status, content_type, static)
+            try:
+                if reason is None:
+                    page_data = static_page_data(url, static)
+                    page_data.update(tier='http', elapsed_ms=round(fetch_ms))
+                    timings['http'].append(fetch_ms)
+                    print(f"[HTTP] {url}: {len(page_data['buttons'])} buttons, {len(page_data['cards'])} cards "
+                          f"({fetch_ms:.0f} ms)")
+                else:
+                    print(f"\n[CRAWLING] {url} (browser: {reason})")
+                    page_data = await browser_page(await browser.get_page(), url)
+                    elapsed_ms = (time.perf_counter() - page_started) * 1000
+                    page_data.update(tier='browser', escalation=reason, elapsed_ms=round(elapsed_ms))
+                    timings['browser'].append(elapsed_ms)
+                    print(f"  [SUCCESS] Completed: {len(page_data['buttons'])} buttons, "
+                          f"{len(page_data['cards'])} cards")
                 results['pages'].append(page_data)
-                print(f"  [SUCCESS] Completed: {len(page_data['buttons'])} buttons, {len(page_data['cards'])} cards")
-
+                if run:
+                    run.record(f"page_{page_slug(url)}", duration_ms=page_data['elapsed_ms'],
+                               detail=page_data['tier'] + (f": {reason}" if reason else ''),
+                               value=len(page_data['buttons']),
+                               artifacts=[page_data['screenshot']] if page_data['screenshot'] else [])
             except Exception as e:
-                print(f"  [ERROR] Error on {url}: {e}")
+                print(f"  [ERROR] Error on {url}: {str(e).splitlines()[0]}")
                 results['errors'].append({
                     'url': url,
                     'error': str(e)
                 })
+                if run:
+                    run.record(f"page_{page_slug(url)}", False, (time.perf_counter() - page_started) * 1000,
+                               detail=str(e).splitlines()[0])
 
-        # Extract overall features from calorie counter page
+        # Extract overall features from calorie counter page; only features missing from the HTML need the browser
         print("\n[ANALYZING] Analyzing calorie counter features...")
-        try:
-            await page.goto('https://heirclark.com/pages/calorie-counter', wait_until='networkidle')
-            await page.wait_for_timeout(2000)
-
-            # Check for specific features
-            features_to_check = [
-                ('Daily Balance', 'Daily Balance'),
-                ('Macros', 'Protein'),
-                ('Today\'s Meals', 'Breakfast'),
-                ('Daily Fat Loss', 'FAT LOSS'),
-                ('Weekly Progress', 'WEEKLY PROGRESS'),
-                ('Dining Out', 'DINING OUT'),
-                ('Wearable Sync', 'WEARABLE SYNC'),
-                ('Log Meal', 'Log Meal'),
-            ]
-
-            for feature_name, search_text in features_to_check:
-                exists = await page.is_visible(f'text="{search_text}"')
-                results['features'].append({
-                    'name': feature_name,
-                    'present': exists
-                })
-                status = "[YES]" if exists else "[NO]"
-                print(f"  {status} {feature_name}")
-
-        except Exception as e:
-            print(f"  [ERROR] Feature analysis error: {e}")
+        fetched = statics.get(FEATURES_PAGE)
+        static = fetched[2] if fetched and not isinstance(fetched, Exception) else None
+        found = {name: 'http' for name, text in FEATURES_TO_CHECK if static and static.has_text(text)}
+        missing = [(name, text) for name, text in FEATURES_TO_CHECK if name not in found]
+        if missing:
+            try:
+                page = await browser.get_page()
+                await page.goto(FEATURES_PAGE, wait_until='networkidle')
+                await page.wait_for_timeout(2000)
+                for name, text in missing:
+                    if await page.is_visible(f'text="{text}"'):
+                        found[name] = 'browser'
+            except Exception as e:
+                print(f"  [ERROR] Feature analysis error: {str(e).splitlines()[0]}")
+
+        for feature_name, _ in FEATURES_TO_CHECK:
+            exists = feature_name in found
+            evidence = {'http': 'present in HTML', 'browser': 'visible'}.get(found.get(feature_name))
+            results['features'].append({
+                'name': feature_name,
+                'present': exists,
+                'tier': found.get(feature_name),
+                'evidence': evidence
+            })
+            if run:
+                run.record('feature_' + feature_name.lower().replace("'", '').replace(' ', '_'), exists,
+                           detail=evidence)
+            status = "[YES]" if exists else "[NO]"
+            print(f"  {status} {feature_name}{f' ({evidence})' if evidence else ''}")
 
         await browser.close()
+        await request.dispose()
 
-    # Save results
-    with open('website_crawl_results.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    results['tiers'] = tier_summary(results['pages'], timings, time.perf_counter() - started)
+    return results
 
+
+def tier_summary(pages, timings, elapsed):
+    """Share of pages per tier, and the time a browser-for-everything crawl would have taken."""
+    total = len(pages) or 1
+    http = sum(page['tier'] == 'http' for page in pages)
+    summary = {
+        'http': http,
+        'browser': len(pages) - http,
+        'http_fraction': http / total,
+        'elapsed_s': elapsed,
+        'http_page_ms': sum(timings['http']) / len(timings['http']) if timings['http'] else None,
+        'browser_page_ms': sum(timings['browser']) / len(timings['browser']) if timings['browser'] else None,
+    }
+    # Rendering everything would have cost an average browser page (2s settle included) per page
+    if summary['browser_page_ms']:
+        browser_only = len(pages) * summary['browser_page_ms'] / 1000
+        summary['estimated_browser_only_s'] = browser_only
+        summary['speedup'] = browser_only / elapsed
+    return summary
+
+
+def print_summary(results, measured_browser_s=None):
+    tiers = results['tiers']
+    total = tiers['http'] + tiers['browser']
     print("\n" + "="*60)
     print("[RESULTS] Results saved to: website_crawl_results.json")
     print(f"[SCREENSHOTS] Screenshots saved to: screenshots/")
     print(f"[SUCCESS] Pages crawled: {len(results['pages'])}")
     print(f"[FEATURES] Features found: {len([f for f in results['features'] if f['present']])}/{len(results['features'])}")
+    print(f"[TIERS] HTTP {tiers['http']}/{total} ({tiers['http_fraction']:.0%}), "
+          f"browser {tiers['browser']}/{total} ({1 - tiers['http_fraction']:.0%}) in {tiers['elapsed_s']:.1f}s")
+    for page in results['pages']:
+        if page['tier'] == 'browser':
+            print(f"         browser: {page['url']} ({page['escalation']})")
+    if measured_browser_s:
+        print(f"[SPEEDUP] {measured_browser_s / tiers['elapsed_s']:.1f}x "
+              f"(browser-only crawl measured at {measured_browser_s:.1f}s)")
+    elif tiers.get('speedup'):
+        print(f"[SPEEDUP] ~{tiers['speedup']:.1f}x (browser-only estimated at {tiers['estimated_browser_only_s']:.1f}s "
+              f"from the average browser page); --compare measures it")
+    else:
+        print("[SPEEDUP] No page needed the browser; run with --compare for a measured figure")
     print("="*60)
 
-    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Crawl heirclark.com over HTTP, rendering pages only when needed')
+    parser.add_argument('--discover', action='store_true', help='Follow same-site /pages/, /collections/ links')
+    parser.add_argument('--max-pages', type=int, default=20)
+    parser.add_argument('--browser-only', action='store_true', help='Render every page in Chromium (old behaviour)')
+    parser.add_argument('--compare', action='store_true', help='Also time a browser-only crawl of the same pages')
+    args = parser.parse_args(argv)
+
+    with record_run('crawl', meta={'args': argv if argv is not None else sys.argv[1:]}) as run:
+        results = asyncio.run(crawl_heirclark(run, None, args.discover, args.max_pages, args.browser_only))
+
+        # Save results
+        with open('website_crawl_results.json', 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        run.artifact('website_crawl_results.json')
+        run.record('tiers', value=results['tiers']['http_fraction'], detail=json.dumps(results['tiers']))
+
+    measured = None
+    if args.compare and not args.browser_only:
+        print("\n[COMPARE] Browser-only crawl of the same pages...")
+        started = time.perf_counter()
+        urls = [page['url'] for page in results['pages']] + [error['url'] for error in results['errors']]
+        asyncio.run(crawl_heirclark(None, urls, max_pages=len(urls), browser_only=True))
+        measured = time.perf_counter() - started
+    print_summary(results, measured)
+    return 1 if results['errors'] else 0
+
 
 if __name__ == '__main__':
-    asyncio.run(crawl_heirclark())
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import asyncio
 from playwright.async_api import async_playwright
+from har_replay import attach_async
 
 async def capture_all_cards():
     async with async_playwright() as p:
@@ -13,6 +14,7 @@ async def capture_all_cards():
             has_touch=True,
         )
 
+        await attach_async(context)  # HAR record/replay when HAR_MODE is set (see har_replay.py)
         page = await context.new_page()
 
         try:
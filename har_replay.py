@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HAR record/replay for the Playwright diagnostic and capture scripts
+
+The scripts drive the Expo web app on localhost:8081. The app then calls the
+Railway backend, the AI, weather and ExerciseDB APIs, fonts and CDNs, and
+those calls make runs slow and noisy. attach() installs a route handler on
+the browser context for every request that leaves localhost:
+
+- record: the request goes to the network, and the response is stored in
+  har/<scenario>.har when the context closes.
+- replay: the response is served from that archive. Requests are matched on
+  method, URL (query order and cache-busting params ignored) and a digest
+  of the body (JSON key order and volatile fields ignored). Repeated calls
+  are served in recorded order. Anything that is not in the archive is
+  aborted as offline, so a replay never touches the network.
+
+Replays respond instantly by default. --latency recorded re-applies each
+response's recorded wait time (optionally scaled), and --latency 80 uses a
+fixed 80 ms. The page clock is also pinned to the time of the recording, so
+greetings, calendars and "today" queries match the recorded responses.
+
+Without HAR_MODE set, attach() does nothing and the scripts run live.
+
+Usage:
+    python har_replay.py record comprehensive_diagnostic.py
+    python har_replay.py replay comprehensive_diagnostic.py
+    python har_replay.py replay diagnose_cards.py --latency recorded --scale 0.5
+    python har_replay.py show har/comprehensive_diagnostic.har
+
+In a script, right after browser.new_context():
+    attach(context)              # sync API
+    await attach_async(context)  # async API
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlsplit
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Everything Metro doesn't serve: backend, third-party APIs, fonts, CDNs
+EXTERNAL_URL = re.compile(r'^https?://(?!(localhost|127\.0\.0\.1|\[::1\])(:\d+)?/)')
+
+# Query params and JSON body fields that change per request without changing the answer
+VOLATILE_PARAMS = {'_', 't', 'ts', 'timestamp', 'cacheBust', 'cb', 'nonce'}
+VOLATILE_FIELDS = {'timestamp', 'requestId', 'nonce'}
+
+# The fulfilled body is already decoded and Playwright sets the length itself
+DROPPED_RESPONSE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+# Never written to a recording; matching doesn't look at request headers
+REDACTED_HEADERS = {'authorization', 'cookie', 'x-api-key', 'x-rapidapi-key', 'apikey'}
+
+HAR_DIR = os.environ.get('HAR_DIR', 'har')
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def body_digest(body):
+    """Short digest of a request body; JSON is compared by content, not formatting."""
+    if not body:
+        return ''
+    try:
+        canonical = json.dumps(_strip_volatile(json.loads(body)), sort_keys=True, separators=(',', ':')).encode()
+    except ValueError:
+        canonical = body
+    return hashlib.sha1(canonical).hexdigest()[:16]
+
+
+def split_url(url):
+    """(scheme://host/path, sorted query pairs without volatile params)."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in VOLATILE_PARAMS)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}", tuple(query)
+
+
+def request_key(method, url, body):
+    path, query = split_url(url)
+    return method.upper(), path, query, body_digest(body)
+
+
+def _decode_text(content, har_dir):
+    """Body bytes of a HAR postData/content object (inline text, base64 or a Playwright _file)."""
+    if content.get('_file'):
+        with open(os.path.join(har_dir, content['_file']), 'rb') as f:
+            return f.read()
+    text = content.get('text') or ''
+    if content.get('encoding') == 'base64':
+        return base64.b64decode(text)
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def _encode_text(body):
+    """HAR content fields for body bytes: text when it's UTF-8, base64 otherwise."""
+    try:
+        return {'text': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'text': base64.b64encode(body).decode('ascii'), 'encoding': 'base64'}
+
+
+class LatencyModel:
+    """
+    How long a replayed response waits before it is delivered.
+
+    'none' (instant), 'recorded' (the entry's recorded wait time) or a
+    fixed number of milliseconds, multiplied by scale.
+    """
+
+    def __init__(self, spec='none', scale=1.0):
+        spec = str(spec).strip().lower()
+        if spec not in ('none', 'recorded'):
+            float(spec)  # fail early on typos
+        self.spec = spec
+        self.scale = scale
+
+    def delay_ms(self, entry):
+        if self.spec == 'none':
+            return 0.0
+        if self.spec == 'recorded':
+            timings = entry.get('timings') or {}
+            waited = sum(max(0, timings.get(part, 0) or 0) for part in ('wait', 'receive'))
+            return (waited or max(0, entry.get('time', 0))) * self.scale
+        return float(self.spec) * self.scale
+
+    def __str__(self):
+        if self.spec == 'none':
+            return 'instant'
+        unit = 'recorded timings' if self.spec == 'recorded' else f"{self.spec} ms"
+        return unit if self.scale == 1 else f"{unit} x{self.scale:g}"
+
+
+class HarArchive:
+    """Recorded entries indexed for request matching."""
+
+    def __init__(self, entries, har_dir='.'):
+        self.entries = entries
+        self.har_dir = har_dir
+        self.exact = defaultdict(list)
+        self.by_path = defaultdict(list)
+        for entry in entries:
+            request = entry['request']
+            body = _decode_text(request['postData'], har_dir) if request.get('postData') else b''
+            key = request_key(request['method'], request['url'], body)
+            self.exact[key].append(entry)
+            self.by_path[key[:2]].append(entry)
+        self._served = Counter()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            har = json.load(f)
+        return cls(har['log']['entries'], os.path.dirname(os.path.abspath(path)))
+
+    def started_at(self):
+        """When the recording started, as a timezone-aware datetime (None if empty)."""
+        stamps = [e['startedDateTime'] for e in self.entries if e.get('startedDateTime')]
+        return datetime.fromisoformat(min(stamps).replace('Z', '+00:00')) if stamps else None
+
+    def match(self, method, url, body):
+        """
+        Return (entry, 'exact' | 'fuzzy') or (None, None).
+
+        Exact matches are served in recorded order and the last one repeats.
+        Otherwise fall back to the same method and path whose query shares the
+        most parameters (a changed date range or search term).
+        """
+        key = request_key(method, url, body)
+        candidates = self.exact.get(key)
+        how = 'exact'
+        if not candidates:
+            entries = self.by_path.get(key[:2])
+            if not entries:
+                return None, None
+            query = set(key[2])
+            best = max(len(query & set(split_url(e['request']['url'])[1])) for e in entries)
+            candidates = [e for e in entries if len(query & set(split_url(e['request']['url'])[1])) == best]
+            key, how = ('fuzzy',) + key[:3], 'fuzzy'
+        index = min(self._served[key], len(candidates) - 1)
+        self._served[key] += 1
+        return candidates[index], how
+
+    def response(self, entry):
+        """(status, headers dict, body bytes) to fulfill a route with."""
+        response = entry['response']
+        headers = {}
+        for header in response.get('headers', []):
+            name = header['name'].lower()
+            if name in DROPPED_RESPONSE_HEADERS or name.startswith(':'):
+                continue
+            headers[name] = f"{headers[name]}, {header['value']}" if name in headers else header['value']
+        return response['status'], headers, _decode_text(response.get('content', {}), self.har_dir)
+
+
+class HarRecorder:
+    """Collects request/response pairs and writes them out as a HAR 1.2 file."""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, request, status, status_text, headers, body, started, elapsed_ms):
+        post = request.post_data_buffer
+        parts = urlsplit(request.url)
+        entry = {
+            'startedDateTime': started.isoformat().replace('+00:00', 'Z'),
+            'time': round(elapsed_ms, 3),
+            'request': {
+                'method': request.method,
+                'url': request.url,
+                'httpVersion': 'HTTP/1.1',
+                'headers': [{'name': h['name'], 'value': '[redacted]' if h['name'].lower() in REDACTED_HEADERS
+                             else h['value']} for h in request.headers_array()],
+                'queryString': [{'name': k, 'value': v} for k, v in parse_qsl(parts.query, keep_blank_values=True)],
+                'cookies': [],
+                'headersSize': -1,
+                'bodySize': len(post or b''),
+            },
+            'response': {
+                'status': status,
+                'statusText': status_text,
+                'httpVersion': 'HTTP/1.1',
+                'headers': headers,
+                'cookies': [],
+                'content': {
+                    'size': len(body),
+                    'mimeType': next((h['value'] for h in headers if h['name'].lower() == 'content-type'), ''),
+                    **_encode_text(body),
+                },
+                'redirectURL': '',
+                'headersSize': -1,
+                'bodySize': len(body),
+            },
+            'cache': {},
+            'timings': {'send': 0, 'wait': round(elapsed_ms, 3), 'receive': 0},
+        }
+        if post:
+            mime = request.headers.get('content-type', '')
+            entry['request']['postData'] = {'mimeType': mime, **_encode_text(post)}
+        self.entries.append(entry)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.entries.sort(key=lambda e: e['startedDateTime'])
+        har = {'log': {'version': '1.2', 'creator': {'name': 'har_replay', 'version': '1.0'},
+                       'pages': [], 'entries': self.entries}}
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(har, f, indent=1)
+        os.replace(tmp, path)
+
+
+class HarSession:
+    """One attach(): the mode, archive or recorder, and what happened to each request."""
+
+    def __init__(self, scenario, mode, latency):
+        self.scenario = scenario
+        self.mode = mode
+        self.latency = latency
+        self.path = os.path.join(HAR_DIR, f"{scenario}.har")
+        self.outcomes = Counter()
+        self.misses = []
+        self.delayed_ms = 0.0
+        self.archive = None
+        self.recorder = None
+        if mode == 'replay':
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"No recording at {self.path}; run with HAR_MODE=record first")
+            self.archive = HarArchive.load(self.path)
+            print(f"[HAR] Replaying {len(self.archive.entries)} responses from {self.path} ({latency})")
+        else:
+            self.recorder = HarRecorder()
+            print(f"[HAR] Recording external requests to {self.path}")
+
+    def lookup(self, request):
+        """Replay: (status, headers, body, delay_ms) for a request, or None when it wasn't recorded."""
+        entry, how = self.archive.match(request.method, request.url, request.post_data_buffer)
+        if entry is None:
+            self.outcomes['missed'] += 1
+            self.misses.append(f"{request.method} {request.url}")
+            return None
+        self.outcomes[how] += 1
+        delay = self.latency.delay_ms(entry)
+        self.delayed_ms += delay
+        return self.archive.response(entry) + (delay,)
+
+    def record(self, request, response, started, elapsed_ms):
+        body = response.body()
+        self.recorder.add(request, response.status, response.status_text, response.headers_array,
+                          body, started, elapsed_ms)
+        self.outcomes['recorded'] += 1
+
+    async def record_async(self, request, response, started, elapsed_ms):
+        body = await response.body()
+        self.recorder.add(request, response.status, response.status_text, response.headers_array,
+                          body, started, elapsed_ms)
+        self.outcomes['recorded'] += 1
+
+    def close(self, *_):
+        if self.recorder is not None:
+            self.recorder.save(self.path)
+            size = os.path.getsize(self.path) / 1024
+            print(f"[SAVED] {len(self.recorder.entries)} responses to {self.path} ({size:,.0f} KB)")
+            return
+        served = self.outcomes['exact'] + self.outcomes['fuzzy']
+        print(f"[HAR] Served {served} responses ({self.outcomes['fuzzy']} fuzzy matches), "
+              f"{self.delayed_ms / 1000:.1f}s of simulated latency")
+        if self.misses:
+            print(f"[WARNING] {len(self.misses)} requests were not in {self.path} and were aborted:")
+            for miss in sorted(set(self.misses))[:20]:
+                print(f"   {miss}")
+
+
+def _options(scenario, mode, latency, scale):
+    mode = (mode or os.environ.get('HAR_MODE', '')).lower()
+    if mode in ('', 'off', 'live'):
+        return None
+    if mode not in ('record', 'replay'):
+        raise ValueError(f"HAR_MODE must be record or replay, not {mode!r}")
+    scenario = scenario or os.environ.get('HAR_SCENARIO') or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    latency = LatencyModel(latency or os.environ.get('HAR_LATENCY', 'none'),
+                           float(scale if scale is not None else os.environ.get('HAR_LATENCY_SCALE', '1')))
+    return HarSession(scenario, mode, latency)
+
+
+def _pin_clock(session):
+    if session.mode != 'replay' or os.environ.get('HAR_CLOCK', '1') == '0':
+        return None
+    return session.archive.started_at()
+
+
+def attach(context, scenario=None, mode=None, latency=None, scale=None):
+    """
+    Record or replay external traffic for a sync-API BrowserContext.
+
+    mode, latency and scale default to HAR_MODE, HAR_LATENCY and
+    HAR_LATENCY_SCALE; scenario defaults to the running script's name.
+    Returns the HarSession, or None when running live.
+    """
+    session = _options(scenario, mode, latency, scale)
+    if session is None:
+        return None
+
+    def handle(route):
+        request = route.request
+        if session.mode == 'record':
+            started = datetime.now(timezone.utc)
+            clock = time.perf_counter()
+            try:
+                response = route.fetch()
+            except Exception:
+                session.outcomes['failed'] += 1
+                route.abort()
+                return
+            session.record(request, response, started, (time.perf_counter() - clock) * 1000)
+            route.fulfill(response=response)
+            return
+        found = session.lookup(request)
+        if found is None:
+            route.abort('internetdisconnected')
+            return
+        status, headers, body, delay = found
+        if delay:
+            try:
+                # Yields to Playwright's loop, so other requests keep flowing
+                request.frame.wait_for_timeout(delay)
+            except Exception:
+                time.sleep(delay / 1000)
+        route.fulfill(status=status, headers=headers, body=body)
+
+    pinned = _pin_clock(session)
+    if pinned and hasattr(context, 'clock'):
+        context.clock.install(time=pinned)
+    context.route(EXTERNAL_URL, handle)
+    context.on('close', session.close)
+    return session
+
+
+async def attach_async(context, scenario=None, mode=None, latency=None, scale=None):
+    """attach() for an async-API BrowserContext."""
+    session = _options(scenario, mode, latency, scale)
+    if session is None:
+        return None
+
+    async def handle(route):
+        request = route.request
+        if session.mode == 'record':
+            started = datetime.now(timezone.utc)
+            clock = time.perf_counter()
+            try:
+                response = await route.fetch()
+            except Exception:
+                session.outcomes['failed'] += 1
+                await route.abort()
+                return
+            await session.record_async(request, response, started, (time.perf_counter() - clock) * 1000)
+            await route.fulfill(response=response)
+            return
+        found = session.lookup(request)
+        if found is None:
+            await route.abort('internetdisconnected')
+            return
+        status, headers, body, delay = found
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        await route.fulfill(status=status, headers=headers, body=body)
+
+    pinned = _pin_clock(session)
+    if pinned and hasattr(context, 'clock'):
+        await context.clock.install(time=pinned)
+    await context.route(EXTERNAL_URL, handle)
+    context.on('close', session.close)
+    return session
+
+
+def show(path):
+    """Print what a recording contains: hosts, endpoints, repeats and size."""
+    archive = HarArchive.load(path)
+    hosts = Counter(urlsplit(e['request']['url']).netloc for e in archive.entries)
+    sizes = Counter()
+    for entry in archive.entries:
+        sizes[urlsplit(entry['request']['url']).netloc] += entry['response'].get('bodySize', 0) or 0
+    started = archive.started_at()
+    print(f"{path}: {len(archive.entries)} responses, recorded {started:%Y-%m-%d %H:%M:%S %Z}" if started
+          else f"{path}: empty")
+    for host, count in hosts.most_common():
+        print(f"  {count:5}  {sizes[host] / 1024:9,.1f} KB  {host}")
+    repeats = {key: len(entries) for key, entries in archive.exact.items() if len(entries) > 1}
+    if repeats:
+        print("\nRepeated requests (served in recorded order):")
+        for (method, url, _query, _digest), count in sorted(repeats.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  {count:5}x {method} {url}")
+    total = sum(e.get('time', 0) or 0 for e in archive.entries) / 1000
+    print(f"\nRecorded network time: {total:.1f}s across all requests")
+
+
+def run_script(mode, script, scenario, latency, scale, clock):
+    env = dict(os.environ, HAR_MODE=mode, HAR_SCENARIO=scenario, HAR_LATENCY=latency,
+               HAR_LATENCY_SCALE=str(scale), HAR_CLOCK='1' if clock else '0')
+    started = time.perf_counter()
+    code = subprocess.call([sys.executable, script], env=env)
+    print(f"\n{mode} of {script} finished in {time.perf_counter() - started:.1f}s (exit {code})")
+    return code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record or replay the external traffic of a Playwright script')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('record', 'replay'):
+        p = sub.add_parser(name, help=f'Run a script with HAR_MODE={name}')
+        p.add_argument('script', help='Playwright script that calls attach()/attach_async()')
+        p.add_argument('--scenario', help='Recording name (default: script name)')
+        if name == 'replay':
+            p.add_argument('--latency', default='none', help="'none', 'recorded' or a fixed delay in ms")
+            p.add_argument('--scale', type=float, default=1.0, help='Multiply every delay')
+            p.add_argument('--no-clock', action='store_true', help="Don't pin the page clock to the recording")
+    show_parser = sub.add_parser('show', help='Summarize a recording')
+    show_parser.add_argument('har', help='Path to a .har file')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'show':
+            show(args.har)
+            return 0
+        scenario = args.scenario or os.path.splitext(os.path.basename(args.script))[0]
+        if args.command == 'record':
+            return run_script('record', args.script, scenario, 'none', 1.0, False)
+        LatencyModel(args.latency)  # validate before launching a browser
+        if not os.path.exists(os.path.join(HAR_DIR, f"{scenario}.har")):
+            print(f"[ERROR] No recording for {scenario}; run: python har_replay.py record {args.script}")
+            return 1
+        return run_script('replay', args.script, scenario, args.latency, args.scale, not args.no_clock)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One entry point for the Python tooling
+
+Every capture, diagnostic, image and backend script stays runnable on its
+own. This puts them behind subcommands and imports a script only when its
+subcommand is chosen. Playwright, Pillow, NumPy, psycopg2 and asyncpg are
+therefore only loaded by the commands that use them, and
+`heirclark.py schema-check` never pays for a browser driver it won't
+start.
+
+Scripts with a main(argv) get the remaining arguments passed straight
+through. Older single-purpose scripts (no main) are run as __main__ with
+sys.argv set, exactly as if they had been invoked directly. Each run is
+recorded in run_history.sqlite (see run_history.py).
+
+`bench` measures startup. It runs each command's --help under
+python -X importtime and reports wall time, import time and the most
+expensive top-level imports. The same figures are shown for loading every
+heavy dependency up front, for comparison.
+
+Usage:
+    python heirclark.py                              # list commands
+    python heirclark.py schema-check --refresh
+    python heirclark.py layout --scroll 550
+    python heirclark.py capture-gauges
+    python heirclark.py bench
+    python heirclark.py bench schema-check migrate watch --repeat 10
+"""
+
+import argparse
+import importlib
+import os
+import runpy
+import sys
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (group, path from the repo root, has main(argv), description)
+COMMANDS = {
+    'layout': ('browser', 'layout_assertions.py', True, 'Numeric clipping/overlap checks for gauges and cards'),
+    'sweep': ('browser', 'scroll_capture.py', True, 'Stitched full-height capture of the scroll view'),
+    'watch': ('browser', 'capture_watch.py', True, 'Re-run captures affected by changed UI files'),
+    'animations': ('browser', 'animation_profiler.py', True, 'Frame times of card and modal animations'),
+    'leaks': ('browser', 'leak_detector.py', True, 'JS heap and DOM growth across repeated interactions'),
+    'har': ('browser', 'har_replay.py', True, 'Record, replay or inspect HAR archives'),
+    'diagnostic': ('browser', 'comprehensive_diagnostic.py', False, 'Full dashboard diagnostic with screenshots'),
+    'diagnose-cards': ('browser', 'diagnose_cards.py', False, 'Expand and screenshot every collapsible card'),
+    'capture-element': ('browser', 'capture_element.py', False, 'Screenshot the dashboard at a tall viewport'),
+    'capture-gauges': ('browser', 'capture_gauges.py', False, 'Full-page captures of the calorie and macro gauges'),
+    'capture-macro-detail': ('browser', 'capture_macro_detail.py', False, 'Close-ups of the macro cards and gauges'),
+    'capture-macros': ('browser', 'capture_macros_final.py', False, 'Macro card captures behind the layout gate'),
+    'check-fonts': ('browser', 'check_fonts.py', False, 'Open the app headed to inspect font weights'),
+    'test-fonts': ('browser', 'test_fonts.py', False, 'Screenshot the app on the first Expo port that answers'),
+    'crawl': ('browser', 'crawl_heirclark_website.py', True, 'Crawl heirclark.com, HTTP first, browser when needed'),
+    'images': ('images', 'process_images.py', True, 'Batch crop/resize/normalize a directory of images'),
+    'app-icon': ('images', 'process_app_icon.py', False, 'Build the App Store icon from a photo'),
+    'svg-icon': ('images', 'process_svg_icon.py', False, 'Build the App Store icon from the SVG logo'),
+    'schema-check': ('backend', 'backend/schema_snapshot.py', True, 'Diff the live schema against schema.sql'),
+    'check-tables': ('backend', 'backend/check_tables.py', False, 'List tables and workout_plans columns'),
+    'check-profiles': ('backend', 'backend/check_user_profiles.py', False, 'Show user_profiles and user_goals columns'),
+    'health-check': ('backend', 'backend/health_check.py', True, 'Multi-table database health check, sync or async'),
+    'replica-check': ('backend', 'backend/replica_check.py', True, 'Read-replica lag and routing check'),
+    'migrate': ('backend', 'backend/migrate.py', True, 'Apply pending migrations'),
+    'online-migrate': ('backend', 'backend/online_migrations.py', True, 'Lock-safe online schema changes'),
+    'partition-logs': ('backend', 'backend/partition_logs.py', True, 'Monthly range partitioning for the log tables'),
+    'index-advisor': ('backend', 'backend/index_advisor.py', True, 'Index advice from pg_stat_statements'),
+    'load-test': ('backend', 'backend/load_test.py', True, 'Benchmark the common database access paths'),
+    'synthetic-data': ('backend', 'backend/synthetic_data.py', True, 'Generate synthetic data for load testing'),
+    'nutrition-rollup': ('backend', 'backend/nutrition_rollup.py', True, 'Refresh the daily nutrition rollup'),
+    'habit-streaks': ('backend', 'backend/habit_streaks.py', True, 'Maintain current and longest habit streaks'),
+    'calorie-bank': ('backend', 'backend/calorie_bank.py', True, 'Maintain calorie_bank running balances'),
+    'wearable-ingest': ('backend', 'backend/wearable_ingest.py', True, 'Bulk-load wearable history into the logs'),
+    'apple-health-export': ('backend', 'backend/apple_health_export.py', True, 'Stream-parse Apple Health export.xml'),
+    'export-user-data': ('backend', 'backend/export_user_data.py', True, "Stream a user's data to NDJSON/CSV"),
+    'history': ('results', 'run_history.py', True, 'p95/trend/first-failure queries over recorded runs'),
+}
+
+# Quick commands benchmarked by default: their --help never opens a browser or a connection
+BENCH_COMMANDS = ['schema-check', 'migrate', 'health-check', 'layout', 'har', 'watch', 'sweep', 'images']
+
+# Commands that record their own per-step runs in run_history, or only read it; the rest get one 'exit' step
+NOT_WRAPPED_IN_RUN = {'diagnostic', 'crawl', 'watch', 'history'}
+
+# What a single module importing every tool dependency at the top would pay on each start
+EAGER_IMPORTS = 'import playwright.async_api, playwright.sync_api, PIL.Image, numpy, psycopg2.extras, asyncpg'
+
+
+def run_command(name, args):
+    """Import (or execute) one command's script and hand it the remaining arguments."""
+    _, path, has_main, _ = COMMANDS[name]
+    path = os.path.join(ROOT, path)
+    directory = os.path.dirname(path)
+    # backend scripts import their siblings (from db import ...) as top-level modules
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {name}", *args]
+    if has_main:
+        module = importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+        return module.main(args) or 0
+    runpy.run_path(path, run_name='__main__')
+    return 0
+
+
+def run_recorded(name, args):
+    """run_command, recorded in run_history as a run of scenario name with its exit code."""
+    if name in NOT_WRAPPED_IN_RUN or '-h' in args or '--help' in args:
+        return run_command(name, args)
+    from run_history import record_run
+
+    with record_run(name, meta={'args': args}) as run:
+        try:
+            code = run_command(name, args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        run.mark('exit', passed=code == 0, value=code)
+    return code
+
+
+def print_commands():
+    print(__doc__.strip().splitlines()[0])
+    for group in ('browser', 'images', 'backend', 'results'):
+        print(f"\n{group}:")
+        for name, (g, path, _, description) in COMMANDS.items():
+            if g == group:
+                print(f"  {name:<22} {description}")
+    print("\n  bench                  Startup time and -X importtime figures per command")
+    print(f"\nRun 'python {os.path.basename(sys.argv[0])} <command> --help' for a command's options")
+
+
+def parse_importtime(stderr):
+    """(total import us, [(cumulative us, module)] for top-level imports) from -X importtime output."""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Nested imports are indented under their parent; only count each tree once
+        if not module[1:].startswith(' '):
+            top.append((int(cumulative), module.strip()))
+    return sum(us for us, _ in top), sorted(top, reverse=True)
+
+
+def time_startup(cmd, repeat):
+    """Median wall ms and importtime of running cmd repeat times (first run discarded as a cache warmup)."""
+    import statistics
+    import subprocess
+    import time
+
+    walls = []
+    stderr = ''
+    for _ in range(repeat + 1):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', *cmd], capture_output=True, text=True, cwd=ROOT)
+        walls.append((time.perf_counter() - started) * 1000)
+        stderr = proc.stderr
+    total_us, top = parse_importtime(stderr)
+    return statistics.median(walls[1:]), total_us / 1000, top
+
+
+def bench(names, repeat):
+    script = os.path.basename(__file__)
+    rows = [('python (no imports)', ['-c', 'pass']),
+            (f'{script} (command list)', [script]),
+            *((f'{script} {name} --help', [script, name, '--help']) for name in names),
+            ('eager: every dependency', ['-c', EAGER_IMPORTS])]
+    print(f"Median of {repeat} starts (after one warmup), {sys.executable}\n")
+    print(f"{'command':<40} {'wall':>8} {'imports':>9}   heaviest top-level imports")
+    results = {}
+    for label, cmd in rows:
+        wall_ms, import_ms, top = time_startup(cmd, repeat)
+        results[label] = wall_ms
+        heaviest = ', '.join(f"{module} {us / 1000:.0f}" for us, module in top[:3])
+        print(f"{label:<40} {wall_ms:6.0f}ms {import_ms:7.0f}ms   {heaviest}")
+    eager = results['eager: every dependency']
+    print(f"\nLoading every dependency up front costs {eager:.0f} ms per start; "
+          f"{sum(results[f'{script} {name} --help'] < eager / 2 for name in names)} of {len(names)} "
+          f"commands start in under half that.")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help', 'list'):
+        print_commands()
+        return 0
+    if argv[0] == 'bench':
+        parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} bench",
+                                         description='Measure startup time of CLI commands')
+        parser.add_argument('commands', nargs='*', metavar='COMMAND',
+                            help=f"Commands with a main() (default: {' '.join(BENCH_COMMANDS)})")
+        parser.add_argument('--repeat', type=int, default=5)
+        args = parser.parse_args(argv[1:])
+        # --help on a script without main() would run it
+        unsupported = [n for n in args.commands if n not in COMMANDS or not COMMANDS[n][2]]
+        if unsupported:
+            parser.error(f"can only bench commands with a main(): {', '.join(unsupported)}")
+        return bench(args.commands or BENCH_COMMANDS, max(1, args.repeat))
+    if argv[0] not in COMMANDS:
+        print(f"[ERROR] Unknown command {argv[0]!r}")
+        print_commands()
+        return 2
+    return run_recorded(argv[0], argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
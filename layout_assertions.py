@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Numeric layout assertions for the dashboard gauges and cards
+
+Finding clipped gauge text used to mean screenshots at hand-picked scroll
+offsets (550, 650, 500) and squinting. This measures it instead. A single
+page.evaluate() call gathers, for every named component:
+
+- its bounding box and how much of it is visible after the viewport,
+  scroll containers and overflow-clipping ancestors are applied
+- the "ink" inside it: each text run (via Range) and each SVG shape
+  (bbox grown by half the stroke width), together with the nearest
+  ancestor that cuts it off (overflow hidden/clip on either axis, or an
+  <svg> viewport)
+
+Python then checks the rules numerically:
+
+- no_clip:     no ink is partly cut off, which is the gauge-cutoff bug.
+               Ink that is hidden entirely counts as collapsed, not cut.
+- inside:      child box within parent box (the ring stays inside its card)
+- no_overlap:  two boxes don't intersect (the macro cards in a row)
+- in_viewport: fully visible at the current scroll position
+
+No screenshots and no image encoding are involved, so the check costs a
+few milliseconds. It is meant to run as a gate before any pixel diffing.
+Components are located through the accessibility labels React Native Web
+renders as aria-label, so no testIDs are needed.
+
+Usage:
+    python layout_assertions.py
+    python layout_assertions.py --scroll 550 --require-visible calorie_ring
+    python layout_assertions.py --fit protein_card fat_card carbs_card --json layout.json
+
+From a capture script:
+    snapshot = await collect_async(page)
+    violations = check(snapshot)
+"""
+
+import argparse
+import json
+import sys
+import time
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+APP_URL = 'http://localhost:8081'
+
+# name -> CSS selector (first match) or {'text': exact text, 'closest': CSS selector to climb to}
+COMPONENTS = {
+    'daily_balance_card': '[aria-label^="Daily balance:"]',
+    'calorie_ring': '[aria-label^="Daily balance:"] [role="progressbar"]',
+    'protein_card': '[aria-label^="Protein intake:"]',
+    'fat_card': '[aria-label^="Dietary fat intake:"]',
+    'carbs_card': '[aria-label^="Carbohydrates intake:"]',
+    'daily_fat_loss_card': '[aria-label^="Daily Fat Loss card"]',
+    'weekly_progress_card': '[aria-label*="Progress card,"]',
+    'dining_out_card': '[aria-label^="Dining Out card"]',
+    'wearable_sync_card': '[aria-label^="Wearable Sync card"]',
+    'todays_meals_card': {'text': "TODAY'S MEALS", 'closest': '[role="button"]'},
+}
+
+# (rule, component, [other component])
+DEFAULT_RULES = [
+    *(('no_clip', name) for name in COMPONENTS),
+    ('inside', 'calorie_ring', 'daily_balance_card'),
+    ('no_overlap', 'protein_card', 'fat_card'),
+    ('no_overlap', 'fat_card', 'carbs_card'),
+    ('no_overlap', 'daily_balance_card', 'protein_card'),
+]
+
+COLLECT_JS = r"""
+(specs) => {
+    const started = performance.now();
+    const styles = new Map();
+    const style = (el) => {
+        if (!styles.has(el)) styles.set(el, getComputedStyle(el));
+        return styles.get(el);
+    };
+    const box = (r) => ({left: r.left, top: r.top, right: r.right, bottom: r.bottom});
+    const meet = (a, b) => ({left: Math.max(a.left, b.left), top: Math.max(a.top, b.top),
+                             right: Math.min(a.right, b.right), bottom: Math.min(a.bottom, b.bottom)});
+    const area = (r) => Math.max(0, r.right - r.left) * Math.max(0, r.bottom - r.top);
+    const describe = (el) => {
+        const label = el.getAttribute && el.getAttribute('aria-label');
+        if (label) return `${el.tagName.toLowerCase()}[aria-label="${label.slice(0, 40)}"]`;
+        const cls = (el.getAttribute && el.getAttribute('class') || '').split(/\s+/).filter(Boolean)[0];
+        return el.tagName.toLowerCase() + (cls ? '.' + cls : '');
+    };
+    const viewport = {left: 0, top: 0, right: innerWidth, bottom: innerHeight};
+    const CLIPS = new Set(['hidden', 'clip']);
+    const SCROLLS = new Set(['auto', 'scroll']);
+
+    // Nearest ancestor cutting `el` off, and the visible area left after all of them
+    const clipOf = (el) => {
+        let clip = {left: -Infinity, top: -Infinity, right: Infinity, bottom: Infinity};
+        let visible = viewport;
+        let by = null;
+        for (let a = el.parentElement; a && a !== document.documentElement; a = a.parentElement) {
+            const cs = style(a);
+            const r = a.getBoundingClientRect();
+            const svg = a instanceof SVGSVGElement && cs.overflow !== 'visible';
+            const x = svg || CLIPS.has(cs.overflowX), y = svg || CLIPS.has(cs.overflowY);
+            if (x || y) {
+                const inner = svg ? box(r) : {left: r.left + a.clientLeft, top: r.top + a.clientTop,
+                                             right: r.left + a.clientLeft + a.clientWidth,
+                                             bottom: r.top + a.clientTop + a.clientHeight};
+                const next = {left: x ? Math.max(clip.left, inner.left) : clip.left,
+                              right: x ? Math.min(clip.right, inner.right) : clip.right,
+                              top: y ? Math.max(clip.top, inner.top) : clip.top,
+                              bottom: y ? Math.min(clip.bottom, inner.bottom) : clip.bottom};
+                if (!by && (next.left > clip.left || next.right < clip.right ||
+                            next.top > clip.top || next.bottom < clip.bottom)) by = a;
+                clip = next;
+            }
+            if (SCROLLS.has(cs.overflowX) || SCROLLS.has(cs.overflowY)) visible = meet(visible, box(r));
+        }
+        return {clip, visible: meet(visible, clip), by};
+    };
+
+    const inkOf = (root) => {
+        const ink = [];
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        const range = document.createRange();
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const text = node.textContent.trim();
+            const parent = node.parentElement;
+            if (!text || !parent || style(parent).visibility === 'hidden') continue;
+            range.selectNodeContents(node);
+            const r = range.getBoundingClientRect();
+            if (r.width && r.height) ink.push({kind: 'text', label: text.slice(0, 30), el: parent, rect: box(r)});
+        }
+        for (const shape of root.querySelectorAll('path, circle, ellipse, rect, line, polyline, polygon')) {
+            const cs = style(shape);
+            const r = shape.getBoundingClientRect();
+            if (cs.visibility === 'hidden' || cs.display === 'none' || !(r.width || r.height)) continue;
+            const ctm = shape.getScreenCTM();
+            const half = cs.stroke !== 'none' ? (parseFloat(cs.strokeWidth) || 0) / 2 * (ctm ? Math.hypot(ctm.a, ctm.b) : 1) : 0;
+            ink.push({kind: shape.tagName.toLowerCase(), label: shape.getAttribute('d') ? 'arc' : shape.tagName.toLowerCase(),
+                      el: shape, rect: {left: r.left - half, top: r.top - half, right: r.right + half, bottom: r.bottom + half}});
+        }
+        return ink;
+    };
+
+    const find = (spec) => {
+        if (typeof spec === 'string') return document.querySelector(spec);
+        const all = document.querySelectorAll('body *');
+        for (const el of all) {
+            if (el.childElementCount === 0 && el.textContent.trim() === spec.text) {
+                return spec.closest ? (el.closest(spec.closest) || el) : el;
+            }
+        }
+        return null;
+    };
+
+    const components = {};
+    for (const [name, spec] of Object.entries(specs)) {
+        const el = find(spec);
+        if (!el) { components[name] = {found: false}; continue; }
+        const rect = box(el.getBoundingClientRect());
+        const own = clipOf(el);
+        const clipped = [];
+        for (const item of inkOf(el)) {
+            const {clip, by} = clipOf(item.el);
+            const r = item.rect;
+            const cut = {top: clip.top - r.top, right: r.right - clip.right,
+                         bottom: r.bottom - clip.bottom, left: clip.left - r.left};
+            const inside = area(meet(r, clip));
+            if (inside <= 0) continue;  // hidden entirely: collapsed, not cut off
+            const worst = Math.max(cut.top, cut.right, cut.bottom, cut.left);
+            if (worst > 0) {
+                for (const side of Object.keys(cut)) cut[side] = Math.max(0, Math.round(cut[side] * 10) / 10);
+                clipped.push({kind: item.kind, label: item.label, cut, by: by ? describe(by) : 'svg viewport'});
+            }
+        }
+        components[name] = {found: true, rect, visible: area(meet(rect, own.visible)) / (area(rect) || 1), clipped};
+    }
+    return {components, viewport: {width: innerWidth, height: innerHeight},
+            scroll: {x: scrollX, y: scrollY}, ms: performance.now() - started};
+}
+"""
+
+
+def collect(page, components=None):
+    """Measure every component on a sync-API page in one evaluate call."""
+    started = time.perf_counter()
+    snapshot = page.evaluate(COLLECT_JS, components or COMPONENTS)
+    snapshot['round_trip_ms'] = (time.perf_counter() - started) * 1000
+    return snapshot
+
+
+async def collect_async(page, components=None):
+    """collect() for an async-API page."""
+    started = time.perf_counter()
+    snapshot = await page.evaluate(COLLECT_JS, components or COMPONENTS)
+    snapshot['round_trip_ms'] = (time.perf_counter() - started) * 1000
+    return snapshot
+
+
+def locate(page, name):
+    """Playwright locator for a COMPONENTS name; anything else is used as a selector."""
+    spec = COMPONENTS.get(name, name)
+    if isinstance(spec, dict):
+        return page.get_by_text(spec['text'], exact=True).first
+    return page.locator(spec).first
+
+
+def _intersection(a, b):
+    width = min(a['right'], b['right']) - max(a['left'], b['left'])
+    height = min(a['bottom'], b['bottom']) - max(a['top'], b['top'])
+    return max(0, width) * max(0, height)
+
+
+def check(snapshot, rules=None, tolerance=0.5):
+    """
+    Apply rules to a snapshot and return a list of violation messages.
+
+    Rules on a component that wasn't found are skipped (a card can be
+    turned off in settings); in_viewport on a missing component fails.
+    """
+    components = snapshot['components']
+    violations = []
+    for rule, name, *other in rules or DEFAULT_RULES:
+        component = components.get(name, {'found': False})
+        target = components.get(other[0], {'found': False}) if other else None
+        if not component['found'] or (target is not None and not target['found']):
+            if rule == 'in_viewport':
+                violations.append(f"{name}: not on the page")
+            continue
+        rect = component['rect']
+        if rule == 'no_clip':
+            for item in component['clipped']:
+                cut = ', '.join(f"{px}px {side}" for side, px in item['cut'].items() if px > tolerance)
+                if cut:
+                    violations.append(f"{name}: {item['kind']} '{item['label']}' cut off {cut} by {item['by']}")
+        elif rule == 'inside':
+            outer = target['rect']
+            overhang = max(outer['top'] - rect['top'], rect['right'] - outer['right'],
+                           rect['bottom'] - outer['bottom'], outer['left'] - rect['left'])
+            if overhang > tolerance:
+                violations.append(f"{name}: extends {overhang:.1f}px outside {other[0]}")
+        elif rule == 'no_overlap':
+            overlap = _intersection(rect, target['rect'])
+            if overlap > tolerance ** 2:
+                violations.append(f"{name}: overlaps {other[0]} by {overlap:.0f}px²")
+        elif rule == 'in_viewport':
+            if component['visible'] < 1 - 1e-3:
+                violations.append(f"{name}: only {component['visible']:.0%} visible at scroll y={snapshot['scroll']['y']:.0f}")
+        else:
+            raise ValueError(f"Unknown layout rule {rule!r}")
+    return violations
+
+
+def fit_scroll(snapshot, names, margin=8):
+    """
+    Window scrollY that puts every named component fully on screen, or None
+    if they don't fit in one viewport together.
+    """
+    rects = [snapshot['components'][name]['rect'] for name in names if snapshot['components'].get(name, {}).get('found')]
+    if not rects:
+        return None
+    scroll_y = snapshot['scroll']['y']
+    top = min(r['top'] for r in rects) + scroll_y - margin
+    bottom = max(r['bottom'] for r in rects) + scroll_y + margin
+    if bottom - top > snapshot['viewport']['height']:
+        return None
+    return max(0, round(top))
+
+
+def print_report(snapshot, violations):
+    print(f"\n{'component':<22} {'x':>6} {'y':>7} {'w':>6} {'h':>6} {'visible':>8}  clipped ink")
+    for name, component in snapshot['components'].items():
+        if not component['found']:
+            print(f"{name:<22} {'-- not found':>36}")
+            continue
+        r = component['rect']
+        print(f"{name:<22} {r['left']:6.0f} {r['top']:7.0f} {r['right'] - r['left']:6.0f} "
+              f"{r['bottom'] - r['top']:6.0f} {component['visible']:8.0%}  {len(component['clipped'])}")
+    print(f"\nMeasured in {snapshot['ms']:.1f} ms in the page ({snapshot['round_trip_ms']:.1f} ms round trip)")
+    for violation in violations:
+        print(f"   ✗ {violation}")
+    if violations:
+        print(f"[ERROR] {len(violations)} layout violations")
+    else:
+        print("[SUCCESS] No clipped, overflowing or overlapping components")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check dashboard gauges and cards for clipping and overlap')
+    parser.add_argument('--url', default=APP_URL)
+    parser.add_argument('--viewport', default='390x844', help='WIDTHxHEIGHT (default iPhone 14 Pro)')
+    parser.add_argument('--scroll', type=int, help='window.scrollTo(0, Y) before measuring')
+    parser.add_argument('--fit', nargs='+', metavar='COMPONENT', help='Scroll so these components are on screen')
+    parser.add_argument('--require-visible', nargs='+', default=[], metavar='COMPONENT',
+                        help='Also require these to be fully in the viewport')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Pixels of slack per rule')
+    parser.add_argument('--json', help='Write the raw measurements to this file')
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args(argv)
+
+    unknown = [n for n in (args.fit or []) + args.require_visible if n not in COMPONENTS]
+    if unknown:
+        print(f"[ERROR] Unknown components: {', '.join(unknown)} (known: {', '.join(COMPONENTS)})")
+        return 1
+    width, height = (int(v) for v in args.viewport.lower().split('x'))
+    rules = DEFAULT_RULES + [('in_viewport', name) for name in (args.fit or []) + args.require_visible]
+
+    try:
+        from playwright.sync_api import sync_playwright
+        from har_replay import attach
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=not args.headed)
+            context = browser.new_context(viewport={'width': width, 'height': height}, device_scale_factor=3,
+                                          is_mobile=True, has_touch=True)
+            attach(context)
+            page = context.new_page()
+            page.goto(args.url, wait_until='networkidle', timeout=60000)
+            skip = page.query_selector('text=Skip')
+            if skip:
+                skip.click()
+                page.wait_for_load_state('networkidle')
+
+            if args.scroll is not None:
+                page.evaluate('(y) => window.scrollTo(0, y)', args.scroll)
+            snapshot = collect(page)
+            if args.fit:
+                target = fit_scroll(snapshot, args.fit)
+                if target is None:
+                    print(f"[WARNING] {', '.join(args.fit)} don't fit in one {height}px viewport")
+                else:
+                    print(f"Scrolling to y={target} to fit {', '.join(args.fit)}")
+                    page.evaluate('(y) => window.scrollTo(0, y)', target)
+                    snapshot = collect(page)
+            browser.close()
+
+        violations = check(snapshot, rules, args.tolerance)
+        print_report(snapshot, violations)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({**snapshot, 'violations': violations}, f, indent=2)
+            print(f"[SAVED] {args.json}")
+        return 1 if violations else 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
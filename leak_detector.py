@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory leak detector for the Expo web build
+
+The diagnostic scripts check what the dashboard looks like once. They can't
+tell whether it holds on to memory each time a modal opens or a card
+expands, and on a phone that growth shows up as slowdowns and crashes
+after a few minutes of use. This repeats one interaction cycle many times
+and watches what survives garbage collection:
+
+- after every cycle, GC is forced twice through the DevTools protocol
+  (HeapProfiler.collectGarbage), then JSHeapUsedSize, DOM nodes, event
+  listeners and documents are read from Performance.getMetrics
+- a least-squares line is fitted over the cycles for each metric. A slope
+  above the threshold with a good fit (r^2 >= 0.5) is reported as LEAK.
+  A single jump followed by a plateau is a cache filling up, not a leak.
+- when the heap grows past --heap-threshold-kb per cycle, a heap snapshot
+  taken after warmup is compared with one taken at the end. The report
+  then lists the constructors whose instance counts and sizes grew, plus
+  detached DOM nodes.
+
+Cycles:
+    meal_modal  open the meal modal from the "Log a meal" floating button, then close it
+    cards       expand and collapse the collapsible dashboard cards
+    tabs        switch to Goals, Meals and Programs, then back to the dashboard
+
+Targets that aren't on the page are skipped with a warning. A cycle that
+finds nothing to click, or fails part way, is reported as an error while
+the other cycles still run and are reported.
+
+Usage:
+    python leak_detector.py
+    python leak_detector.py --cycle meal_modal --cycles 40
+    python leak_detector.py --cycle cards tabs --json leaks.json --save-snapshot
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+APP_URL = 'http://localhost:8081'
+SETTLE_MS = 500
+MIN_R2 = 0.5  # below this the growth is noise or a one-off step, not a trend
+SNAPSHOT_TOP = 15
+
+# metric -> (label, unit divisor, unit)
+METRICS = {
+    'JSHeapUsedSize': ('JS heap', 1024, 'KB'),
+    'Nodes': ('DOM nodes', 1, 'nodes'),
+    'JSEventListeners': ('listeners', 1, 'listeners'),
+    'Documents': ('documents', 1, 'docs'),
+}
+
+# Tab hrefs from TAB_CONFIG in app/(tabs)/_layout.tsx
+TABS = ['/goals', '/meals', '/programs']
+HOME = '[aria-label="Home dashboard"]'
+
+_missing = set()
+
+
+async def _click(page, target, wait_ms=SETTLE_MS):
+    """Click target and let the UI settle. False, with one warning per target, when it isn't on the page."""
+    from layout_assertions import locate
+
+    locator = locate(page, target)
+    if not await locator.count():
+        if target not in _missing:
+            _missing.add(target)
+            print(f"   [WARNING] {target} not found, skipped")
+        return False
+    await locator.scroll_into_view_if_needed()
+    await locator.click()
+    await page.wait_for_timeout(wait_ms)
+    return True
+
+
+# Each cycle returns how many targets it clicked
+async def cycle_meal_modal(page):
+    from animation_profiler import INTERACTIONS, close_modal
+
+    if not await _click(page, INTERACTIONS['log_meal_modal'][0]):
+        return 0
+    await close_modal(page)
+    await page.wait_for_timeout(SETTLE_MS)
+    return 1
+
+
+async def cycle_cards(page):
+    from animation_profiler import INTERACTIONS
+
+    clicked = 0
+    for target, kind in INTERACTIONS.values():
+        if kind == 'toggle' and await _click(page, target, 400):
+            await _click(page, target, 400)
+            clicked += 1
+    return clicked
+
+
+async def cycle_tabs(page):
+    clicked = 0
+    for href in TABS:
+        clicked += await _click(page, f'[href="{href}"]')
+    return clicked + await _click(page, HOME)
+
+
+CYCLES = {
+    'meal_modal': cycle_meal_modal,
+    'cards': cycle_cards,
+    'tabs': cycle_tabs,
+}
+
+
+def linear_fit(ys):
+    """Least-squares slope per step and r^2 for ys sampled at 0, 1, 2, ..."""
+    n = len(ys)
+    if n < 2:
+        return 0.0, 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in range(n))
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(ys))
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    slope = sxy / sxx
+    r2 = (sxy * sxy) / (sxx * syy) if syy else 0.0
+    return slope, r2
+
+
+def verdict(samples, thresholds):
+    """metric -> {slope, r2, start, end, leak} from per-cycle metric samples."""
+    result = {}
+    for metric, threshold in thresholds.items():
+        ys = [s[metric] for s in samples if metric in s]
+        if not ys:
+            continue
+        slope, r2 = linear_fit(ys)
+        result[metric] = {'slope': slope, 'r2': r2, 'start': ys[0], 'end': ys[-1],
+                          'threshold': threshold, 'leak': slope > threshold and r2 >= MIN_R2}
+    return result
+
+
+def summarize_snapshot(snapshot):
+    """constructor name -> [count, self_size] and the number of detached DOM nodes in a .heapsnapshot."""
+    meta = snapshot['snapshot']['meta']
+    fields = meta['node_fields']
+    types = meta['node_types'][0]
+    strings = snapshot['strings']
+    nodes = snapshot['nodes']
+    width = len(fields)
+    type_at, name_at, size_at = fields.index('type'), fields.index('name'), fields.index('self_size')
+    detached_at = fields.index('detachedness') if 'detachedness' in fields else None
+
+    counts = Counter()
+    sizes = Counter()
+    detached = 0
+    for i in range(0, len(nodes), width):
+        kind = types[nodes[i + type_at]]
+        if kind in ('hidden', 'synthetic', 'string', 'number', 'concatenated string', 'sliced string', 'code'):
+            continue
+        name = strings[nodes[i + name_at]]
+        # Older V8 prefixes detached DOM wrappers with "Detached "; newer V8 has a detachedness field (2 = detached)
+        if name.startswith('Detached ') or (detached_at is not None and nodes[i + detached_at] == 2):
+            detached += 1
+        counts[name] += 1
+        sizes[name] += nodes[i + size_at]
+    return {'constructors': {name: [counts[name], sizes[name]] for name in counts}, 'detached_nodes': detached}
+
+
+def diff_summaries(before, after, top=SNAPSHOT_TOP):
+    """Constructors that grew the most in retained size between two snapshot summaries."""
+    grown = []
+    for name, (count, size) in after['constructors'].items():
+        old_count, old_size = before['constructors'].get(name, (0, 0))
+        if count > old_count or size > old_size:
+            grown.append({'constructor': name, 'count_delta': count - old_count, 'size_delta': size - old_size,
+                          'count': count, 'size': size})
+    grown.sort(key=lambda g: (g['size_delta'], g['count_delta']), reverse=True)
+    return {'detached_nodes': [before['detached_nodes'], after['detached_nodes']], 'grown': grown[:top]}
+
+
+async def take_heap_snapshot(cdp, save_path=None):
+    """Heap snapshot via HeapProfiler, summarized; the raw JSON is only written when save_path is given."""
+    chunks = []
+
+    def on_chunk(event):
+        chunks.append(event['chunk'])
+
+    cdp.on('HeapProfiler.addHeapSnapshotChunk', on_chunk)
+    try:
+        await cdp.send('HeapProfiler.takeHeapSnapshot', {'reportProgress': False})
+    finally:
+        cdp.remove_listener('HeapProfiler.addHeapSnapshotChunk', on_chunk)
+    raw = ''.join(chunks)
+    if save_path:
+        with open(save_path, 'w', encoding='utf-8') as f:
+            f.write(raw)
+    return summarize_snapshot(json.loads(raw))
+
+
+async def sample(cdp):
+    """Force GC and read the metrics that should stay flat across identical cycles."""
+    for _ in range(2):
+        await cdp.send('HeapProfiler.collectGarbage')
+    metrics = (await cdp.send('Performance.getMetrics'))['metrics']
+    return {m['name']: m['value'] for m in metrics if m['name'] in METRICS}
+
+
+async def detect(page, cdp, name, args):
+    cycle = CYCLES[name]
+    print(f"\n=== {name}: {args.warmup} warmup + {args.cycles} cycles ===")
+    for _ in range(args.warmup):
+        await cycle(page)
+
+    # Baseline snapshot is taken up front (it can't be taken retroactively) and only diffed if needed
+    save = args.save_snapshot and os.path.join(args.snapshot_dir, f'{name}_before.heapsnapshot')
+    baseline = await take_heap_snapshot(cdp, save)
+    samples = [await sample(cdp)]
+    started = time.perf_counter()
+    for i in range(args.cycles):
+        if not await cycle(page) and i == 0:
+            raise ValueError('none of its targets are on the page')
+        samples.append(await sample(cdp))
+        s = samples[-1]
+        print(f"  cycle {i + 1:3d}  heap {s.get('JSHeapUsedSize', 0) / 1024:9.0f} KB  "
+              f"nodes {s.get('Nodes', 0):6.0f}  listeners {s.get('JSEventListeners', 0):5.0f}")
+    elapsed = time.perf_counter() - started
+
+    thresholds = {'JSHeapUsedSize': args.heap_threshold_kb * 1024, 'Nodes': args.node_threshold,
+                  'JSEventListeners': args.listener_threshold, 'Documents': 0.5}
+    result = {'cycles': args.cycles, 'seconds': elapsed, 'samples': samples, 'metrics': verdict(samples, thresholds)}
+    heap = result['metrics'].get('JSHeapUsedSize')
+    if heap and heap['slope'] > thresholds['JSHeapUsedSize']:
+        save = args.save_snapshot and os.path.join(args.snapshot_dir, f'{name}_after.heapsnapshot')
+        result['heap_snapshot'] = diff_summaries(baseline, await take_heap_snapshot(cdp, save))
+    return result
+
+
+def print_verdict(name, result):
+    if 'error' in result:
+        print(f"\n{name}: ERROR ({result['error']})")
+        return False
+    leaking = [m for m, v in result['metrics'].items() if v['leak']]
+    print(f"\n{name}: {'LEAK' if leaking else 'OK'} ({result['cycles']} cycles in {result['seconds']:.0f}s)")
+    for metric, v in result['metrics'].items():
+        label, divisor, unit = METRICS[metric]
+        print(f"  {label:<10} {v['start'] / divisor:10.0f} -> {v['end'] / divisor:10.0f}   "
+              f"{v['slope'] / divisor:+8.1f} {unit}/cycle  r2 {v['r2']:.2f}  {'LEAK' if v['leak'] else ''}")
+    snapshot = result.get('heap_snapshot')
+    if snapshot:
+        before, after = snapshot['detached_nodes']
+        print(f"  detached DOM nodes: {before} -> {after}")
+        print(f"  {'constructor':<40} {'+count':>8} {'+KB':>9}")
+        for g in snapshot['grown']:
+            print(f"  {g['constructor'][:40]:<40} {g['count_delta']:+8d} {g['size_delta'] / 1024:+9.1f}")
+    return bool(leaking)
+
+
+async def run(args):
+    from playwright.async_api import async_playwright
+    from har_replay import attach_async
+
+    report = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+        context = await browser.new_context(viewport={'width': 390, 'height': 844}, is_mobile=True, has_touch=True)
+        await attach_async(context)
+        page = await context.new_page()
+        cdp = await context.new_cdp_session(page)
+        await cdp.send('Performance.enable')
+        await cdp.send('HeapProfiler.enable')
+        try:
+            await page.goto(args.url, wait_until='networkidle', timeout=60000)
+            skip = await page.query_selector('text=Skip')
+            if skip:
+                await skip.click()
+                await page.wait_for_load_state('networkidle')
+
+            for name in args.cycle:
+                # One broken cycle shouldn't throw away the others' samples
+                try:
+                    report[name] = await detect(page, cdp, name, args)
+                except Exception as e:
+                    print(f"   [ERROR] {name}: {str(e).splitlines()[0]}")
+                    report[name] = {'error': str(e).splitlines()[0]}
+                    await page.keyboard.press('Escape')
+        finally:
+            await browser.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect JS heap and DOM growth across repeated interactions')
+    parser.add_argument('--url', default=APP_URL)
+    parser.add_argument('--cycle', nargs='+', choices=sorted(CYCLES), default=list(CYCLES))
+    parser.add_argument('--cycles', type=int, default=20, help='Measured repetitions per cycle')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured repetitions (fills caches, lazy modules)')
+    parser.add_argument('--heap-threshold-kb', type=float, default=50, help='Heap growth per cycle flagged as a leak')
+    parser.add_argument('--node-threshold', type=float, default=10, help='DOM node growth per cycle flagged as a leak')
+    parser.add_argument('--listener-threshold', type=float, default=2,
+                        help='Event listener growth per cycle flagged as a leak')
+    parser.add_argument('--json', help='Write samples, fits and snapshot diffs to this file')
+    parser.add_argument('--save-snapshot', action='store_true', help='Keep the raw .heapsnapshot files')
+    parser.add_argument('--snapshot-dir', default='.')
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(run(args))
+        leaks = [name for name, result in report.items() if print_verdict(name, result)]
+        errors = [name for name, result in report.items() if 'error' in result]
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+            print(f"\n[SAVED] {args.json}")
+        if errors:
+            print(f"\n[ERROR] Not measured: {', '.join(errors)}")
+        if leaks:
+            print(f"\n[WARNING] Memory grows every cycle in: {', '.join(leaks)}")
+        if leaks or errors:
+            return 1
+        print("\n[SUCCESS] No per-cycle memory growth")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,6 +15,8 @@ from PIL import Image
 import os
 import sys
 
+from process_images import flatten_to_rgb, center_square_crop
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -41,26 +43,12 @@ if width < 1024 or height < 1024:
     print(f"Recommended: 2048x2048 or larger\n")
 
 # Convert to RGB if needed (remove alpha channel for iOS)
-if img.mode == 'RGBA':
-    print("Converting RGBA to RGB (removing transparency)")
-    # Create white background
-    background = Image.new('RGB', img.size, (255, 255, 255))
-    background.paste(img, mask=img.split()[3])  # Use alpha channel as mask
-    img = background
-elif img.mode != 'RGB':
-    print(f"Converting {img.mode} to RGB")
-    img = img.convert('RGB')
-
-# Create square crop centered on the image
-# Use the smaller dimension as the square size
-square_size = min(width, height)
-left = (width - square_size) // 2
-top = (height - square_size) // 2
-right = left + square_size
-bottom = top + square_size
-
-# Crop to square
-img_square = img.crop((left, top, right, bottom))
+if img.mode != 'RGB':
+    print(f"Converting {img.mode} to RGB (removing transparency)")
+    img = flatten_to_rgb(img)
+
+# Crop to the largest centered square
+img_square = center_square_crop(img)
 print(f"Cropped to square: {img_square.size}")
 
 # Resize to 1024x1024 using highest quality resampling
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch image processing for meal photos, screenshots and icons
+
+Streams every image in a directory through a crop/resize/normalize pipeline.
+Files are discovered lazily and handed to a bounded worker pool, so only a
+handful of images are ever decoded at once no matter how big the directory is.
+JPEGs are decoded at reduced scale (Pillow draft mode) and shrunk with
+Image.reduce before the final LANCZOS pass, which keeps large 3x screenshots
+and phone photos cheap to downscale.
+
+Outputs keep the source's subdirectory under the output directory (with
+-r, a/x.jpg and b/x.jpg become out/a/x.png and out/b/x.png). Sources that
+would still land on the same file, such as x.jpg and x.png in one folder,
+never overwrite each other: whichever is reached second gets its source
+extension added (x.png and x_jpg.png, or x_png.png).
+
+Presets:
+- thumbnail: fit inside 390px wide (1x phone width), PNG
+- meal:      fit inside 1024x1024, JPEG q85 (pre-size before upload)
+- icon:      center square crop, 1024x1024 RGB PNG (App Store icon rules)
+
+Usage:
+    python process_images.py screenshots/ out/thumbs --preset thumbnail
+    python process_images.py photos/ out/meals --preset meal --workers 8 -r
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image, ImageOps
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+
+PRESETS = {
+    'thumbnail': {'size': (390, 10000), 'square': False, 'format': 'PNG'},
+    'meal': {'size': (1024, 1024), 'square': False, 'format': 'JPEG'},
+    'icon': {'size': (1024, 1024), 'square': True, 'format': 'PNG'},
+}
+
+SAVE_OPTIONS = {
+    # optimize=True enables PNG optimization without quality loss
+    'PNG': {'optimize': True, 'compress_level': 6},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 85, 'method': 4},
+}
+
+EXTENSION_FOR_FORMAT = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp'}
+
+ORIENTATION_TAG = 0x0112
+
+
+def iter_image_paths(root, recursive=False):
+    """Yield image file paths under root without building a full listing."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+
+
+def flatten_to_rgb(img, background=(255, 255, 255)):
+    """Convert to RGB, compositing any transparency onto a solid background."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        flat = Image.new('RGB', img.size, background)
+        flat.paste(img, mask=img.split()[3])  # Use alpha channel as mask
+        return flat
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def center_square_crop(img):
+    """Crop the largest centered square out of img."""
+    width, height = img.size
+    square_size = min(width, height)
+    left = (width - square_size) // 2
+    top = (height - square_size) // 2
+    return img.crop((left, top, left + square_size, top + square_size))
+
+
+def fit_size(size, bounds):
+    """Return size scaled down to fit inside bounds, preserving aspect ratio."""
+    width, height = size
+    scale = min(bounds[0] / width, bounds[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def open_for_target(path, target, square=False):
+    """
+    Open path and cheaply shrink it toward target before the final resize.
+
+    Returns (image, original size as stored in the file).
+
+    For JPEGs, draft() asks libjpeg to decode at 1/2, 1/4 or 1/8 scale so the
+    full-resolution bitmap is never materialized. Any remaining integer factor
+    is removed with reduce(), which is a fast box filter. The LANCZOS pass
+    afterwards only has to cover the last <2x of scaling.
+    """
+    img = Image.open(path)
+    original_size = img.size
+
+    # EXIF orientations 5-8 are rotated 90 degrees; size against the swapped box
+    # here and apply the rotation after the cheap shrink.
+    if img.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8):
+        target = (target[1], target[0])
+
+    width, height = img.size
+    if square:
+        side = min(width, height)
+        needed = (target[0] * width // side, target[1] * height // side)
+    else:
+        needed = fit_size(img.size, target)
+
+    if img.format == 'JPEG':
+        img.draft('RGB', needed)
+
+    factor = min(img.size[0] // needed[0], img.size[1] // needed[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    return ImageOps.exif_transpose(img), original_size
+
+
+def output_path_for(path, root, out_dir, fmt, claimed):
+    """
+    Output file for path: its directory relative to root mirrored under out_dir, with fmt's extension.
+
+    claimed holds the (lowercased) outputs already handed out in this run; a
+    source that would reuse one gets its own extension added to the name.
+    """
+    relative = os.path.relpath(path, root) if root else os.path.basename(path)
+    stem, source_ext = os.path.splitext(relative)
+    base = os.path.join(out_dir, stem)
+    ext = EXTENSION_FOR_FORMAT[fmt]
+    candidate = base + ext
+    n = 1
+    while candidate.lower() in claimed:
+        n += 1
+        candidate = f"{base}_{source_ext[1:].lower()}{n if n > 2 else ''}{ext}"
+    claimed.add(candidate.lower())
+    return candidate
+
+
+def process_image(path, output_path, size, square=False, fmt='PNG', background=(255, 255, 255)):
+    """Crop/resize/normalize one image and write it to output_path."""
+    started = time.perf_counter()
+    img, original_size = open_for_target(path, size, square=square)
+    img = flatten_to_rgb(img, background)
+    if square:
+        img = center_square_crop(img)
+        final_size = size
+    else:
+        final_size = fit_size(img.size, size)
+    if img.size != final_size:
+        img = img.resize(final_size, Image.Resampling.LANCZOS)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    img.save(output_path, format=fmt, **SAVE_OPTIONS[fmt])
+    img.close()
+
+    return {
+        'input': path,
+        'output': output_path,
+        'original_size': original_size,
+        'size': final_size,
+        'bytes_in': os.path.getsize(path),
+        'bytes_out': os.path.getsize(output_path),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def process_stream(paths, out_dir, workers=4, root=None, **options):
+    """
+    Run process_image over an iterable of paths with a bounded worker pool.
+
+    Output paths are assigned here, before submission, so two workers never
+    write the same file (see output_path_for; root is the input directory).
+
+    At most workers * 2 images are in flight at once; the next path is pulled
+    from the iterator only when a slot frees up. Results are yielded as they
+    complete, as dicts (failures carry an 'error' key instead of 'output').
+    """
+    max_in_flight = workers * 2
+    paths = iter(paths)
+    claimed = set()
+    fmt = options.get('fmt', 'PNG')
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit_next():
+            for path in paths:
+                output_path = output_path_for(path, root, out_dir, fmt, claimed)
+                pending[pool.submit(process_image, path, output_path, **options)] = path
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'input': path, 'error': str(e)}
+                submit_next()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch crop/resize/normalize images in a directory')
+    parser.add_argument('input_dir', help='Directory of source images')
+    parser.add_argument('output_dir', help='Directory to write processed images to')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='thumbnail')
+    parser.add_argument('--size', help='Override bounding box, e.g. 512x512')
+    parser.add_argument('--format', choices=sorted(SAVE_OPTIONS), help='Override output format')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('-r', '--recursive', action='store_true', help='Descend into subdirectories')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    size = preset['size']
+    if args.size:
+        width, height = args.size.lower().split('x')
+        size = (int(width), int(height))
+    fmt = args.format or preset['format']
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    processed = failed = bytes_in = bytes_out = 0
+    results = process_stream(
+        iter_image_paths(args.input_dir, recursive=args.recursive),
+        args.output_dir,
+        workers=max(1, args.workers),
+        root=args.input_dir,
+        size=size,
+        square=preset['square'],
+        fmt=fmt,
+    )
+    for result in results:
+        if 'error' in result:
+            failed += 1
+            print(f"[ERROR] {result['input']}: {result['error']}")
+            continue
+        processed += 1
+        bytes_in += result['bytes_in']
+        bytes_out += result['bytes_out']
+        if not args.quiet:
+            print(f"[SAVED] {result['output']} {result['original_size']} -> {result['size']} "
+                  f"({result['bytes_out'] / 1024:.1f} KB, {result['seconds'] * 1000:.0f} ms)")
+
+    elapsed = time.perf_counter() - started
+    print(f"\n=== Processed {processed} images in {elapsed:.2f}s "
+          f"({processed / elapsed if elapsed else 0:.1f} img/s) ===")
+    if processed:
+        print(f"Size: {bytes_in / 1048576:.1f} MB -> {bytes_out / 1048576:.1f} MB")
+    if failed:
+        print(f"[WARNING] {failed} images failed")
+    return 0 if not failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
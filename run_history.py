@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run history: one local SQLite store for every diagnostic, capture, crawl and DB check
+
+Results used to end up in diagnostic output on the console, website_crawl_results.json
+and screenshot filenames. Each run now also writes a row per step to
+run_history.sqlite:
+
+    runs       scenario, start/finish time, status, git commit
+    steps      step name, start time, duration, pass/fail, detail, numeric value
+    artifacts  file path and SHA-256 (screenshots, JSON reports)
+
+steps is indexed on (scenario, step, started_at), plus a partial index over
+failures only, so trend questions are a few index range scans however many
+runs have piled up:
+
+    p95 of dashboard load over the last 50 runs
+        python run_history.py p95 diagnostic dashboard_load --last 50
+    first run where WEATHER went missing
+        python run_history.py first-failure diagnostic weather_widget
+
+Recording from a script:
+
+    from run_history import record_run
+
+    with record_run('diagnostic') as run:
+        page.goto(url)
+        run.mark('dashboard_load', artifacts=['diagnostics/01.png'])   # duration since previous mark
+        run.mark('weather_widget', passed=weather.is_visible())
+        with run.step('meal_logger'):                                   # timed block, fails on exception
+            ...
+
+heirclark.py records a run (scenario = command name, one 'exit' step) for
+every command that doesn't record its own steps. Set RUN_HISTORY=off to
+disable recording, or RUN_HISTORY_DB=path to use another database.
+
+Usage:
+    python run_history.py runs [--scenario diagnostic] [--limit 20]
+    python run_history.py steps diagnostic [RUN_ID]
+    python run_history.py p95 diagnostic dashboard_load [--pct 95] [--last 50]
+    python run_history.py trend diagnostic weather_widget [--last 20]
+    python run_history.py first-failure diagnostic weather_widget
+    python run_history.py artifact diagnostics/03_weather_widget.png
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from backend.stats import percentile
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DB_ENV_VAR = 'RUN_HISTORY_DB'
+ENABLED_ENV_VAR = 'RUN_HISTORY'
+DEFAULT_DB_PATH = os.path.join(ROOT, 'run_history.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    scenario    TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    finished_at REAL,
+    status      TEXT NOT NULL DEFAULT 'running',
+    git_commit  TEXT,
+    host        TEXT,
+    meta        TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    id          INTEGER PRIMARY KEY,
+    run_id      INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    scenario    TEXT NOT NULL,
+    step        TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    duration_ms REAL,
+    passed      INTEGER NOT NULL,
+    detail      TEXT,
+    value       REAL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id      INTEGER PRIMARY KEY,
+    run_id  INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    step_id INTEGER REFERENCES steps(id) ON DELETE CASCADE,
+    path    TEXT NOT NULL,
+    sha256  TEXT,
+    bytes   INTEGER
+);
+CREATE INDEX IF NOT EXISTS steps_scenario_step_time ON steps (scenario, step, started_at);
+-- Failures are rare; a partial index finds the newest one without walking every passing row
+CREATE INDEX IF NOT EXISTS steps_failures ON steps (scenario, step, started_at) WHERE passed = 0;
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run_id);
+CREATE INDEX IF NOT EXISTS runs_scenario_time ON runs (scenario, started_at);
+CREATE INDEX IF NOT EXISTS artifacts_path_run ON artifacts (path, run_id);
+CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts (run_id);
+"""
+
+
+def db_path():
+    return os.environ.get(DB_ENV_VAR) or DEFAULT_DB_PATH
+
+
+def enabled():
+    return os.environ.get(ENABLED_ENV_VAR, '').lower() not in ('off', '0', 'false', 'no')
+
+
+def connect(path=None):
+    """Open (and create if needed) the history database."""
+    conn = sqlite3.connect(path or db_path(), timeout=10)
+    # WAL lets a trend query run while a capture is writing; NORMAL is durable enough for history
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(path):
+    """Artifacts inside the repo are stored relative to it, so history survives moving the checkout."""
+    full = os.path.abspath(path)
+    if full.startswith(ROOT + os.sep):
+        return os.path.relpath(full, ROOT).replace(os.sep, '/')
+    return full
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=2).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Run:
+    """One recorded run. Steps and artifacts are committed as they are recorded, so a crash keeps them."""
+
+    def __init__(self, conn, scenario, meta=None):
+        self.conn = conn
+        self.scenario = scenario
+        self.started_at = time.time()
+        self.failed = 0
+        self._last_mark = time.perf_counter()
+        with conn:
+            self.id = conn.execute(
+                'INSERT INTO runs (scenario, started_at, git_commit, host, meta) VALUES (?, ?, ?, ?, ?)',
+                (scenario, self.started_at, _git_commit(), socket.gethostname(),
+                 json.dumps(meta) if meta else None)).lastrowid
+
+    def record(self, step, passed=True, duration_ms=None, detail=None, value=None, artifacts=(), started_at=None):
+        """Insert one step result; returns its id."""
+        if started_at is None:
+            started_at = time.time() - (duration_ms or 0) / 1000
+        self.failed += not passed
+        with self.conn:
+            step_id = self.conn.execute(
+                'INSERT INTO steps (run_id, scenario, step, started_at, duration_ms, passed, detail, value) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.id, self.scenario, step, started_at, duration_ms, int(bool(passed)),
+                 None if detail is None else str(detail), value)).lastrowid
+            for path in artifacts:
+                self._insert_artifact(path, step_id)
+        return step_id
+
+    def mark(self, step, passed=True, detail=None, value=None, artifacts=()):
+        """Record a step whose duration is the time since the previous mark (or the start of the run)."""
+        now = time.perf_counter()
+        duration_ms = (now - self._last_mark) * 1000
+        self._last_mark = now
+        return self.record(step, passed, duration_ms, detail, value, artifacts)
+
+    @contextmanager
+    def step(self, step, artifacts=()):
+        """Time a block as one step. An exception marks it failed and propagates."""
+        started, started_at = time.perf_counter(), time.time()
+        try:
+            yield
+        except BaseException as e:
+            self.record(step, False, (time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}",
+                        artifacts=artifacts, started_at=started_at)
+            raise
+        self.record(step, True, (time.perf_counter() - started) * 1000, artifacts=artifacts, started_at=started_at)
+        self._last_mark = time.perf_counter()
+
+    def artifact(self, path, step_id=None):
+        with self.conn:
+            self._insert_artifact(path, step_id)
+
+    def _insert_artifact(self, path, step_id):
+        exists = os.path.isfile(path)
+        self.conn.execute('INSERT INTO artifacts (run_id, step_id, path, sha256, bytes) VALUES (?, ?, ?, ?, ?)',
+                          (self.id, step_id, artifact_key(path),
+                           file_sha256(path) if exists else None, os.path.getsize(path) if exists else None))
+
+    def finish(self, status=None):
+        status = status or ('failed' if self.failed else 'passed')
+        with self.conn:
+            self.conn.execute('UPDATE runs SET finished_at = ?, status = ? WHERE id = ?',
+                              (time.time(), status, self.id))
+        return status
+
+
+class _NullRun:
+    """Stands in for Run when recording is disabled or the database can't be opened."""
+
+    id = None
+    failed = 0
+
+    def record(self, *args, **kwargs):
+        return None
+
+    mark = artifact = record
+
+    @contextmanager
+    def step(self, *args, **kwargs):
+        yield
+
+    def finish(self, status=None):
+        return status
+
+
+@contextmanager
+def record_run(scenario, meta=None, path=None):
+    """Record a run of scenario. Status is 'error' on an exception, else 'failed' if any step failed."""
+    run = _NullRun()
+    conn = None
+    if enabled():
+        try:
+            conn = connect(path)
+            run = Run(conn, scenario, meta)
+        except sqlite3.Error as e:
+            print(f"[WARNING] Run history disabled: {e}")
+    try:
+        yield run
+    except BaseException:
+        run.finish('error')
+        raise
+    else:
+        run.finish()
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def recent(conn, scenario, step, last=50):
+    """The last runs of a step, newest first: (run_id, started_at, duration_ms, passed, detail, value)."""
+    return conn.execute(
+        'SELECT run_id, started_at, duration_ms, passed, detail, value FROM steps '
+        'WHERE scenario = ? AND step = ? ORDER BY started_at DESC LIMIT ?', (scenario, step, last)).fetchall()
+
+
+def step_percentile(conn, scenario, step, pct=95, last=50, passed_only=True):
+    """Percentile of a step's duration over its last runs; returns (value_ms, samples_used)."""
+    rows = conn.execute(
+        'SELECT duration_ms FROM steps WHERE scenario = ? AND step = ? AND duration_ms IS NOT NULL '
+        f"{'AND passed = 1 ' if passed_only else ''}ORDER BY started_at DESC LIMIT ?",
+        (scenario, step, last)).fetchall()
+    durations = [r[0] for r in rows]
+    return percentile(durations, pct, default=None), len(durations)
+
+
+def regressions(conn, scenario, step):
+    """Every pass -> fail transition of a step, oldest first: (run_id, started_at, detail)."""
+    return conn.execute(
+        'SELECT run_id, started_at, detail FROM ('
+        '    SELECT run_id, started_at, detail, passed,'
+        '           LAG(passed) OVER (ORDER BY started_at) AS previous'
+        '    FROM steps WHERE scenario = ? AND step = ?'
+        ') WHERE passed = 0 AND (previous = 1 OR previous IS NULL) ORDER BY started_at',
+        (scenario, step)).fetchall()
+
+
+def first_failure(conn, scenario, step):
+    """First run of the most recent failure streak: (run_id, started_at, detail), or None if it never failed."""
+    # Three index range scans back from the newest failure, rather than a window over the whole history
+    where = 'FROM steps WHERE scenario = ? AND step = ?'
+    latest = conn.execute(f'SELECT MAX(started_at) {where} AND passed = 0', (scenario, step)).fetchone()[0]
+    if latest is None:
+        return None
+    last_pass = conn.execute(f'SELECT MAX(started_at) {where} AND passed = 1 AND started_at < ?',
+                             (scenario, step, latest)).fetchone()[0]
+    return conn.execute(f'SELECT run_id, started_at, detail {where} AND passed = 0 AND started_at > ? '
+                        'ORDER BY started_at LIMIT 1',
+                        (scenario, step, -1 if last_pass is None else last_pass)).fetchone()
+
+
+def artifact_history(conn, path, limit=50):
+    """Runs that produced path, newest first: (run_id, started_at, sha256, changed since the previous run)."""
+    rows = conn.execute(
+        'SELECT a.run_id, r.started_at, a.sha256 FROM artifacts a JOIN runs r ON r.id = a.run_id '
+        'WHERE a.path = ? ORDER BY a.run_id DESC LIMIT ?', (path, limit + 1)).fetchall()
+    return [(run_id, started_at, sha, i + 1 < len(rows) and sha != rows[i + 1][2])
+            for i, (run_id, started_at, sha) in enumerate(rows[:limit])]
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _when(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the local run-history store')
+    parser.add_argument('--db', help=f"Database file (default ${DB_ENV_VAR} or run_history.sqlite)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    runs_parser = sub.add_parser('runs', help='List recent runs')
+    runs_parser.add_argument('--scenario')
+    runs_parser.add_argument('--limit', type=int, default=20)
+    steps_parser = sub.add_parser('steps', help='Steps of one run (default: the latest of the scenario)')
+    steps_parser.add_argument('scenario')
+    steps_parser.add_argument('run_id', nargs='?', type=int)
+    for name, help_text in (('p95', 'Duration percentile of a step'), ('trend', 'Recent results of a step'),
+                            ('first-failure', 'Run where the current failure streak of a step began')):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('scenario')
+        p.add_argument('step')
+        p.add_argument('--last', type=int, default=50 if name == 'p95' else 20)
+        p.add_argument('--pct', type=float, default=95)
+    artifact_parser = sub.add_parser('artifact', help='Hash history of an artifact path')
+    artifact_parser.add_argument('path')
+    artifact_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    try:
+        conn = connect(args.db)
+        if args.command == 'runs':
+            where, params = ('WHERE r.scenario = ? ', [args.scenario]) if args.scenario else ('', [])
+            rows = conn.execute(
+                'SELECT r.id, r.scenario, r.started_at, r.finished_at, r.status, r.git_commit, '
+                '       (SELECT COUNT(*) FROM steps s WHERE s.run_id = r.id), '
+                '       (SELECT COUNT(*) FROM steps s WHERE s.run_id = r.id AND s.passed = 0) '
+                f'FROM runs r {where}ORDER BY r.started_at DESC LIMIT ?', params + [args.limit]).fetchall()
+            print(f"{'id':>6}  {'scenario':<18} {'started':<19} {'secs':>7}  {'status':<8} {'steps':>5} "
+                  f"{'failed':>6}  commit")
+            for run_id, scenario, started, finished, status, commit, steps, failed in rows:
+                secs = f"{finished - started:7.1f}" if finished else '      -'
+                print(f"{run_id:6d}  {scenario:<18} {_when(started)} {secs}  {status:<8} {steps:5d} {failed:6d}  "
+                      f"{commit or ''}")
+        elif args.command == 'steps':
+            run_id = args.run_id or (conn.execute('SELECT MAX(id) FROM runs WHERE scenario = ?',
+                                                  (args.scenario,)).fetchone()[0])
+            if run_id is None:
+                print(f"[WARNING] No runs recorded for {args.scenario}")
+                return 1
+            print(f"Run {run_id}")
+            for step, duration, passed, detail, value in conn.execute(
+                    'SELECT step, duration_ms, passed, detail, value FROM steps WHERE run_id = ? ORDER BY id',
+                    (run_id,)):
+                extra = ' '.join(str(x) for x in (value, detail) if x is not None)
+                print(f"  {'✓' if passed else '✗'} {step:<32} {duration or 0:9.0f} ms  {extra}")
+        elif args.command == 'p95':
+            (value, used), ms = _timed(step_percentile, conn, args.scenario, args.step, args.pct, args.last)
+            if value is None:
+                print(f"[WARNING] No passing runs of {args.scenario}/{args.step}")
+                return 1
+            print(f"p{args.pct:g} {args.scenario}/{args.step}: {value:.0f} ms over the last {used} passing runs "
+                  f"(query {ms:.1f} ms)")
+        elif args.command == 'trend':
+            rows, ms = _timed(recent, conn, args.scenario, args.step, args.last)
+            for run_id, started, duration, passed, detail, value in reversed(rows):
+                extra = ' '.join(str(x) for x in (value, detail) if x is not None)
+                mark = '✓' if passed else '✗'
+                print(f"  run {run_id:5d}  {_when(started)}  {mark} {duration or 0:9.0f} ms  {extra}")
+            print(f"({len(rows)} runs, query {ms:.1f} ms)")
+        elif args.command == 'first-failure':
+            found, ms = _timed(first_failure, conn, args.scenario, args.step)
+            if not found:
+                print(f"[SUCCESS] {args.scenario}/{args.step} has never failed (query {ms:.1f} ms)")
+                return 0
+            run_id, started, detail = found
+            latest = recent(conn, args.scenario, args.step, 1)[0]
+            state = 'still failing' if not latest[3] else f"passing again since run {latest[0]}"
+            print(f"{args.scenario}/{args.step} first failed in run {run_id} at {_when(started)} ({state})"
+                  f"{': ' + detail if detail else ''} (query {ms:.1f} ms)")
+        elif args.command == 'artifact':
+            for run_id, started, sha, changed in artifact_history(conn, artifact_key(args.path), args.limit):
+                print(f"  run {run_id:5d}  {_when(started)}  {(sha or 'missing')[:12]}  {'changed' if changed else ''}")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
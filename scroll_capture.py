@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scroll-sweep capture: one tall image of the app's inner scroll container
+
+On React Native Web the dashboard scrolls inside a ScrollView <div>, not the
+window, so full_page=True only captures one screen. capture_element.py and
+diagnose_cards.py work around this with 1200-1400px tall viewports, which
+changes the layout (flex:1 containers grow to fill them) and makes Chrome
+raster one huge surface per shot.
+
+Instead, this keeps the real phone viewport and steps the scroll container:
+
+1. Find the scroll container: the largest element with overflow-y auto or
+   scroll whose content is taller than its box. Fall back to the document.
+2. Scroll it by its height minus an overlap band (--overlap, CSS px),
+   wait for two animation frames, and screenshot only its box.
+3. Stitch each frame onto the previous one. The scroll offset read back from
+   the page gives the expected shift. NumPy then refines it by matching
+   per-row colour signatures across the overlap, which absorbs subpixel
+   rounding and late layout shifts.
+4. Rows that stay identical at the top and bottom of consecutive frames are
+   sticky (header, tab bar). They are kept once: the top band from the
+   first frame, the bottom band from the last.
+
+Frames are decoded and stitched one at a time into a preallocated array,
+so memory holds the output, the previous frame and the current one.
+
+`bench` compares a sweep with repeated tall-viewport renders of the same
+page. `bench --synthetic` checks stitching against a generated page with
+a sticky header and tab bar, offline.
+
+Usage:
+    python scroll_capture.py capture dashboard_full.png
+    python scroll_capture.py capture cards.png --viewport 390x844 --scale 3 --overlap 200
+    python scroll_capture.py bench --repeat 3
+    python scroll_capture.py bench --synthetic
+
+From a capture script:
+    image = await sweep_capture(page)
+    Image.fromarray(image).save('full.png')
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+APP_URL = 'http://localhost:8081'
+SIGNATURE_BLOCKS = 48     # column blocks per row signature
+SEARCH_PX = 24            # device px searched either side of the expected shift
+ROW_TOLERANCE = 6         # max per-channel difference for "identical" sticky rows
+MIN_MATCH_ROWS = 32       # device px of overlap always left for alignment
+
+FIND_SCROLLER_JS = """
+() => {
+    let best = null, bestArea = 0;
+    for (const el of document.querySelectorAll('body *')) {
+        if (el.scrollHeight <= el.clientHeight + 1) continue;
+        const oy = getComputedStyle(el).overflowY;
+        if (oy !== 'auto' && oy !== 'scroll') continue;
+        const area = el.clientWidth * el.clientHeight;
+        if (area > bestArea) { best = el; bestArea = area; }
+    }
+    return best || document.scrollingElement;
+}
+"""
+
+SCROLL_TO_JS = """
+async (el, y) => {
+    el.scrollTop = y;
+    await new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)));
+    const r = el === document.scrollingElement
+        ? {x: 0, y: 0, width: innerWidth, height: innerHeight}
+        : el.getBoundingClientRect();
+    const x = Math.max(0, r.x), top = Math.max(0, r.y);
+    return {top: el.scrollTop, scrollHeight: el.scrollHeight, clientHeight: el.clientHeight,
+            clip: {x, y: top, width: Math.min(r.x + r.width, innerWidth) - x,
+                   height: Math.min(r.y + r.height, innerHeight) - top}};
+}
+"""
+
+
+def row_signatures(frame):
+    """(rows, SIGNATURE_BLOCKS, 3) float32: mean colour of each column block per row."""
+    height, width, _ = frame.shape
+    usable = width - width % SIGNATURE_BLOCKS
+    return frame[:, :usable].reshape(height, SIGNATURE_BLOCKS, usable // SIGNATURE_BLOCKS, 3).mean(
+        axis=2, dtype=np.float32)
+
+
+def sticky_bands(a, b, limit):
+    """Rows at the top and bottom that are identical in two frames, capped at limit rows together."""
+    same = (np.abs(a.astype(np.int16) - b).max(axis=(1, 2)) <= ROW_TOLERANCE)
+    top = int(np.argmin(same)) if not same.all() else len(same)
+    bottom = int(np.argmin(same[::-1])) if not same.all() else len(same)
+    top = min(top, limit)
+    return top, min(bottom, limit - top)
+
+
+def best_shift(sig_a, sig_b, top, bottom, expected, search=SEARCH_PX):
+    """
+    Rows the content moved up between frames a and b, within the scrolling band.
+
+    Compares a[y] with b[y - shift] for every candidate shift near expected
+    and returns the one with the lowest mean absolute difference (ties go to
+    the expected shift).
+    """
+    height = sig_a.shape[0]
+    band_end = height - bottom
+    low = max(0, expected - search)
+    high = min(expected + search, band_end - top - MIN_MATCH_ROWS)
+    if high < low:
+        return expected
+    best, best_score = expected, None
+    for shift in range(low, high + 1):
+        score = float(np.abs(sig_a[top + shift:band_end] - sig_b[top:band_end - shift]).mean())
+        if best_score is None or score < best_score - 1e-6 or (
+                abs(score - best_score) <= 1e-6 and abs(shift - expected) < abs(best - expected)):
+            best, best_score = shift, score
+    return best
+
+
+class Stitcher:
+    """
+    Joins overlapping frames of a scrolled container into one image.
+
+    add() takes each frame with the expected shift since the previous one
+    (scroll delta in device px). Only the previous frame is kept.
+    """
+
+    def __init__(self, max_height, overlap_rows):
+        self.max_height = max_height
+        self.sticky_limit = max(0, overlap_rows - MIN_MATCH_ROWS)
+        self.out = None
+        self.rows = 0
+        self.prev = None
+        self.prev_sig = None
+        self.top = self.bottom = None
+        self.shifts = []
+
+    def add(self, frame, expected):
+        sig = row_signatures(frame)
+        if self.prev is None:
+            self.prev, self.prev_sig = frame, sig
+            return
+        if self.out is None:
+            height, width, _ = frame.shape
+            self.top, self.bottom = sticky_bands(self.prev, frame, self.sticky_limit) if expected else (0, 0)
+            self.out = np.empty((self.max_height + height, width, 3), dtype=np.uint8)
+            self._write(self.prev[:height - self.bottom])
+        shift = best_shift(self.prev_sig, sig, self.top, self.bottom, expected) if expected else 0
+        self.shifts.append((expected, shift))
+        if shift:
+            height = frame.shape[0]
+            # Rows of b below where a's scrolling band ended are new content
+            self._write(frame[max(self.top, height - self.bottom - shift):height - self.bottom])
+        self.prev, self.prev_sig = frame, sig
+
+    def _write(self, rows):
+        rows = rows[:max(0, self.out.shape[0] - self.rows)]
+        self.out[self.rows:self.rows + len(rows)] = rows
+        self.rows += len(rows)
+
+    def result(self):
+        if self.out is None:
+            return self.prev
+        self._write(self.prev[self.prev.shape[0] - self.bottom:])
+        return self.out[:self.rows]
+
+
+def decode(png):
+    with Image.open(io.BytesIO(png)) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+async def sweep_capture(page, overlap=200, settle_ms=150, max_frames=60):
+    """
+    Capture the page's main scroll container top to bottom as one RGB array.
+
+    overlap is in CSS px and must be taller than the sticky header and tab
+    bar together. The container is scrolled back to where it started.
+    """
+    scroller = await page.evaluate_handle(FIND_SCROLLER_JS)
+    start = await scroller.evaluate('el => el.scrollTop')
+    state = await scroller.evaluate(SCROLL_TO_JS, 0)
+    step = max(1, state['clientHeight'] - overlap)
+    stitcher = None
+    previous_top = 0
+    try:
+        for index in range(max_frames):
+            if index:
+                state = await scroller.evaluate(SCROLL_TO_JS, previous_top + step)
+                if state['top'] <= previous_top:
+                    break
+            if settle_ms:
+                await page.wait_for_timeout(settle_ms)
+            frame = decode(await page.screenshot(clip=state['clip'], animations='disabled', caret='hide'))
+            scale = frame.shape[0] / state['clip']['height']
+            if stitcher is None:
+                stitcher = Stitcher(round(state['scrollHeight'] * scale), round(overlap * scale))
+            stitcher.add(frame, round((state['top'] - previous_top) * scale))
+            previous_top = state['top']
+    finally:
+        await scroller.evaluate('(el, y) => { el.scrollTop = y; }', start)
+    image = stitcher.result()
+    drift = [shift - expected for expected, shift in stitcher.shifts if expected]
+    print(f"Stitched {len(stitcher.shifts) + 1} frames into {image.shape[1]}x{image.shape[0]} "
+          f"(sticky {stitcher.top or 0}px top / {stitcher.bottom or 0}px bottom, "
+          f"alignment drift {min(drift, default=0)}..{max(drift, default=0)}px)")
+    return image
+
+
+async def tall_capture(page):
+    """The old approach: grow the viewport to the content height and take one shot."""
+    scroller = await page.evaluate_handle(FIND_SCROLLER_JS)
+    viewport = page.viewport_size
+    content = await scroller.evaluate('el => el.scrollHeight')
+    await page.set_viewport_size({'width': viewport['width'], 'height': max(viewport['height'], content)})
+    try:
+        await page.wait_for_timeout(150)
+        return decode(await page.screenshot(animations='disabled', caret='hide'))
+    finally:
+        await page.set_viewport_size(viewport)
+
+
+async def open_app(p, url, width, height, scale):
+    from har_replay import attach_async
+
+    browser = await p.chromium.launch()
+    context = await browser.new_context(viewport={'width': width, 'height': height}, device_scale_factor=scale,
+                                        is_mobile=True, has_touch=True)
+    await attach_async(context)
+    page = await context.new_page()
+    await page.goto(url, wait_until='networkidle', timeout=60000)
+    skip = await page.query_selector('text=Skip')
+    if skip:
+        await skip.click()
+        await page.wait_for_load_state('networkidle')
+    return browser, page
+
+
+async def measure(label, capture, repeat):
+    """Run capture repeat times; return the last image after printing time and Python peak memory."""
+    times, peaks, image = [], [], None
+    for _ in range(repeat):
+        image = None
+        tracemalloc.start()
+        started = time.perf_counter()
+        image = await capture()
+        times.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    print(f"  {label:<14} {min(times) * 1000:8.0f} ms best / {sum(times) / len(times) * 1000:8.0f} ms mean   "
+          f"peak {max(peaks) / 1e6:6.1f} MB   {image.shape[1]}x{image.shape[0]}")
+    return image
+
+
+async def bench_live(url, width, height, scale, overlap, repeat):
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser, page = await open_app(p, url, width, height, scale)
+        try:
+            print(f"\n{width}x{height} @{scale}x, {repeat} runs each:")
+            swept = await measure('scroll sweep', lambda: sweep_capture(page, overlap), repeat)
+            tall = await measure('tall viewport', lambda: tall_capture(page), repeat)
+        finally:
+            await browser.close()
+    print(f"\n  Tall viewport rasters {tall.shape[0] * tall.shape[1] / 1e6:.1f} MP in one surface and "
+          f"lays the app out at {tall.shape[0] // scale}px high; the sweep never exceeds "
+          f"{width * height * scale * scale / 1e6:.1f} MP per frame at the real phone size.")
+    if swept.shape[0] != tall.shape[0]:
+        print(f"  Heights differ ({swept.shape[0]} vs {tall.shape[0]} px): the tall viewport changes the layout.")
+
+
+def synthetic_page(width, height, header, footer, seed=7):
+    """A tall 'app' with card-like blocks and text-like stripes."""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width, 3), 18, dtype=np.uint8)
+    y = header
+    while y < height - footer:
+        card = int(rng.integers(120, 420))
+        page[y:y + card, 40:width - 40] = rng.integers(30, 70, 3)
+        for line in range(y + 20, min(y + card - 20, height), 36):
+            length = int(rng.integers(width // 4, width - 160))
+            page[line:line + 14, 80:80 + length] = rng.integers(150, 255, 3)
+        y += card + 48
+    return page
+
+
+def bench_synthetic(width=1170, viewport=2532, content=12000, header=180, footer=250, overlap=600):
+    """Stitch frames cut from a generated page (with noise) and check the result pixel for pixel."""
+    body = synthetic_page(width, content, 0, 0)
+    chrome = synthetic_page(width, header + footer, 0, 0, seed=11)
+    band = viewport - header - footer
+    step = viewport - overlap
+    rng = np.random.default_rng(3)
+
+    def frames():
+        top = 0
+        while True:
+            frame = np.empty((viewport, width, 3), dtype=np.uint8)
+            frame[:header] = chrome[:header]
+            frame[header:viewport - footer] = body[top:top + band]
+            frame[viewport - footer:] = chrome[header:]
+            noisy = frame.astype(np.int16) + rng.integers(-2, 3, frame.shape)
+            yield np.clip(noisy, 0, 255).astype(np.uint8), top
+            if top + band >= content:
+                return
+            top = min(top + step, content - band)
+
+    cut = list(frames())  # stands in for decoded screenshots; not part of the measurement
+    tracemalloc.start()
+    started = time.perf_counter()
+    stitcher = Stitcher(content + header + footer, overlap)
+    previous = 0
+    for frame, top in cut:
+        stitcher.add(frame, top - previous)
+        previous = top
+    image = stitcher.result()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    expected = np.concatenate([chrome[:header], body, chrome[header:]])
+    error = np.abs(image.astype(np.int16) - expected).max() if image.shape == expected.shape else None
+    print(f"  {len(cut)} frames of {width}x{viewport} -> {image.shape[1]}x{image.shape[0]} "
+          f"(expected {expected.shape[1]}x{expected.shape[0]})")
+    print(f"  sticky bands {stitcher.top}px / {stitcher.bottom}px (actual {header} / {footer})")
+    print(f"  stitch {elapsed * 1000:.0f} ms, peak {peak / 1e6:.1f} MB "
+          f"(output alone {expected.nbytes / 1e6:.1f} MB)")
+    if error is None or error > 2:
+        print(f"[ERROR] Stitched image doesn't match the page (max error {error})")
+        return False
+    print("[SUCCESS] Stitched image matches the page within sensor noise")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Capture the app scroll container as one stitched image')
+    parser.add_argument('--url', default=APP_URL)
+    parser.add_argument('--viewport', default='390x844', help='WIDTHxHEIGHT in CSS px')
+    parser.add_argument('--scale', type=int, default=3, help='Device scale factor')
+    parser.add_argument('--overlap', type=int, default=200,
+                        help='CSS px shared by consecutive frames (> sticky header + tab bar)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    capture_parser = sub.add_parser('capture', help='Sweep-capture to an image file')
+    capture_parser.add_argument('output')
+    bench_parser = sub.add_parser('bench', help='Scroll sweep vs tall viewport')
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    bench_parser.add_argument('--synthetic', action='store_true', help='Offline stitching check, no browser')
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.viewport.lower().split('x'))
+    try:
+        if args.command == 'bench':
+            if args.synthetic:
+                return 0 if bench_synthetic() else 1
+            asyncio.run(bench_live(args.url, width, height, args.scale, args.overlap, args.repeat))
+            return 0
+
+        async def run():
+            from playwright.async_api import async_playwright
+
+            async with async_playwright() as p:
+                browser, page = await open_app(p, args.url, width, height, args.scale)
+                try:
+                    return await sweep_capture(page, args.overlap)
+                finally:
+                    await browser.close()
+
+        image = asyncio.run(run())
+        Image.fromarray(image).save(args.output, optimize=True)
+        print(f"[SAVED] {args.output}")
+        return 0
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,4 +25,5 @@ async def test_fonts():
 
         await browser.close()
 
-asyncio.run(test_fonts())
+if __name__ == '__main__':
+    asyncio.run(test_fonts())